@@ -0,0 +1,206 @@
+"""Recording and replaying of GitHub API interactions
+
+A Cassette is a compact on-disk record (gzipped JSON) of the responses to a series of
+GitHub API requests. In record mode, every request made by a GitHubClient goes to GitHub
+as usual, and its response is added to the cassette. In replay mode, no network access
+is needed: responses are served from the cassette, optionally after an injected delay
+standing in for network latency. This allows deterministic, offline runs of the tools
+and benchmarks.
+
+This works at the level of the requests library's transport adapters, so everything
+above that (caching, rate limiting, pagination) behaves just as it does with GitHub.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+RECORD = "record"
+REPLAY = "replay"
+
+# This should be incremented whenever the format of a cassette changes incompatibly
+_CASSETTE_FORMAT_VERSION = 1
+
+# Response headers that are stored in a cassette
+_RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link", "Retry-After",
+                     "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset",
+                     "X-RateLimit-Resource")
+
+# Request headers that are removed when recording, so that the cassette holds complete
+# responses rather than '304 Not Modified' responses to conditional requests
+_CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+# ------------------------------------------------------------------------
+# Begin class definitions
+# ------------------------------------------------------------------------
+
+class CassetteMissError(requests.exceptions.ConnectionError):
+    """Exception raised when replaying a request that is not in the cassette"""
+
+class Cassette:
+    """Recorded responses to GitHub API requests
+
+    A single cassette can safely be used from multiple threads.
+    """
+
+    def __init__(self, path, mode, latency=0.0):
+        """Initialize a Cassette
+
+        In replay mode, the cassette is read from path immediately. In record mode, it is
+        written to path by save (which is called when the client using it is closed).
+
+        Args:
+        path: string - path to the cassette file
+        mode: string - RECORD or REPLAY
+        latency: float - in replay mode, number of seconds to sleep before serving each
+            response
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError("Unknown cassette mode: {}".format(mode))
+        self._path = path
+        self._mode = mode
+        self._latency = latency
+        self._lock = threading.Lock()
+        # Maps each request key to the list of responses recorded for it, in order; each
+        # response is a dict with keys 'status', 'headers' and 'body'
+        self._interactions = {}
+        # In replay mode, maps each request key to the number of times it has been served
+        self._replay_counts = {}
+        if mode == REPLAY:
+            with gzip.open(path, "rt", encoding="utf-8") as cassette_file:
+                contents = json.load(cassette_file)
+            if contents.get("version") != _CASSETTE_FORMAT_VERSION:
+                raise ValueError("Unsupported cassette format in {}".format(path))
+            self._interactions = contents["interactions"]
+
+    @staticmethod
+    def make_key(request):
+        """Return the key identifying the given requests.PreparedRequest in a cassette
+
+        The key doesn't include the host, so a cassette recorded against one server can
+        be replayed for any base URL; nor does it include any headers (so in particular,
+        access tokens are never stored).
+        """
+        split_url = urllib.parse.urlsplit(request.url)
+        query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(split_url.query)))
+        key = "{method} {path}?{query}".format(method=request.method,
+                                              path=split_url.path,
+                                              query=query)
+        if request.body:
+            body = request.body
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            key += " " + hashlib.sha256(body).hexdigest()
+        return key
+
+    def make_adapter(self, **adapter_args):
+        """Return a requests transport adapter that records to or replays from this cassette
+
+        Args:
+        adapter_args: passed to requests.adapters.HTTPAdapter in record mode; ignored in
+            replay mode
+        """
+        if self._mode == RECORD:
+            return _RecordingAdapter(self, **adapter_args)
+        return _ReplayAdapter(self)
+
+    def record(self, key, response):
+        """Add a requests.Response to the cassette"""
+        recorded = {"status": response.status_code,
+                    "headers": {name: response.headers[name] for name in _RECORDED_HEADERS
+                                if name in response.headers},
+                    "body": response.text}
+        with self._lock:
+            self._interactions.setdefault(key, []).append(recorded)
+
+    def replay(self, request):
+        """Return the recorded response (a dict) for a requests.PreparedRequest
+
+        If a request was recorded more than once, its responses are served in the order
+        they were recorded, with the last one repeated after that.
+
+        Raises CassetteMissError if the request was never recorded.
+        """
+        key = self.make_key(request)
+        with self._lock:
+            if key not in self._interactions:
+                raise CassetteMissError("Request not found in cassette {}: {}".format(
+                    self._path, key), request=request)
+            responses = self._interactions[key]
+            count = self._replay_counts.get(key, 0)
+            self._replay_counts[key] = count + 1
+        if self._latency:
+            time.sleep(self._latency)
+        return responses[min(count, len(responses) - 1)]
+
+    def save(self):
+        """Write the cassette to its file (in record mode; does nothing in replay mode)"""
+        if self._mode != RECORD:
+            return
+        with self._lock:
+            contents = {"version": _CASSETTE_FORMAT_VERSION,
+                        "interactions": self._interactions}
+            directory = os.path.dirname(os.path.abspath(self._path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw_file, \
+                 gzip.open(raw_file, "wt", encoding="utf-8") as cassette_file:
+                json.dump(contents, cassette_file, separators=(",", ":"))
+            os.replace(temp_path, self._path)
+
+class _RecordingAdapter(HTTPAdapter):
+    """Transport adapter that sends requests as usual, recording their responses"""
+
+    def __init__(self, cassette, **adapter_args):
+        self._cassette = cassette
+        super().__init__(**adapter_args)
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        for name in _CONDITIONAL_HEADERS:
+            request.headers.pop(name, None)
+        response = super().send(request, **kwargs)
+        self._cassette.record(self._cassette.make_key(request), response)
+        return response
+
+    def close(self):
+        super().close()
+        self._cassette.save()
+
+class _ReplayAdapter(BaseAdapter):
+    """Transport adapter that serves responses from a cassette, without network access"""
+
+    def __init__(self, cassette):
+        self._cassette = cassette
+        super().__init__()
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ,unused-argument
+        recorded = self._cassette.replay(request)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.encoding = "utf-8"
+        etag = recorded["headers"].get("ETag")
+        if (recorded["status"] == 200 and etag is not None and
+                request.headers.get("If-None-Match") == etag):
+            # Answer conditional requests the way GitHub would
+            response.status_code = 304
+            response._content = b""  # pylint: disable=protected-access
+        else:
+            response.status_code = recorded["status"]
+            response._content = recorded["body"].encode("utf-8")  # pylint: disable=protected-access
+        return response
+
+    def close(self):
+        pass
@@ -2,7 +2,7 @@
 """
 
 import textwrap
-from ghtools.comment_todo import search_line_for_todo, is_line_quoted, CommentTodo
+from ghtools.comment_todo import extract_todos, CommentTodo
 from ghtools.utils import fill_multiparagraph
 from ghtools.constants import LINE_WIDTH, INDENT_LEVEL
 
@@ -24,6 +24,9 @@ class Comment:
         self._time_info = time_info
         self._url = url
         self._content = content
+        # The todos in the content, as returned by extract_todos; None until they are
+        # first needed (see _get_extracted_todos)
+        self._todos = None
 
     def get_username(self):
         """Return the username that authored this comment"""
@@ -49,21 +52,39 @@ class Comment:
         Args:
         completed: boolean - whether to look for completed todos instead of incomplete todos
         """
-        todos = []
-        for line in self._content.splitlines():
-            todo_text = search_line_for_todo(line, completed=completed)
-            if todo_text is not None:
-                is_quoted = is_line_quoted(line)
-                todos.append(CommentTodo(
-                    username=self._username,
-                    time_info=self._time_info,
-                    url=self._url,
-                    text=todo_text,
-                    is_quoted=is_quoted,
-                    extra_info=self._get_extra_info(),
-                    completed=completed))
-
-        return todos
+        return [todo for todo in self.get_all_todos() if todo.is_completed() == completed]
+
+    def get_all_todos(self):
+        """Return a list of all todos in the comment, both incomplete and completed
+
+        The comment is scanned just once for both kinds of todos. Returns a list of
+        CommentTodo objects, in order of appearance in the comment (use
+        CommentTodo.is_completed to tell them apart).
+        """
+        return [CommentTodo(username=self._username,
+                            time_info=self._time_info,
+                            url=self._url,
+                            text=todo_text,
+                            is_quoted=is_quoted,
+                            extra_info=self._get_extra_info(),
+                            completed=completed)
+                for (todo_text, completed, is_quoted) in self._get_extracted_todos()]
+
+    def get_todo_progress(self):
+        """Return a tuple (num_completed, num_total) counting the todos in the comment"""
+        todos = self._get_extracted_todos()
+        return (sum(1 for (_, completed, _) in todos if completed), len(todos))
+
+    def _get_extracted_todos(self):
+        """Return the todos in the comment, as returned by extract_todos
+
+        The content is only parsed the first time this is called: since a comment's
+        content never changes (an edited comment is fetched as a new Comment object),
+        later calls, e.g. for outstanding todos and then completed ones, reuse the result.
+        """
+        if self._todos is None:
+            self._todos = extract_todos(self._content)
+        return self._todos
 
     # This method needs to be implemented by each derived class
     def _type_as_str(self):
@@ -95,11 +116,23 @@ class Comment:
                                   url=self._url,
                                   content=textwrap.indent(content_filled, INDENT_LEVEL*" ")))
 
+    def __getstate__(self):
+        # The todos are extracted (if they haven't been already) before pickling, so that
+        # they are stored along with the comment in a PR snapshot, and comments loaded
+        # from an unchanged snapshot are never parsed again
+        self._get_extracted_todos()
+        return self.__dict__
+
     def __eq__(self, other):
         if isinstance(other, Comment):
-            return self.__dict__ == other.__dict__
+            # Whether the todos have been extracted yet doesn't matter
+            return _without_todos(self.__dict__) == _without_todos(other.__dict__)
         return NotImplemented
 
+def _without_todos(fields):
+    """Return a copy of the given dict of a Comment's fields, without its extracted todos"""
+    return {key: value for (key, value) in fields.items() if key != "_todos"}
+
 class PRBodyComment(Comment):
     """Class for holding a PR body comment"""
     def _type_as_str(self):
@@ -21,27 +21,27 @@ _UOL = r"(?:" + _UL + r"|" + _OL + r")"
 # list: either _OL or _UL followed by one or more whitespace characters
 _LIST = _UOL + r"\s+"
 
-# checkbox: '[ ]' followed by one or more whitespace characters
-_CHECKBOX = r"\[ \]\s+"
-
-# completed checkbox: '[x]' or '[X]' followed by one or more whitespace characters
-_CHECKBOX_COMPLETED = r"\[[xX]\]\s+"
+# checkbox, either unchecked ('[ ]') or completed ('[x]' or '[X]'), followed by one or
+# more whitespace characters; the character between the brackets is put in a capture
+# group, so that a single match tells which kind of checkbox it is
+_CHECKBOX = r"\[(?P<mark>[ xX])\]\s+"
 
 # quote: '>' followed by any number of spaces
 _QUOTE = r">\s*"
 
-# any number of list or quote markers
-_ANY_NUM_LIST_OR_QUOTE = r"(?:" + _LIST + r"|" + _QUOTE + r")*"
-
 # a todo item on a line is given by:
 # - at the start of the line, any amount of whitespace
-# - any number of list or quote markers
-# - a list indicator
+# - any number of list or quote markers, the last of which is a list indicator
 # - an optional unordered or ordered list identifier without a space (this may be a bug in
 #   GitHub's parsing, but we are following GitHub's behavior in this respect)
-# - a checkbox
-# - at least one whitespace character, followed by any other characters (this last piece
-#   is put in a capture group)
+# - a checkbox (whose mark, ' ', 'x' or 'X', tells whether it is completed)
+# - at least one whitespace character, followed by any other characters (the text of the
+#   todo item)
+#
+# Only list and quote markers can come before the checkbox, so a line holds at most one
+# checkbox that could start a todo item. This is matched in two steps (see _match_todo):
+# _MARKERS_RE matches the markers, and then _TODO_TAIL_RE matches the rest of the todo
+# item right after them.
 #
 # See https://github.github.com/gfm for GitHub's Markdown specification
 #
@@ -55,25 +55,84 @@ _ANY_NUM_LIST_OR_QUOTE = r"(?:" + _LIST + r"|" + _QUOTE + r")*"
 #     *
 #       [ ] todo
 #
-#     Here we are just parsing things line-by-line. So treating the above as a todo would
-#     add a significant amount of work, and it seems very unlikely to come up in
-#     practice. If this is an issue, a workaround would be to treat a line with some
-#     number of spaces followed by '[ ] ' as a to do item, even though it technically
-#     isn't.
+#     This regex only looks at one line at a time; extract_todos, which also looks at the
+#     previous line, handles this case (see _match_todo).
 #
 # - Our regex is too general/accepting in the following ways:
 #   - We accept any number of digits (GitHub limits the number of digits allowed in an
 #     ordered list item - I think to 9)
 #   - We accept any number of consecutive spaces (GitHub limits the number of consecutive
 #     spaces - I think to 4)
-#   - We accept something that looks like a tasklist item inside a multiline code block:
-#     We parse line by line, detecting when we're inside a code block would add a
-#     significant amount of work.
-def _make_todo_re(checkbox):
-    todo_re_str = r"^\s*" + _ANY_NUM_LIST_OR_QUOTE + _LIST + _UOL + r"?" + checkbox + r"(\S.+)"
-    return re.compile(todo_re_str)
-_TODO_RE = _make_todo_re(_CHECKBOX)
-_TODO_COMPLETED_RE = _make_todo_re(_CHECKBOX_COMPLETED)
+#   - We accept something that looks like a tasklist item inside a code block. Again,
+#     extract_todos, which keeps track of code blocks, handles this (see
+#     _TaskListScanner).
+#
+# Since these regexes run on untrusted text, they are written so that matching takes
+# time linear in the length of the line, with no backtracking: each repeated piece is
+# followed only by things that can't start with a character it matches. (Matching the
+# markers and the checkbox with a single regex, with a list indicator both in the
+# repeated markers and right before the checkbox, would make the regex engine try every
+# marker as the last one whenever there is no checkbox.) tests/fuzz_todo_regex.py
+# checks this.
+#
+# These regexes have no '^', since they are used with match (rather than search) to
+# anchor them at the start of a line, which may be in the middle of a longer text (see
+# extract_todos).
+
+# The markers at the start of a line: any amount of whitespace, then an empty capture
+# group, which only matches if a quote marker comes next (so that the same match tells
+# whether the line is quoted), then any number of list or quote markers. The last marker
+# is put in the capture group 'last', and the last list marker in the group 'list'.
+_MARKERS = (r"\s*(?P<quoted>(?=>))?(?:(?P<last>(?P<list>" + _LIST + r")|" + _QUOTE +
+            r"))*")
+_MARKERS_RE = re.compile(_MARKERS)
+
+# The rest of a todo item, after its markers: an optional list identifier without a space
+# (put in the capture group 'uol'), then a checkbox (whose mark is put in the group
+# 'mark'), then the text of the todo item (put in the group 'text')
+_TODO_TAIL = r"(?P<uol>" + _UOL + r")?" + _CHECKBOX + r"(?P<text>\S.+)"
+_TODO_TAIL_RE = re.compile(_TODO_TAIL)
+
+# One unordered or ordered list identifier, on its own
+_UOL_RE = re.compile(_UOL)
+
+# The indentation and quote markers at the start of a line, whose width tells whether a
+# line continues the list item on the line before it
+_MARGIN_RE = re.compile(r"[ \t>]*")
+
+# The start of a list item: any indentation and quote markers, then a list marker
+_LIST_ITEM_RE = re.compile(r"\s*(?:" + _QUOTE + r")*" + _UOL + r"(?:\s|$)")
+
+# A line that opens or closes a fenced code block: any indentation, quote markers and
+# list markers, then a fence of at least three backticks or tildes, then an 'info string'
+# (e.g., the language of the code)
+_FENCE_RE = re.compile(r"[ \t]*(?:" + _QUOTE + r")*(?:" + _LIST + r")*" +
+                       r"(?P<fence>`{3,}|~{3,})(?P<info>.*)")
+
+# One quote marker, with any indentation before it and the optional space after it
+_QUOTE_MARKER_RE = re.compile(r"[ \t]*>[ \t]?")
+
+# The indentation at the start of a line
+_INDENT_RE = re.compile(r"[ \t]*")
+
+# Number of columns of indentation that make a line (outside of a list) an indented code
+# block, if it doesn't continue a paragraph; and the start of a line indented that far
+_CODE_INDENT = 4
+_CODE_INDENT_RE = re.compile(r" {0,3}\t| {4}")
+
+# The part of a todo item that extract_todos searches for first: a checkbox. Lines
+# without one can't hold a todo item, so only the lines where this is found are matched
+# as todo items (along with the lines holding a code fence, see _FENCES).
+_CHECKBOX_RE = re.compile(r"\[[ xX]\]")
+
+# The strings that start a code fence. (These are searched for with str.find, not as a
+# regex alternative to _CHECKBOX_RE, which is much slower to search for.)
+_FENCES = ("```", "~~~")
+
+# Characters other than '\n' (and '\r' as part of '\r\n') that str.splitlines treats as
+# line boundaries: a lone '\r', and some rarely-used control and Unicode characters
+_UNUSUAL_LINE_BREAKS = ("\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x85", "\u2028",
+                        "\u2029")
 
 _OPTIONAL = r"^\s*(?:optional:|\[optional\]|\(optional\))\s*"
 _OPTIONAL_RE = re.compile(_OPTIONAL, flags=re.IGNORECASE)
@@ -96,13 +155,54 @@ def search_line_for_todo(line, completed=False):
     completed: boolean - if True, find only completed todo items; if False, find only
         uncompleted todo items
     """
-    if completed:
-        match = _TODO_COMPLETED_RE.search(line)
-    else:
-        match = _TODO_RE.search(line)
-    if match is None:
+    todo = classify_todo_line(line)
+    if todo is None or todo[1] != completed:
+        return None
+    return todo[0]
+
+def classify_todo_line(line):
+    """Search a line of text for a todo item, either outstanding or completed
+
+    If the line is a todo item, then returns a tuple (text, completed): text is the part
+    of the line following the todo markdown syntax, and completed is True if the item is
+    checked off. If the line is not a todo item, returns None.
+
+    Args:
+    line: string - one line of text
+    """
+    found = _match_todo(line, 0, len(line))
+    if found is None or found[1]:
         return None
-    return match.group(1)
+    return found[0][:2]
+
+def extract_todos(text):
+    """Find all todo items, outstanding and completed, in a block of Markdown text
+
+    Each line is classified just once as an outstanding todo item, a completed one, or
+    neither, in a single pass over the text. Lines are classified as by classify_todo_line,
+    except that, since this also keeps track of the lines before each one:
+
+    - Lines in fenced or indented code blocks are not todo items
+
+    - A checkbox at the start of a line that continues a list item with no text of its
+      own (like '-' followed by '  [ ] todo') is a todo item
+
+    Rather than splitting the text into lines, this searches the whole text for
+    checkboxes and code fences, and matches only the lines holding one in place (so that,
+    for large texts, most lines are skipped without being copied or matched at all).
+
+    Returns a list of tuples (todo_text, completed, is_quoted), in order of appearance:
+    todo_text and completed are as returned by classify_todo_line, and is_quoted is
+    whether the line is a quote (as returned by is_line_quoted).
+
+    Args:
+    text: string - possibly multiple lines of text (e.g., a comment's content)
+    """
+    if "[" not in text:
+        return []
+    if _has_unusual_line_breaks(text):
+        text = "\n".join(text.splitlines())
+    return _TaskListScanner(text).scan()
 
 def is_line_quoted(line):
     """Returns True if the given line is a quote, False otherwise"""
@@ -110,6 +210,42 @@ def is_line_quoted(line):
         return False
     return True
 
+def _match_todo(text, start, end):
+    """Match the line of text from start to end as a todo item
+
+    If the line is a todo item, then returns a tuple (todo, continued): todo is a tuple
+    (todo_text, completed, is_quoted), as in the list returned by extract_todos; and
+    continued is True if there is no list marker before the checkbox (only indentation
+    and quote markers), so that the line is only a todo item if it continues a list item
+    from the line before (see _TaskListScanner). Otherwise, returns None.
+
+    This takes time linear in the length of the line, however the line is made up.
+
+    Args:
+    text: string
+    start, end: integers - positions of the start and end (excluding any line break) of
+        the line in text
+    """
+    markers = _MARKERS_RE.match(text, start, end)
+    tail = _TODO_TAIL_RE.match(text, markers.end(), end)
+    if tail is None:
+        return None
+    last = markers.group("last")
+    if last is not None and last[0] != ">":
+        continued = False
+    elif tail.group("uol") is None and markers.group("list") is None:
+        continued = True
+    else:
+        return None
+    return ((tail.group("text"), tail.group("mark") != " ",
+             markers.group("quoted") is not None), continued)
+
+def _has_unusual_line_breaks(text):
+    """Return True if text has any line boundaries other than '\n' and '\r\n'"""
+    if "\r" in text and text.count("\r") != text.count("\r\n"):
+        return True
+    return any(line_break in text for line_break in _UNUSUAL_LINE_BREAKS)
+
 # ------------------------------------------------------------------------
 # Begin class definition
 # ------------------------------------------------------------------------
@@ -226,3 +362,291 @@ class CommentTodo:
         if isinstance(other, CommentTodo):
             return self.__dict__ == other.__dict__
         return NotImplemented
+
+# ------------------------------------------------------------------------
+# Private class definitions
+# ------------------------------------------------------------------------
+
+class _TaskListScanner:
+    # pylint: disable=too-few-public-methods
+    """Finds the todo items in a Markdown text, keeping track of code blocks
+
+    This takes one linear pass over the text (see extract_todos), only looking at the
+    lines that hold a checkbox or a code fence (up to the last checkbox). It keeps track
+    of the fenced code block that the current line is in, if any; and, for each checkbox
+    on a line indented far enough to be in an indented code block, looks back over the
+    lines before it to see whether it is. What it finds when looking back is kept for the
+    next such line, so that each line is looked back over at most a few times.
+
+    This follows GitHub's Markdown specification (https://github.github.com/gfm) closely
+    enough for finding todo items, but not exactly; where it doesn't, it errs on the side
+    of finding todo items (as does _match_todo). In particular, an indented line that may
+    be in a list is never treated as code; and a fenced code block in a block quote or a
+    list item is ended by any later line that has fewer quote markers, or is indented less
+    than the fence (since that ends the block quote or list item).
+    """
+
+    def __init__(self, text):
+        """Initialize a _TaskListScanner
+
+        Args:
+        text: string - lines separated by '\\n' or '\\r\\n' (see extract_todos)
+        """
+        self._text = text
+        # The fenced code block that the current line is in, or None if it isn't in one: a
+        # tuple (char, length, depth, indent) of the fence's character and length, the
+        # number of quote markers before it, and its indentation after those (including
+        # any list markers) in columns
+        self._fence = None
+        # Start of the last line known to be in the block quote or list item (if any)
+        # holding the open fenced code block (see _check_fence_container)
+        self._fence_checked = None
+        # For each of _FENCES, the position of the next one in the text (or the length of
+        # the text if there is none), as found by _next_fence
+        self._fence_pos = [-1] * len(_FENCES)
+        # What was found when looking back from the last line looked at by
+        # _in_indented_code: a tuple (line_start, after_blank, anchor) (see there)
+        self._run = None
+        # The last anchor line looked at by _in_indented_code, and whether it may be in a
+        # list: a tuple (anchor, in_list)
+        self._anchor_in_list = None
+
+    def scan(self):
+        """Return the todo items in the text, as returned by extract_todos"""
+        text = self._text
+        # Local names for things used for each line, since there may be very many lines
+        find = text.find
+        rfind = text.rfind
+        match_todo = _match_todo
+        todos = []
+        line_end = 0
+        fence_pos = self._next_fence(0)
+        # Start of the last line that opened or closed a fenced code block
+        fence_line = -1
+        for checkbox in _CHECKBOX_RE.finditer(text):
+            checkbox_start = checkbox.start()
+            if checkbox_start < line_end:
+                # Another checkbox on a line that has already been looked at
+                continue
+            line_start = rfind("\n", 0, checkbox_start) + 1
+            while fence_pos < checkbox_start:
+                # A possible fence on an earlier line, or on this line before the checkbox
+                fence_start = rfind("\n", 0, fence_pos) + 1
+                fence_end = self._line_end(fence_pos)
+                self._check_fence_container(fence_start)
+                fence = _FENCE_RE.match(text, fence_start,
+                                        self._content_end(fence_start, fence_end))
+                if fence is not None and self._update_fence(fence):
+                    fence_line = fence_start
+                fence_pos = self._next_fence(fence_end)
+            line_end = find("\n", checkbox.end())
+            if line_end == -1:
+                line_end = len(text)
+            if fence_pos < line_end:
+                fence_pos = self._next_fence(line_end)
+            self._check_fence_container(line_start)
+            if self._fence is not None or fence_line == line_start:
+                continue
+            end = line_end - 1 if text[line_end - 1] == "\r" else line_end
+            found = match_todo(text, line_start, end)
+            if found is None:
+                continue
+            if found[1] and not self._continues_empty_list_item(line_start, end):
+                continue
+            if (_CODE_INDENT_RE.match(text, line_start, end) is not None and
+                    self._in_indented_code(line_start)):
+                continue
+            todos.append(found[0])
+        return todos
+
+    def _next_fence(self, pos):
+        """Return the position of the first possible fence at or after pos
+
+        Returns the length of the text if there is none.
+        """
+        for (i, fence_pos) in enumerate(self._fence_pos):
+            if fence_pos < pos:
+                fence_pos = self._text.find(_FENCES[i], pos)
+                self._fence_pos[i] = len(self._text) if fence_pos == -1 else fence_pos
+        return min(self._fence_pos)
+
+    def _update_fence(self, fence):
+        """Open or close a fenced code block, if the given fence does so
+
+        Returns True if it does (so that the line is a fence line, and not content).
+
+        Args:
+        fence: match object from _FENCE_RE
+        """
+        chars = fence.group("fence")
+        info = fence.group("info")
+        if self._fence is None:
+            if chars[0] == "`" and "`" in info:
+                # Not a fence, but inline code like '```code```'
+                return False
+            if (_CODE_INDENT_RE.match(self._text, fence.pos, fence.endpos) is not None and
+                    self._in_indented_code(fence.pos)):
+                # Not a fence, but a line of an indented code block
+                return False
+            depth = self._text.count(">", fence.pos, fence.start("fence"))
+            content = self._skip_quotes(fence.pos, fence.endpos, depth)
+            indent = len(self._text[content:fence.start("fence")].expandtabs(4))
+            self._fence = (chars[0], len(chars), depth, indent)
+            self._fence_checked = fence.pos
+            return True
+        if chars[0] == self._fence[0] and len(chars) >= self._fence[1] and not info.strip():
+            self._fence = None
+            return True
+        return False
+
+    def _check_fence_container(self, start):
+        """Close the open fenced code block if its block quote or list item has ended
+
+        This looks at each line after the last one looked at (see _fence_checked), up to
+        and including the line at start: if any of them has fewer quote markers than the
+        fence, or isn't blank and is indented less than the fence, the block quote or list
+        item holding the fenced code block (and so the block itself) ends there.
+
+        Args:
+        start: integer - position of the start of a line in the text
+        """
+        if self._fence is None or self._fence[2:] == (0, 0):
+            return
+        (_, _, depth, indent) = self._fence
+        pos = self._fence_checked
+        while pos < start:
+            pos = self._line_end(pos) + 1
+            end = self._content_end(pos, self._line_end(pos))
+            content = self._skip_quotes(pos, end, depth)
+            if content is None or (not self._is_blank(content, end) and
+                                   self._indent(content, end) < indent):
+                self._fence = None
+                return
+            self._fence_checked = pos
+
+    def _skip_quotes(self, start, end, depth):
+        """Return the position after the first depth quote markers of the given line
+
+        Returns None if the line has fewer quote markers than that.
+
+        Args:
+        start, end: integers - positions of the start and end (excluding any line break)
+            of the line in the text
+        depth: integer - number of quote markers
+        """
+        for _ in range(depth):
+            marker = _QUOTE_MARKER_RE.match(self._text, start, end)
+            if marker is None:
+                return None
+            start = marker.end()
+        return start
+
+    def _continues_empty_list_item(self, start, end):
+        """Return True if the given line continues a list item with no text of its own
+
+        This is the case if the line before it is such a list item, and this line is
+        indented further than that one (after any quote markers).
+
+        Args:
+        start, end: integers - positions of the start and end (excluding any line break)
+            of the line in the text
+        """
+        if start == 0:
+            return False
+        prev_start = self._text.rfind("\n", 0, start - 1) + 1
+        prev_end = self._content_end(prev_start, start - 1)
+        # The line before must end with a list identifier, with or without whitespace
+        # after it (in which case it is the last of the line's markers)
+        markers = _MARKERS_RE.match(self._text, prev_start, prev_end)
+        if markers.end() == prev_end:
+            last = markers.group("last")
+            if last is None or last[0] == ">":
+                return False
+        elif _UOL_RE.fullmatch(self._text, markers.end(), prev_end) is None:
+            return False
+        margin = _MARGIN_RE.match(self._text, start, end).group()
+        prev_margin = _MARGIN_RE.match(self._text, prev_start, prev_end).group()
+        return len(margin.expandtabs(4)) > len(prev_margin.expandtabs(4))
+
+    def _in_indented_code(self, start):
+        """Return True if the (indented) line at start is in an indented code block
+
+        This looks back over the blank and indented lines before this one, to the last
+        line that isn't indented (the 'anchor' line). This line is in an indented code
+        block if there is a blank line between the two (so that it doesn't continue the
+        anchor's paragraph) and the anchor's paragraph may not be in a list; or if there
+        is no anchor line at all.
+
+        Args:
+        start: integer - position of the start of the line in the text
+        """
+        text = self._text
+        pos = start
+        after_blank = False
+        while True:
+            if self._run is not None and pos == self._run[0]:
+                # The rest of this look back was done for an earlier line
+                after_blank = after_blank or self._run[1]
+                anchor = self._run[2]
+                break
+            if pos == 0:
+                after_blank = True
+                anchor = None
+                break
+            prev_start = text.rfind("\n", 0, pos - 1) + 1
+            prev_end = self._content_end(prev_start, pos - 1)
+            if self._is_blank(prev_start, prev_end):
+                after_blank = True
+            elif self._indent(prev_start, prev_end) < _CODE_INDENT:
+                anchor = prev_start
+                break
+            pos = prev_start
+        self._run = (start, after_blank, anchor)
+        if not after_blank:
+            return False
+        if anchor is None:
+            return True
+        if self._anchor_in_list is None or self._anchor_in_list[0] != anchor:
+            self._anchor_in_list = (anchor, self._paragraph_in_list(anchor))
+        return not self._anchor_in_list[1]
+
+    def _paragraph_in_list(self, start):
+        """Return True if the paragraph ending with the line at start may be in a list
+
+        This is the case if any of its lines start a list item, or if the line is
+        indented at all (as the later paragraphs of a list item are).
+
+        Args:
+        start: integer - position of the start of the line in the text
+        """
+        text = self._text
+        end = self._content_end(start, self._line_end(start))
+        if self._indent(start, end) > 0:
+            return True
+        while not self._is_blank(start, end):
+            if _LIST_ITEM_RE.match(text, start, end) is not None:
+                return True
+            if start == 0:
+                return False
+            end = self._content_end(text.rfind("\n", 0, start - 1) + 1, start - 1)
+            start = text.rfind("\n", 0, start - 1) + 1
+        return False
+
+    def _is_blank(self, start, end):
+        """Return True if the line from start to end holds only whitespace"""
+        return _INDENT_RE.match(self._text, start, end).end() == end
+
+    def _indent(self, start, end):
+        """Return the number of columns of indentation of the line from start to end"""
+        return len(_INDENT_RE.match(self._text, start, end).group().expandtabs(4))
+
+    def _line_end(self, pos):
+        """Return the end of the line holding pos, including any trailing '\\r'"""
+        end = self._text.find("\n", pos)
+        return len(self._text) if end == -1 else end
+
+    def _content_end(self, start, end):
+        """Return the end of the line from start to end, excluding any trailing '\\r'"""
+        if end > start and self._text[end - 1] == "\r":
+            return end - 1
+        return end
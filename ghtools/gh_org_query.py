@@ -1,7 +1,24 @@
 """Functions implementing gh-org-query tool"""
 
 import argparse
-from ghtools.github_fetch import fetch_organization
+import concurrent.futures
+import datetime
+import itertools
+import os
+import sys
+import requests
+from ghtools.github_client import GitHubApiError, PER_PAGE, DEFAULT_MAX_CONNECTIONS_PER_HOST, \
+    MAX_SEARCH_RESULTS
+from ghtools.github_fetch import configure_client, get_client, reset_client, \
+    list_open_pull_requests, fetch_pull_request, \
+    fetch_open_pull_requests
+from ghtools.github_search import search_open_pull_requests, search_user_pull_requests
+from ghtools.pr_snapshot import SnapshotStore, InboxSnapshot, SNAPSHOT_SUBDIR
+from ghtools.repo_index import fetch_repo_index
+from ghtools.scan_checkpoint import ScanCheckpoint, parse_shard, in_shard, merge_checkpoints
+from ghtools.utils import print_client_stats, add_cache_arguments, get_cache_dir, \
+    add_cassette_arguments, get_cassette, add_per_page_argument, ordered_map, \
+    date_string_to_datetime
 
 # ========================================================================
 # Public functions
@@ -10,47 +27,698 @@ from ghtools.github_fetch import fetch_organization
 def main():
     """Main function called when gh-org-query is run from the command line"""
     args = _commandline_args()
-    gh_org_query(org=args.org,
-                 list_repos=args.list_repos)
+    if args.merge:
+        if merge_org_todos(args.merge) > 0:
+            sys.exit(1)
+        return
+    try:
+        num_failures = gh_org_query(org=args.org,
+                                    list_repos=args.list_repos,
+                                    repo_details=args.long,
+                                    todo=args.todo,
+                                    inbox_username=args.inbox,
+                                    repo_wide=args.repo_wide,
+                                    prefilter=args.prefilter or args.prefilter_query is not None,
+                                    prefilter_query=args.prefilter_query or "",
+                                    updated_since=args.updated_since,
+                                    skip_archived=args.skip_archived,
+                                    pushed_since=args.pushed_since,
+                                    index_max_age=args.index_max_age,
+                                    shard=args.shard,
+                                    checkpoint_path=args.checkpoint,
+                                    max_workers=args.jobs,
+                                    per_page=args.per_page,
+                                    cache_dir=get_cache_dir(args),
+                                    cassette=get_cassette(args),
+                                    verbose=args.verbose)
+    finally:
+        # This saves any cassette being recorded, even if the scan is interrupted
+        reset_client()
+    if num_failures > 0:
+        sys.exit(1)
 
-def gh_org_query(org, list_repos):
+def gh_org_query(org, list_repos, repo_details=False, todo=False, inbox_username=None,
+                 repo_wide=False, prefilter=False, prefilter_query="", updated_since=None,
+                 skip_archived=False, pushed_since=None, index_max_age=None, shard=None,
+                 checkpoint_path=None, max_workers=1, per_page=PER_PAGE, cache_dir=None,
+                 cassette=None, verbose=False):
     """Implementation of the gh-org-query command
 
+    Returns the number of repositories and pull requests that could not be fetched (with
+    todo or inbox_username; otherwise always 0)
+
     Args:
     org: string - Github organization
     list_repos: boolean - Whether to list all repositories in this organization
+    repo_details: boolean - With list_repos, whether to print the metadata of each
+        repository (see organization.RepoInfo.get_summary) rather than just its name
+    todo: boolean - Whether to print all outstanding todo items in all open pull
+        requests in this organization
+    inbox_username: string or None - A GitHub user name; if provided, print the
+        outstanding todo items in this user's inbox (see print_user_inbox)
+    repo_wide: boolean - With todo, whether to fetch each repository's comments with
+        repo-wide requests rather than pull request by pull request (see
+        print_org_todos)
+    prefilter: boolean - With todo, whether to use GitHub's search API to find the open
+        pull requests to scan, rather than listing the pull requests in every repository.
+        Without prefilter_query (or updated_since), this finds the same pull requests, so
+        it is only a shortcut for listing them. If the search results are incomplete
+        (including when more than 1000 pull requests match), all repositories are
+        scanned instead.
+    prefilter_query: string - With prefilter, further search terms and qualifiers that
+        the pull requests to scan must match (see github_search.search_open_pull_requests)
+    updated_since: string or None - A string formatted as an ISO date/time (e.g.,
+        YYYY-MM-DD); if provided, with todo, will only show todo items in comments
+        updated since this date/time. Pull requests not updated since then are skipped
+        without being fetched.
+    skip_archived: boolean - With list_repos or todo, whether to skip archived
+        repositories
+    pushed_since: string or None - A string formatted as an ISO date/time; if provided,
+        with list_repos or todo, skip the repositories that have not been pushed to since
+        this date/time
+    index_max_age: number or None - With cache_dir, if provided, the index of the
+        organization's repositories kept in cache_dir is used without refreshing it if it
+        was fetched less than this many minutes ago (see repo_index.fetch_repo_index).
+        Note that with todo (without prefilter), repositories that had no open issues or
+        pull requests in the index are not scanned, so pull requests opened since then
+        can be missed.
+    shard: tuple (index, count) or None - With todo, if provided (e.g., as given by
+        scan_checkpoint.parse_shard), only scan the repositories in this shard of the
+        organization (see scan_checkpoint.in_shard)
+    checkpoint_path: string or None - With todo, if provided, the output of each
+        repository is recorded in this checkpoint file once it is complete; if the file
+        already exists, the scan it records is resumed (see scan_checkpoint)
+    max_workers: integer - Maximum number of concurrent requests to GitHub (for the list
+        of repositories, and for the scan with todo)
+    per_page: integer - Number of items to request per page from GitHub
+    cache_dir: string or None - Directory for the on-disk cache of GitHub API responses;
+        an index of the organization's repositories and snapshots of the pull requests
+        are also kept here, so that later runs only fetch what has changed. If None, no
+        cache is used.
+    cassette: Cassette or None - if given, all GitHub API requests are recorded to or
+        replayed from this cassette
+    verbose: boolean - Whether verbose output is enabled
     """
-    org = fetch_organization(org)
+    # pylint: disable=too-many-arguments,too-many-locals,too-many-branches
+    configure_client(max_connections_per_host=max(max_workers,
+                                                  DEFAULT_MAX_CONNECTIONS_PER_HOST),
+                     per_page=per_page,
+                     cache_dir=cache_dir,
+                     cassette=cassette)
+    client = get_client()
+    updated_since_time = date_string_to_datetime(updated_since)
+    if prefilter and updated_since_time is not None:
+        prefilter_query = "{} updated:>={}".format(
+            prefilter_query,
+            updated_since_time.astimezone(datetime.timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%SZ")).strip()
+    pushed_since_time = date_string_to_datetime(pushed_since)
+    snapshots = None
+    if cache_dir is not None:
+        snapshots = SnapshotStore(os.path.join(cache_dir, SNAPSHOT_SUBDIR))
+    repos = None
+    if list_repos or (todo and (not prefilter or skip_archived or
+                                pushed_since_time is not None)):
+        repos = _fetch_repos(org, snapshots, index_max_age, max_workers, client,
+                             include_archived=not skip_archived,
+                             pushed_since_time=pushed_since_time)
     if list_repos:
-        for repo in org.get_repos(type='all', sort='full_name', direction='asc'):
-            print(repo.full_name)
+        for repo in repos:
+            print(repo.get_summary() if repo_details else repo.get_full_name())
+    num_failures = 0
+    if todo:
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = ScanCheckpoint(
+                checkpoint_path,
+                {"org": org,
+                 "shard": None if shard is None else "{}/{}".format(*shard),
+                 "prefilter_query": prefilter_query,
+                 "updated_since": updated_since,
+                 "skip_archived": skip_archived,
+                 "pushed_since": pushed_since})
+        candidates = None
+        if prefilter:
+            (candidates, complete) = search_open_pull_requests(org,
+                                                               extra_query=prefilter_query,
+                                                               max_workers=max_workers,
+                                                               client=client,
+                                                               stop_if_truncated=True)
+            if not complete:
+                print("Search results for {org} are incomplete (more than {max_results} "
+                      "pull requests match, or the search timed out); scanning all "
+                      "repositories instead".format(org=org, max_results=MAX_SEARCH_RESULTS),
+                      file=sys.stderr)
+                candidates = None
+        if candidates is not None:
+            repo_names = (None if repos is None
+                          else {repo.get_full_name().lower() for repo in repos})
+            num_failures = print_pull_request_todos(
+                [(repo, pr_number) for (repo, pr_number) in candidates
+                 if (shard is None or in_shard(repo, shard)) and
+                 (repo_names is None or repo.lower() in repo_names)],
+                max_workers=max_workers,
+                client=client,
+                snapshots=snapshots,
+                updated_since_time=updated_since_time,
+                checkpoint=checkpoint)
+        else:
+            if repos is None:
+                repos = _fetch_repos(org, snapshots, index_max_age, max_workers, client)
+            # Repositories without any open issues or pull requests are skipped without
+            # listing their pull requests
+            num_failures = print_org_todos([repo.get_full_name() for repo in repos
+                                            if repo.may_have_open_pull_requests() and
+                                            (shard is None or
+                                             in_shard(repo.get_full_name(), shard))],
+                                           max_workers=max_workers,
+                                           client=client,
+                                           snapshots=snapshots,
+                                           repo_wide=repo_wide,
+                                           updated_since_time=updated_since_time,
+                                           checkpoint=checkpoint)
+        if checkpoint is not None and num_failures == 0:
+            checkpoint.mark_complete()
+    if inbox_username is not None:
+        num_failures += print_user_inbox(org, inbox_username,
+                                         max_workers=max_workers,
+                                         client=client,
+                                         snapshots=snapshots)
+    if verbose:
+        print_client_stats(client)
+    return num_failures
+
+def print_org_todos(repo_names, max_workers, client, snapshots=None, repo_wide=False,
+                    updated_since_time=None, checkpoint=None):
+    # pylint: disable=too-many-arguments
+    """Print all outstanding todo items in all open pull requests in the given repos
+
+    Each pull request with any outstanding todo items is printed with its header, in
+    order of repo and then PR number.
+
+    Everything is fetched through a single pool of max_workers threads, which also find
+    the todo items of each pull request and format them for printing as soon as it has
+    been fetched, and then discard it; so all that waits to be printed is the formatted
+    output. This output is printed as soon as it and all earlier output is ready, and
+    only a bounded number of results is ever pending, so memory use doesn't grow with the
+    size of the organization, and output starts as soon as the first pull requests have
+    been fetched. How the pull requests are fetched depends on the options:
+
+    - With snapshots (and without repo_wide), each repo's list of open pull requests is
+      fetched, then each pull request is fetched concurrently, updating its snapshot;
+      pull requests that have not been updated since their snapshot was taken are not
+      fetched at all.
+
+    - Otherwise, the repos are fetched concurrently, each one as a whole: the pull
+      requests are built from the repo's list of open pull requests, and only their
+      comments and reviews are fetched (see fetch_open_pull_requests). With repo_wide,
+      the comments are fetched with GitHub's repo-wide comment endpoints, which needs
+      far fewer requests for repos with many open pull requests.
+
+    If fetching a repo's list of pull requests or a pull request fails, an error message
+    is printed to stderr and the scan continues.
+
+    With a checkpoint, the output of each repo is recorded there as soon as all of its
+    pull requests have been fetched without errors; repos already recorded there (by an
+    earlier, interrupted scan) are not fetched again, and their recorded output is
+    printed instead.
+
+    Returns the number of repos and pull requests that could not be fetched.
+
+    Args:
+    repo_names: iterable of strings - full names (ORG/REPO) of the repositories to scan
+    max_workers: integer - Maximum number of concurrent requests to GitHub
+    client: GitHubClient
+    snapshots: SnapshotStore or None - if given, snapshots of the pull requests are kept
+        here, so that later scans only fetch what has changed
+    repo_wide: boolean - whether to fetch comments with repo-wide requests
+    updated_since_time: datetime.datetime or None - if given, only todo items in
+        comments updated at or after this time are printed; pull requests last updated
+        before this time are skipped (and, since GitHub lists them in order of their last
+        update, the parts of each repo's list of pull requests holding them aren't even
+        fetched)
+    checkpoint: ScanCheckpoint or None
+    """
+    # Allow a few more requests to be queued than there are threads, so that the threads
+    # stay busy while the results of earlier requests are printed
+    max_pending = 2 * max_workers
+    failures = []
+
+    # Each of these gives None for repos already in the checkpoint
+    def list_prs(repo):
+        if _get_checkpointed(checkpoint, repo) is not None:
+            return None
+        return list_open_pull_requests(repo, client=client,
+                                       updated_since_time=updated_since_time)
+
+    def scan_repo(repo):
+        if _get_checkpointed(checkpoint, repo) is not None:
+            return None
+        pull_requests = fetch_open_pull_requests(repo, client=client, repo_wide=repo_wide,
+                                                 updated_since_time=updated_since_time)
+        return "".join(_format_todos(pull_request, updated_since_time=updated_since_time)
+                       for pull_request in pull_requests)
+
+    def open_pull_requests(executor):
+        """Generate (repo, pr_number, pr_updated_at) tuples for the open PRs in repo_names,
+        with a tuple (repo, None, None) after the PRs of each repo"""
+        for repo, future in ordered_map(executor, list_prs, repo_names, max_pending):
+            try:
+                listed_prs = future.result()
+            except (GitHubApiError, requests.exceptions.RequestException) as error:
+                failures.append(repo)
+                print("Error listing pull requests in {repo}: {error}".format(
+                    repo=repo, error=error), file=sys.stderr)
+                continue
+            for (pr_number, pr_updated_at) in listed_prs or []:
+                yield (repo, pr_number, pr_updated_at)
+            yield (repo, None, None)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if repo_wide or snapshots is None:
+            for repo, future in ordered_map(executor, scan_repo, repo_names, max_pending):
+                try:
+                    output = future.result()
+                except (GitHubApiError, requests.exceptions.RequestException) as error:
+                    failures.append(repo)
+                    print("Error fetching pull requests in {repo}: {error}".format(
+                        repo=repo, error=error), file=sys.stderr)
+                    continue
+                if output is None:
+                    print(_get_checkpointed(checkpoint, repo), end="")
+                    continue
+                print(output, end="")
+                if checkpoint is not None:
+                    checkpoint.add(repo, output)
+        else:
+            _print_todos_by_pr(executor, open_pull_requests(executor), client, snapshots,
+                               max_pending, failures, updated_since_time, checkpoint)
+    return len(failures)
+
+def print_pull_request_todos(prs, max_workers, client, snapshots=None,
+                             updated_since_time=None, checkpoint=None):
+    # pylint: disable=too-many-arguments
+    """Print all outstanding todo items in the given pull requests
+
+    Each pull request with any outstanding todo items is printed with its header, in the
+    given order. The pull requests are fetched concurrently, as in print_org_todos; if
+    fetching one fails, an error message is printed to stderr and the scan continues.
+    With a checkpoint, the output of each repo is recorded as in print_org_todos.
+
+    Returns the number of pull requests that could not be fetched.
+
+    Args:
+    prs: iterable of tuples (repo, pr_number) - the pull requests to scan, grouped by
+        repo
+    max_workers: integer - Maximum number of concurrent requests to GitHub
+    client: GitHubClient
+    snapshots: SnapshotStore or None - if given, snapshots of the pull requests are kept
+        here, so that later scans only fetch what has changed
+    updated_since_time: datetime.datetime or None - if given, only todo items in
+        comments updated at or after this time are printed
+    checkpoint: ScanCheckpoint or None
+    """
+    def repo_pull_requests():
+        """Generate the tuples taken by _print_todos_by_pr"""
+        for repo, repo_prs in itertools.groupby(prs, key=lambda pr: pr[0]):
+            if _get_checkpointed(checkpoint, repo) is None:
+                for (_, pr_number) in repo_prs:
+                    yield (repo, pr_number, None)
+            yield (repo, None, None)
+
+    failures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        _print_todos_by_pr(executor, repo_pull_requests(), client, snapshots,
+                           2 * max_workers, failures, updated_since_time, checkpoint)
+    return len(failures)
+
+def print_user_inbox(org, username, max_workers, client, snapshots=None):
+    """Print the outstanding todo items in an organization that concern a user
+
+    These are all outstanding todo items in the open pull requests that the user
+    authored, reviewed or was asked to review, and the user's own outstanding todo items
+    in any other open pull request in which they are involved. The pull requests are
+    found with the GitHub search API (see search_user_pull_requests) and then fetched
+    concurrently; each one with any such todo items is printed with its header, in order
+    of repo and then PR number.
+
+    With snapshots, the user's inbox is also kept there between runs, and pull requests
+    that have not been updated since they were last fetched are not fetched again.
+
+    If fetching a pull request fails, an error message is printed to stderr and the rest
+    are still printed. If the search results are incomplete, a warning is printed to
+    stderr.
+
+    Returns the number of pull requests that could not be fetched.
+
+    Args:
+    org: string - GitHub organization
+    username: string - GitHub user name
+    max_workers: integer - Maximum number of concurrent requests to GitHub
+    client: GitHubClient
+    snapshots: SnapshotStore or None - if given, snapshots of the pull requests and of
+        the user's inbox are kept here
+    """
+    (prs, complete) = search_user_pull_requests(org, username, max_workers=max_workers,
+                                                client=client)
+    if not complete:
+        print("Warning: search results for {username} in {org} are incomplete; some pull "
+              "requests may be missing".format(username=username, org=org),
+              file=sys.stderr)
+    inbox_key = None
+    cached = {}
+    if snapshots is not None:
+        inbox_key = SnapshotStore.make_inbox_key(client.get_base_url(), org, username)
+        inbox = snapshots.load(inbox_key)
+        if isinstance(inbox, InboxSnapshot):
+            cached = inbox.pull_requests
+    pull_requests = {}
+    failures = []
+
+    def scan_one(pr):
+        (repo, pr_number, pr_updated_at, own_todos_only) = pr
+        cached_pr = cached.get((repo, pr_number))
+        if cached_pr is not None and cached_pr[0] == pr_updated_at:
+            pull_request = cached_pr[1]
+        else:
+            pull_request = fetch_pull_request(repo=repo,
+                                              pr_number=pr_number,
+                                              client=client,
+                                              snapshots=snapshots)
+        return (pull_request,
+                _format_todos(pull_request,
+                              filter_username=username if own_todos_only else None))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for pr, future in ordered_map(executor, scan_one, prs, 2 * max_workers):
+            (repo, pr_number, pr_updated_at, _) = pr
+            try:
+                (pull_request, output) = future.result()
+            except (GitHubApiError, requests.exceptions.RequestException) as error:
+                failures.append((repo, pr_number))
+                print("Error fetching {repo}#{pr_number}: {error}".format(
+                    repo=repo, pr_number=pr_number, error=error), file=sys.stderr)
+                continue
+            pull_requests[(repo, pr_number)] = (pr_updated_at, pull_request)
+            print(output, end="")
+    if snapshots is not None:
+        # Pull requests no longer in the inbox (e.g., because they were closed) are dropped
+        snapshots.save(inbox_key, InboxSnapshot(pull_requests))
+    return len(failures)
+
+def merge_org_todos(checkpoint_paths):
+    """Print the combined output of several scans from their checkpoint files
+
+    This is for combining the output of the shards of a scan (see gh_org_query): the
+    output of all of their repositories is printed in order of repository name, as in
+    a single scan of the whole organization. A warning is printed to stderr for each
+    checkpoint whose scan was not complete.
+
+    Returns the number of checkpoints whose scans were not complete.
+
+    Args:
+    checkpoint_paths: list of strings - paths to the checkpoint files
+    """
+    (outputs, incomplete) = merge_checkpoints(checkpoint_paths)
+    for output in outputs:
+        print(output, end="")
+    for path in incomplete:
+        print("Warning: the scan recorded in {path} is not complete".format(path=path),
+              file=sys.stderr)
+    return len(incomplete)
 
 # ========================================================================
 # Private functions
 # ========================================================================
 
+def _print_todos_by_pr(executor, prs, client, snapshots, max_pending, failures,
+                       updated_since_time=None, checkpoint=None):
+    # pylint: disable=too-many-arguments
+    """Fetch the given pull requests one by one, printing their outstanding todo items
+
+    The todo items of each pull request are found and formatted by the executor's
+    threads, right after fetching it; see print_org_todos.
+
+    Args:
+    executor: concurrent.futures.Executor - used to fetch the pull requests
+    prs: iterable of tuples (repo, pr_number, pr_updated_at), where pr_updated_at is the
+        PR's 'updated_at' time as given by GitHub, or None if not known; grouped by repo,
+        with a tuple (repo, None, None) after the PRs of each repo. For repos already in
+        the checkpoint, only that last tuple should be given.
+    client: GitHubClient
+    snapshots: SnapshotStore or None
+    max_pending: integer - maximum number of pull requests being fetched at once
+    failures: list - each pull request that could not be fetched is appended to this
+    updated_since_time: datetime.datetime or None - if given, only todo items in
+        comments updated at or after this time are printed
+    checkpoint: ScanCheckpoint or None - if given, the output of each repo is recorded
+        here once all of its PRs have been fetched without errors; for repos already
+        recorded here, the recorded output is printed
+    """
+    def scan_one(pr):
+        (repo, pr_number, pr_updated_at) = pr
+        if pr_number is None:
+            return None
+        pull_request = fetch_pull_request(repo=repo,
+                                          pr_number=pr_number,
+                                          client=client,
+                                          snapshots=snapshots,
+                                          updated_since_time=updated_since_time,
+                                          pr_updated_at=pr_updated_at)
+        return _format_todos(pull_request, updated_since_time=updated_since_time)
+
+    # The output so far of the current repo, and whether any of its PRs failed
+    repo_outputs = []
+    repo_failed = False
+    for (repo, pr_number, _), future in ordered_map(executor, scan_one, prs, max_pending):
+        if pr_number is None:
+            checkpointed = _get_checkpointed(checkpoint, repo)
+            if checkpointed is not None:
+                print(checkpointed, end="")
+            elif checkpoint is not None and not repo_failed:
+                checkpoint.add(repo, "".join(repo_outputs))
+            repo_outputs = []
+            repo_failed = False
+            continue
+        try:
+            output = future.result()
+        except (GitHubApiError, requests.exceptions.RequestException) as error:
+            failures.append((repo, pr_number))
+            repo_failed = True
+            print("Error fetching {repo}#{pr_number}: {error}".format(
+                repo=repo, pr_number=pr_number, error=error), file=sys.stderr)
+            continue
+        print(output, end="")
+        repo_outputs.append(output)
+
+def _fetch_repos(org, snapshots, index_max_age, max_workers, client, include_archived=True,
+                 pushed_since_time=None):
+    # pylint: disable=too-many-arguments
+    """Return a list of RepoInfo objects for the repositories in the given organization
+
+    The repositories are taken from the organization's repository index (see
+    repo_index.fetch_repo_index), and filtered as for Organization.get_repos.
+
+    Args:
+    org: string
+    snapshots: SnapshotStore or None - store in which the index is kept, if any
+    index_max_age: number or None - if given, an index fetched less than this many
+        minutes ago is used without refreshing it
+    max_workers: integer - maximum number of concurrent requests to GitHub
+    client: GitHubClient
+    include_archived, pushed_since_time: as for Organization.get_repos
+    """
+    organization = fetch_repo_index(org, snapshots=snapshots,
+                                    max_age=(None if index_max_age is None
+                                             else datetime.timedelta(minutes=index_max_age)),
+                                    max_workers=max_workers, client=client)
+    return organization.get_repos(include_archived=include_archived,
+                                  pushed_since_time=pushed_since_time)
+
+def _get_checkpointed(checkpoint, repo):
+    """Return the output of repo recorded in checkpoint, or None if there is none
+
+    Args:
+    checkpoint: ScanCheckpoint or None
+    repo: string
+    """
+    if checkpoint is None:
+        return None
+    return checkpoint.get_output(repo)
+
+def _format_todos(pull_request, filter_username=None, updated_since_time=None):
+    """Return the header and outstanding todo items of a PullRequest as printed
+
+    Returns an empty string if the PullRequest has no outstanding todo items.
+
+    Args:
+    pull_request: PullRequest
+    filter_username: string or None - if given, only the todo items authored by this
+        user are included
+    updated_since_time: datetime.datetime or None - if given, only the todo items in
+        comments updated at or after this time are included
+    """
+    todos = pull_request.get_todos(filter_username=filter_username,
+                                   updated_since_time=updated_since_time)
+    if not todos:
+        return ""
+    return "".join([pull_request.get_header() + "\n\n"] +
+                   [str(todo) + "\n\n" for todo in todos])
+
 def _commandline_args():
     """Parse and return command-line arguments"""
 
     description = """
 Tool for querying GitHub organizations
 
-Currently only supports listing all repositories in an organization:
+To list all repositories in an organization:
     gh-org-query -o ORG -r
+
+To list the repositories that are not archived and have been pushed to since a given
+date, with their metadata:
+    gh-org-query -o ORG -r -l --skip-archived --pushed-since 2024-01-01
+
+To show all of the outstanding todo items (i.e., all unchecked checkboxes) in all open
+pull requests in all repositories in an organization:
+    gh-org-query -o ORG -t
+
+To show the outstanding todo items that concern you (all of those in open pull requests
+that you authored, reviewed or were asked to review, and your own in any other open pull
+request) in all repositories in an organization:
+    gh-org-query -o ORG -i USERNAME
+
+To split a scan of a large organization into N shards, run by separate processes (or on
+separate machines), and then combine their output:
+    gh-org-query -o ORG -t --shard 1/N --checkpoint shard1.ckpt
+    ...
+    gh-org-query -o ORG -t --shard N/N --checkpoint shardN.ckpt
+    gh-org-query --merge shard1.ckpt ... shardN.ckpt
 """
 
     parser = argparse.ArgumentParser(
         description=description,
         formatter_class=argparse.RawTextHelpFormatter)
 
-    parser.add_argument('-o', '--org', required=True,
-                        help='GitHub organization')
+    parser.add_argument('-o', '--org',
+                        help='GitHub organization (required except with --merge)')
 
     mode = parser.add_mutually_exclusive_group(required=True)
 
     mode.add_argument('-r', '--list-repos', action='store_true',
                       help='List all repositories in the organization')
 
+    parser.add_argument('-l', '--long', action='store_true',
+                        help='With --list-repos, print the metadata of each repository:\n'
+                        'its name, the time of the last push to it, its default\n'
+                        'branch, its number of open issues and pull requests, and\n'
+                        'whether it is archived (tab-separated)')
+
+    mode.add_argument('-t', '--todo', action='store_true',
+                      help='Print all outstanding todo items in all open pull requests\n'
+                      'in the organization')
+
+    mode.add_argument('-i', '--inbox', metavar='USERNAME',
+                      help='Print the outstanding todo items that concern this user:\n'
+                      'all of those in open pull requests in the organization that\n'
+                      'the user authored, reviewed or was asked to review, and the\n'
+                      'user\'s own todo items in any other open pull request in which\n'
+                      'they are involved')
+
+    mode.add_argument('--merge', nargs='+', metavar='CHECKPOINT',
+                      help='Print the combined output of the scans recorded in these\n'
+                      'checkpoint files (see --checkpoint), typically those of the\n'
+                      'shards of a scan, in order of repository')
+
+    parser.add_argument('--repo-wide', action='store_true',
+                        help='With --todo, fetch the comments of all open pull requests in\n'
+                        'each repository with repository-wide requests, rather than\n'
+                        'pull request by pull request. This needs far fewer requests\n'
+                        'for repositories with many open pull requests, but does not\n'
+                        'use snapshots of pull requests.')
+
+    parser.add_argument('--prefilter', action='store_true',
+                        help='With --todo, use the GitHub search API to find the open pull\n'
+                        'requests in the organization, rather than listing the pull\n'
+                        'requests in every repository. On its own, this is only a\n'
+                        'shortcut for listing them (the same pull requests are scanned),\n'
+                        'which saves requests in organizations with many repositories\n'
+                        'but few open pull requests; note that the search API has a\n'
+                        'lower rate limit. Use --prefilter-query (or --updated-since)\n'
+                        'to scan fewer pull requests. If the search results are\n'
+                        'incomplete (more than 1000 pull requests match, or the search\n'
+                        'times out), all repositories are scanned instead.')
+
+    parser.add_argument('--prefilter-query', metavar='QUERY',
+                        help='With --todo, only scan the open pull requests matching these\n'
+                        'search terms and qualifiers (implies --prefilter). For example,\n'
+                        'use "updated:>=2024-01-01" to skip pull requests that have not\n'
+                        'been updated since then.')
+
+    parser.add_argument('--updated-since',
+                        help='With --todo, only show todo items in comments updated since\n'
+                        'the given date/time. Pull requests not updated since then are\n'
+                        'skipped without being fetched, so a daily scan with this option\n'
+                        'costs in proportion to the day\'s activity.\n'
+                        '(Format can be YYYY-MM-DD or other ISO-formatted date/time\n'
+                        'strings. Unless timezone is explicitly specified, date/time is\n'
+                        'assumed to be UTC.)')
+
+    parser.add_argument('--skip-archived', action='store_true',
+                        help='With --list-repos or --todo, skip archived repositories')
+
+    parser.add_argument('--pushed-since',
+                        help='With --list-repos or --todo, skip the repositories that\n'
+                        'have not been pushed to since the given date/time (in the\n'
+                        'same format as --updated-since). Note that comments on pull\n'
+                        'requests don\'t count as pushes.')
+
+    parser.add_argument('--index-max-age', type=float, metavar='MINUTES',
+                        help='Use the index of the organization\'s repositories kept in\n'
+                        'the cache directory without refreshing it, if it was fetched\n'
+                        'less than this many minutes ago. (By default, the index is\n'
+                        'refreshed on every run, with conditional requests.) Note that\n'
+                        'with --todo, repositories with no open issues or pull requests\n'
+                        'in the index are skipped, so with this option, pull requests\n'
+                        'opened since the index was fetched may be missed.')
+
+    parser.add_argument('--shard', type=_shard, metavar='I/N',
+                        help='With --todo, only scan the I-th of N shards of the\n'
+                        'repositories in the organization (e.g., 2/4). Repositories\n'
+                        'are assigned to shards by a hash of their names, so every\n'
+                        'repository is in exactly one of the N shards.')
+
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help='With --todo, record the output of each repository in FILE\n'
+                        'once it has been scanned. If FILE already exists (e.g., after\n'
+                        'an interrupted scan), resume the scan it records: the\n'
+                        'repositories recorded there are not fetched again.')
+
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Maximum number of concurrent requests to GitHub.\n'
+                        'Use 1 to make all requests sequentially. (Default: %(default)s)')
+
+    add_per_page_argument(parser)
+
+    add_cache_arguments(parser)
+
+    add_cassette_arguments(parser)
+
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Enable verbose output')
+
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    if args.org is None and not args.merge:
+        parser.error("the following arguments are required: -o/--org")
+
     return args
+
+def _shard(string):
+    """Convert a --shard argument to a tuple (index, count)"""
+    try:
+        return parse_shard(string)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from error
@@ -1,9 +1,18 @@
 """Functions implementing gh-pr-query tool"""
 
 import argparse
-import datetime
-from ghtools.github_fetch import fetch_pull_request
-from ghtools.utils import split_pr_url
+import concurrent.futures
+import os
+import sys
+import requests
+from ghtools.github_client import GitHubApiError, DEFAULT_MAX_CONNECTIONS_PER_HOST, \
+    PER_PAGE
+from ghtools.github_fetch import configure_client, get_client, reset_client, \
+    fetch_pull_request
+from ghtools.pr_snapshot import SnapshotStore, SNAPSHOT_SUBDIR
+from ghtools.utils import print_client_stats, split_pr_url, add_cache_arguments, \
+    get_cache_dir, add_cassette_arguments, get_cassette, add_per_page_argument, \
+    date_string_to_datetime, ordered_map
 
 # ========================================================================
 # Public functions
@@ -12,19 +21,30 @@ from ghtools.utils import split_pr_url
 def main():
     """Main function called when gh-pr-query is run from the command line"""
     args = _commandline_args()
-    gh_pr_query(repo=args.repo,
-                pr_number=args.pr_number,
-                show=args.show,
-                todo=args.todo,
-                completed=args.completed,
-                filter_username=args.filter_username,
-                created_since=args.created_since,
-                updated_since=args.updated_since,
-                verbose=args.verbose)
+    try:
+        num_failures = gh_pr_query_batch(prs=args.prs,
+                                         show=args.show,
+                                         todo=args.todo,
+                                         completed=args.completed,
+                                         filter_username=args.filter_username,
+                                         created_since=args.created_since,
+                                         updated_since=args.updated_since,
+                                         max_workers=args.jobs,
+                                         per_page=args.per_page,
+                                         backend=args.backend,
+                                         cache_dir=get_cache_dir(args),
+                                         cassette=get_cassette(args),
+                                         verbose=args.verbose)
+    finally:
+        # This saves any cassette being recorded, even if the run is interrupted
+        reset_client()
+    if num_failures > 0:
+        sys.exit(1)
 
 def gh_pr_query(repo, pr_number, show, todo, completed,
                 filter_username=None, created_since=None, updated_since=None,
-                verbose=False):
+                max_workers=1, per_page=PER_PAGE, backend="rest", cache_dir=None,
+                cassette=None, verbose=False):
     """Implementation of the gh-pr-query command
 
     Args:
@@ -39,32 +59,124 @@ def gh_pr_query(repo, pr_number, show, todo, completed,
         YYYY-MM-DD); if provided, will only show comments created since this date/time
     updated_since: string or None - A string formatted as an ISO date/time (e.g.,
         YYYY-MM-DD); if provided, will only show comments updated since this date/time
+    max_workers: integer - Maximum number of concurrent requests to GitHub
+    per_page: integer - Number of items to request per page from GitHub (with the 'rest'
+        backend)
+    backend: string - Which GitHub API to fetch from: 'rest' or 'graphql'
+    cache_dir: string or None - Directory for the on-disk cache of GitHub API responses
+        (and, with the 'rest' backend, for snapshots of pull requests, so that later
+        queries only fetch what has changed); if None, no cache is used
+    cassette: Cassette or None - if given, GitHub API requests are recorded to or replayed
+        from this cassette
     verbose: boolean - Whether verbose output is enabled
     """
+    configure_client(max_connections_per_host=_max_connections(max_workers),
+                     per_page=per_page,
+                     cache_dir=cache_dir,
+                     cassette=cassette)
+    client = get_client()
+    created_since_datetime = date_string_to_datetime(created_since)
+    updated_since_datetime = date_string_to_datetime(updated_since)
     pull_request = fetch_pull_request(repo=repo,
-                                      pr_number=pr_number)
+                                      pr_number=pr_number,
+                                      max_workers=max_workers,
+                                      client=client,
+                                      backend=backend,
+                                      snapshots=_make_snapshot_store(cache_dir, backend),
+                                      created_since_time=created_since_datetime,
+                                      updated_since_time=updated_since_datetime)
+
+    print(_format_pull_request(pull_request,
+                               show=show,
+                               todo=todo,
+                               completed=completed,
+                               filter_username=filter_username,
+                               created_since_datetime=created_since_datetime,
+                               updated_since_datetime=updated_since_datetime,
+                               verbose=verbose), end="")
+    if verbose:
+        print_client_stats(client)
 
-    created_since_datetime = _date_string_to_datetime(created_since)
-    updated_since_datetime = _date_string_to_datetime(updated_since)
+def gh_pr_query_batch(prs, show, todo, completed,
+                      filter_username=None, created_since=None, updated_since=None,
+                      max_workers=1, per_page=PER_PAGE, backend="rest", cache_dir=None,
+                      cassette=None, verbose=False):
+    """Implementation of the gh-pr-query command for any number of pull requests
 
-    if show:
-        print(pull_request.get_content(filter_username=filter_username,
-                                       created_since_time=created_since_datetime,
-                                       updated_since_time=updated_since_datetime))
-    if todo:
-        print_pr_todos(pull_request,
-                       completed=False,
-                       filter_username=filter_username,
-                       created_since_datetime=created_since_datetime,
-                       updated_since_datetime=updated_since_datetime,
-                       verbose=verbose)
-    if completed:
-        print_pr_todos(pull_request,
-                       completed=True,
-                       filter_username=filter_username,
-                       created_since_datetime=created_since_datetime,
-                       updated_since_datetime=updated_since_datetime,
-                       verbose=verbose)
+    The pull requests are fetched concurrently, sharing a single client (and so its
+    connections to GitHub), and the results are printed in the order given. If there is
+    more than one pull request, each one's output is preceded by its header.
+
+    Each pull request's output is formatted by the thread that fetched it, which then
+    discards it, and is printed as soon as all earlier output has been; only a bounded
+    number of pull requests are fetched ahead of the one being printed. So memory use
+    doesn't grow with the number of pull requests, and output starts as soon as the first
+    pull request has been fetched.
+
+    If fetching a pull request fails, an error message is printed to stderr and the
+    remaining pull requests are still processed.
+
+    Returns the number of pull requests that could not be fetched.
+
+    Args:
+    prs: sequence of tuples (repo, pr_number) - the pull requests to query; repo is a
+        string in the form ORG/REPO and pr_number is an integer
+    max_workers: integer - Maximum number of concurrent requests to GitHub. With more than
+        one pull request, this is the number of pull requests fetched at once; with just
+        one, this is the number of concurrent requests used in fetching it.
+    Other args: same as for gh_pr_query
+    """
+    configure_client(max_connections_per_host=_max_connections(max_workers),
+                     per_page=per_page,
+                     cache_dir=cache_dir,
+                     cassette=cassette)
+    client = get_client()
+    snapshots = _make_snapshot_store(cache_dir, backend)
+    created_since_datetime = date_string_to_datetime(created_since)
+    updated_since_datetime = date_string_to_datetime(updated_since)
+    if len(prs) == 1:
+        per_pr_workers = max_workers
+    else:
+        per_pr_workers = 1
+
+    def scan_one(repo_and_number):
+        (repo, pr_number) = repo_and_number
+        pull_request = fetch_pull_request(repo=repo,
+                                          pr_number=pr_number,
+                                          max_workers=per_pr_workers,
+                                          client=client,
+                                          backend=backend,
+                                          snapshots=snapshots,
+                                          created_since_time=created_since_datetime,
+                                          updated_since_time=updated_since_datetime)
+        return _format_pull_request(pull_request,
+                                    show=show,
+                                    todo=todo,
+                                    completed=completed,
+                                    filter_username=filter_username,
+                                    created_since_datetime=created_since_datetime,
+                                    updated_since_datetime=updated_since_datetime,
+                                    verbose=verbose,
+                                    print_header=len(prs) > 1)
+
+    num_failures = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Allow a few more pull requests to be fetched ahead than there are threads, so
+        # that the threads stay busy while earlier output is printed
+        for (repo, pr_number), future in ordered_map(executor, scan_one, prs,
+                                                     2 * max_workers):
+            try:
+                output = future.result()
+            except (GitHubApiError, requests.exceptions.RequestException) as error:
+                num_failures += 1
+                print("Error fetching {repo}#{pr_number}: {error}".format(
+                    repo=repo, pr_number=pr_number, error=error), file=sys.stderr)
+                continue
+            print(output, end="")
+
+    if verbose:
+        print_client_stats(client)
+    return num_failures
 
 def print_pr_todos(pull_request, completed,
                    filter_username, created_since_datetime, updated_since_datetime,
@@ -82,31 +194,76 @@ def print_pr_todos(pull_request, completed,
         comments updated since this date/time
     verbose: boolean - Whether verbose output is enabled
     """
-    if verbose:
-        print(pull_request.get_header() + '\n')
-
     all_todos = pull_request.get_todos(completed=completed,
                                        filter_username=filter_username,
                                        created_since_time=created_since_datetime,
                                        updated_since_time=updated_since_datetime)
+    print(_format_pr_todos(pull_request, all_todos, completed=completed, verbose=verbose),
+          end="")
+
+# ========================================================================
+# Private functions
+# ========================================================================
+
+def _format_pull_request(pull_request, show, todo, completed,
+                         filter_username, created_since_datetime, updated_since_datetime,
+                         verbose, print_header=False):
+    """Return the requested information about one PullRequest, as printed
+
+    Args:
+    pull_request: PullRequest object
+    print_header: boolean - Whether to print the PR's header before the todo items
+        (with show or verbose, the header is printed anyway)
+    Other args: see print_pr_todos
+    """
+    parts = []
+    if show:
+        parts.append(pull_request.get_content(filter_username=filter_username,
+                                              created_since_time=created_since_datetime,
+                                              updated_since_time=updated_since_datetime) +
+                     "\n")
+    if (todo or completed) and print_header and not (show or verbose):
+        parts.append(pull_request.get_header() + "\n\n")
+    if todo or completed:
+        # Find both kinds of todo items in a single pass over the comments
+        (outstanding, done) = pull_request.get_all_todos(
+            filter_username=filter_username,
+            created_since_time=created_since_datetime,
+            updated_since_time=updated_since_datetime)
+        if todo:
+            parts.append(_format_pr_todos(pull_request, outstanding, completed=False,
+                                          verbose=verbose))
+        if completed:
+            parts.append(_format_pr_todos(pull_request, done, completed=True,
+                                          verbose=verbose))
+    return "".join(parts)
+
+def _format_pr_todos(pull_request, all_todos, completed, verbose):
+    """Return the given todo items of a PullRequest, as printed by print_pr_todos
+
+    Args:
+    pull_request: PullRequest object
+    all_todos: list of CommentTodo objects - the PullRequest's todo items to print
+    completed: boolean - whether these are completed todos rather than outstanding todos
+    verbose: boolean - Whether verbose output is enabled
+    """
+    parts = []
     if verbose:
+        parts.append(pull_request.get_header() + "\n\n")
         if completed:
             description = 'COMPLETED'
         else:
             description = 'OUTSTANDING'
-        print('{} {} TODO ITEMS\n'.format(len(all_todos), description))
+        parts.append('{} {} TODO ITEMS\n\n'.format(len(all_todos), description))
     for todo in all_todos:
-        print(str(todo) + "\n")
-
-# ========================================================================
-# Private functions
-# ========================================================================
+        parts.append(str(todo) + "\n\n")
+    return "".join(parts)
 
 def _commandline_args():
     """Parse and return command-line arguments
 
-    Note: even if the positional pr_url is given, the returned args will always have
-    args.repo and args.pr_number set.
+    Note: however the pull requests are specified, the returned args will always have
+    args.prs set: a list of (repo, pr_number) tuples.
     """
 
     description = """
@@ -138,6 +295,16 @@ or:
 
     gh-pr-query https://github.com/ORG/REPO/pull/PR_NUMBER -s
 
+Any number of pull requests can be queried at once, either by giving multiple URLs
+or by listing URLs (one per line) in a file; the pull requests are fetched
+concurrently, and the output for each is preceded by its header:
+
+    gh-pr-query https://github.com/ORG/REPO/pull/PR1 https://github.com/ORG/REPO/pull/PR2 -t
+
+    gh-pr-query -f FILE -t
+
+(Use '-f -' to read the list from standard input.)
+
 Output is sorted by date; for todos, all required todos are listed before optional
 todos. (Optional todos are denoted by starting a todo item with '[optional]',
 '(optional)', or 'optional:', lowercase or uppercase.)
@@ -155,10 +322,15 @@ Examples:
         description=description,
         formatter_class=argparse.RawTextHelpFormatter)
 
-    parser.add_argument('pr_url', nargs='?', default=None,
-                        help='Full URL to the pull request.\n'
-                        'You must specify EITHER this argument OR both\n'
-                        '--repo and --pr-number.')
+    parser.add_argument('pr_url', nargs='*', default=[],
+                        help='Full URL to the pull request (or multiple URLs).\n'
+                        'You must specify EITHER this argument and/or --pr-list\n'
+                        'OR both --repo and --pr-number.')
+
+    parser.add_argument('-f', '--pr-list', type=argparse.FileType('r'),
+                        help='File listing full URLs of pull requests, one per line.\n'
+                        "Blank lines and lines starting with '#' are ignored.\n"
+                        "Use '-' to read the list from standard input.")
 
     parser.add_argument('-r', '--repo',
                         help='GitHub repository, in the form ORG/REPO.\n'
@@ -202,32 +374,73 @@ Examples:
                         'Unless timezone is explicitly specified, date/time is assumed to be UTC.\n'
                         'Requires python 3.7 or later.)')
 
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Maximum number of concurrent requests to GitHub.\n'
+                        'Use 1 to make all requests sequentially. (Default: %(default)s)')
+
+    parser.add_argument('--backend', choices=('rest', 'graphql'), default='rest',
+                        help='Which GitHub API to fetch the pull request from.\n'
+                        "'graphql' fetches the whole pull request with a single query\n"
+                        '(plus one more query per 100 comments or reviews beyond the\n'
+                        'first 100). It requires GITHUB_TOKEN to be set, and does not\n'
+                        'use the on-disk cache. (Default: %(default)s)')
+
+    add_per_page_argument(parser)
+
+    add_cache_arguments(parser)
+
+    add_cassette_arguments(parser)
+
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Enable verbose output')
 
     args = parser.parse_args()
 
-    if args.pr_url:
+    pr_urls = list(args.pr_url)
+    if args.pr_list:
+        with args.pr_list:
+            pr_urls.extend(line.strip() for line in args.pr_list
+                           if line.strip() and not line.strip().startswith('#'))
+        if not pr_urls:
+            parser.error("No pull request URLs found in --pr-list")
+
+    if pr_urls:
         if args.repo or args.pr_number:
-            parser.error("Cannot combine --repo or --pr-number with a positional pr_url")
-        (args.repo, args.pr_number) = split_pr_url(args.pr_url)
-        if args.repo is None or args.pr_number is None:
-            parser.error("Malformed pr_url")
+            parser.error("Cannot combine --repo or --pr-number with a positional pr_url "
+                         "or --pr-list")
+        args.prs = []
+        for pr_url in pr_urls:
+            (repo, pr_number) = split_pr_url(pr_url)
+            if repo is None or pr_number is None:
+                parser.error("Malformed pr_url: {}".format(pr_url))
+            args.prs.append((repo, pr_number))
     else:
         if not args.repo or not args.pr_number:
-            parser.error("Without a positional pr_url, must provide both --repo and --pr-number")
+            parser.error("Without a positional pr_url or --pr-list, must provide both "
+                         "--repo and --pr-number")
+        args.prs = [(args.repo, args.pr_number)]
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.backend == 'graphql' and not os.environ.get("GITHUB_TOKEN"):
+        parser.error("--backend graphql requires GITHUB_TOKEN to be set")
 
     return args
 
-def _date_string_to_datetime(string):
-    """Convert the given string to a datetime.datetime object and return it
+def _make_snapshot_store(cache_dir, backend):
+    """Return the SnapshotStore to use with the given cache directory and backend
 
-    string should be formatted as an ISO date/time (e.g., YYYY-MM-DD)
+    Returns None if snapshots should not be used (snapshots are only supported with the
+    'rest' backend)
+    """
+    if cache_dir is None or backend != "rest":
+        return None
+    return SnapshotStore(os.path.join(cache_dir, SNAPSHOT_SUBDIR))
 
-    If no timezone info is provided in the string, it is assumed to be in UTC.
+def _max_connections(max_workers):
+    """Return the number of connections to GitHub to allow for max_workers threads
 
-    If string is None, then returns None
+    Requests block waiting for a free connection once this many are in use, so this
+    should be at least the number of threads making requests.
     """
-    if string is None:
-        return None
-    return datetime.datetime.fromisoformat(string).astimezone()
+    return max(max_workers, DEFAULT_MAX_CONNECTIONS_PER_HOST)
@@ -0,0 +1,439 @@
+"""Minimal client for the GitHub REST API
+
+This handles the low-level details of talking to the GitHub API (authentication,
+pagination, caching, rate limiting, error handling). It deliberately knows nothing about
+our own classes: the functions in github_fetch use it to fetch raw data, then convert
+that data into our own objects.
+"""
+
+import re
+import threading
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from ghtools.rate_limit import RateLimiter
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+DEFAULT_BASE_URL = "https://api.github.com"
+
+# Timeout, in seconds, for a single request
+DEFAULT_TIMEOUT = 15
+
+# Default maximum number of connections kept open to a single host
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+
+# Default number of hosts for which open connections are kept
+DEFAULT_POOL_SIZE = 10
+
+# Maximum number of items per page that GitHub allows for paginated list endpoints
+MAX_PER_PAGE = 100
+
+# Default number of items requested per page for paginated list endpoints (using the
+# maximum minimizes the number of round trips)
+PER_PAGE = MAX_PER_PAGE
+
+# Maximum number of results that GitHub's search API gives for a single query
+MAX_SEARCH_RESULTS = 1000
+
+# Matches the URL of the last page in a 'Link' response header, which looks like:
+# <https://api.github.com/...?page=2>; rel="next", <https://api.github.com/...?page=5>; rel="last"
+_LINK_LAST_RE = re.compile(r'<([^>]*)>;\s*rel="last"')
+
+# ------------------------------------------------------------------------
+# Begin class definitions
+# ------------------------------------------------------------------------
+
+class GitHubApiError(Exception):
+    """Exception raised when the GitHub API returns an error status"""
+
+    def __init__(self, status, url, message):
+        """Initialize a GitHubApiError
+
+        Args:
+        status: integer - HTTP status code
+        url: string - URL of the failed request
+        message: string - error message returned by GitHub (or the response text)
+        """
+        super().__init__("GitHub API error {status} for {url}: {message}".format(
+            status=status, url=url, message=message))
+        self.status = status
+        self.url = url
+        self.message = message
+
+class RateLimitError(GitHubApiError):
+    """Exception raised when a request is still rate-limited after all retries"""
+
+class PaginationStats:
+    # pylint: disable=too-few-public-methods
+    """Counters describing how a GitHubClient has fetched paginated lists"""
+
+    def __init__(self):
+        self.requests_saved = 0
+
+    def __str__(self):
+        return ("Pagination: {requests_saved} requests saved by skipping lists known to "
+                "be empty".format(requests_saved=self.requests_saved))
+
+class ApiResponse:
+    # pylint: disable=too-few-public-methods
+    """Class holding the parts of a GitHub API response that we care about"""
+
+    def __init__(self, status, headers, data):
+        """Initialize an ApiResponse object
+
+        Args:
+        status: integer - HTTP status code
+        headers: dict-like - response headers (keys are treated case-insensitively)
+        data: the decoded JSON body
+        """
+        self.status = status
+        self.headers = CaseInsensitiveDict(headers)
+        self.data = data
+
+    def get_last_page(self):
+        """Return the number of the last page of a paginated response
+
+        Returns 1 if the response has no 'last' link (i.e., it is the only page)
+        """
+        match = _LINK_LAST_RE.search(self.headers.get("Link", ""))
+        if match is None:
+            return 1
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(match.group(1)).query)
+        return int(query["page"][0])
+
+class GitHubClient:
+    """Client for making requests to the GitHub REST API
+
+    A single client can safely be used from multiple threads.
+    """
+
+    def __init__(self, token=None, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT,
+                 max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                 pool_size=DEFAULT_POOL_SIZE, cache=None, rate_limiter=None, cassette=None,
+                 per_page=PER_PAGE):
+        # pylint: disable=too-many-arguments
+        """Initialize a GitHubClient
+
+        Connections are kept open and reused between requests (and between threads).
+
+        Args:
+        token: string or None - personal access token; if None, no authentication is used
+        base_url: string - root URL of the GitHub API
+        timeout: number, or tuple (connect timeout, read timeout) - timeout, in seconds,
+            for a single request
+        max_connections_per_host: integer - maximum number of connections open to a
+            single host at once. If more threads than this make requests at the same
+            time, the extra threads wait for a connection to become free. This should
+            generally be at least the number of threads that use this client.
+        pool_size: integer - number of hosts for which open connections are kept. (All
+            requests normally go to a single host, but the GitHub API sometimes redirects
+            to other hosts.)
+        cache: ResponseCache or None - if given, responses are stored in this cache and
+            later revalidated with conditional requests
+        rate_limiter: RateLimiter or None - schedules requests around GitHub's rate
+            limits; if None, a RateLimiter with default settings is used
+        cassette: Cassette or None - if given, requests are recorded to or replayed from
+            this cassette (see the cassette module). A recorded cassette is saved when
+            this client is closed.
+        per_page: integer - number of items requested per page from paginated list
+            endpoints (at most MAX_PER_PAGE)
+        """
+        if not 1 <= per_page <= MAX_PER_PAGE:
+            raise ValueError("per_page must be between 1 and {}, got {}".format(
+                MAX_PER_PAGE, per_page))
+        self._per_page = per_page
+        self._stats_lock = threading.Lock()
+        self._pagination_stats = PaginationStats()
+        self._base_url = base_url.rstrip("/")
+        self._graphql_url = _graphql_url(self._base_url)
+        self._timeout = timeout
+        self._token = token
+        self._cache = cache
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self._rate_limiter = rate_limiter
+        self._session = requests.Session()
+        self._session.headers.update({"Accept": "application/vnd.github+json",
+                                      "User-Agent": "esmci-github-tools"})
+        if token:
+            self._session.headers["Authorization"] = "token " + token
+        adapter_args = {"pool_connections": pool_size,
+                        "pool_maxsize": max_connections_per_host,
+                        "pool_block": True}
+        if cassette is None:
+            adapter = HTTPAdapter(**adapter_args)
+        else:
+            adapter = cassette.make_adapter(**adapter_args)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def get_base_url(self):
+        """Return the root URL of the GitHub API that this client talks to"""
+        return self._base_url
+
+    def get(self, path, params=None):
+        """Make a GET request, returning an ApiResponse object
+
+        Raises GitHubApiError if GitHub returns an error status.
+
+        Args:
+        path: string - path relative to the API root (e.g., '/repos/ORG/REPO')
+        params: dict or None - query parameters
+        """
+        url = self._base_url + path
+        request_headers = {}
+        cache_entry = None
+        if self._cache is not None:
+            full_url = requests.Request("GET", url, params=params).prepare().url
+            cache_key = self._cache.make_key(full_url, token=self._token)
+            cache_entry = self._cache.get(cache_key)
+            if cache_entry is not None:
+                request_headers = self._cache.get_validators(cache_entry)
+
+        response = self._rate_limiter.call(
+            lambda: self._session.get(url, params=params, headers=request_headers,
+                                      timeout=self._timeout),
+            resource="search" if path.startswith("/search/") else "core")
+
+        if response.status_code == 304 and cache_entry is not None:
+            self._cache.record_hit()
+            return ApiResponse(status=200,
+                               headers=cache_entry["headers"],
+                               data=cache_entry["data"])
+        if response.status_code >= 400:
+            raise _api_error(response, url)
+        data = response.json()
+        if self._cache is not None:
+            self._cache.record_miss()
+            if self._cache.is_cacheable(response.headers):
+                self._cache.put(cache_key, response.headers, data)
+        return ApiResponse(status=response.status_code,
+                           headers=response.headers,
+                           data=data)
+
+    def post_graphql(self, query, variables):
+        """Run a query against the GitHub GraphQL API, returning the 'data' of the response
+
+        Raises GitHubApiError if GitHub returns an error status or reports errors in the
+        query. (Note that, unlike the REST API, the GraphQL API cannot be used without
+        authentication.)
+
+        Args:
+        query: string - GraphQL query
+        variables: dict - values of the variables used in the query
+        """
+        response = self._rate_limiter.call(
+            lambda: self._session.post(self._graphql_url,
+                                       json={"query": query, "variables": variables},
+                                       timeout=self._timeout),
+            resource="graphql")
+        if response.status_code >= 400:
+            raise _api_error(response, self._graphql_url)
+        result = response.json()
+        if result.get("errors"):
+            raise GitHubApiError(status=response.status_code,
+                                 url=self._graphql_url,
+                                 message="; ".join(error.get("message", str(error))
+                                                   for error in result["errors"]))
+        return result["data"]
+
+    def close(self):
+        """Close all open connections"""
+        self._session.close()
+
+    def get_rate_limit_stats(self):
+        """Return the RateLimitStats of this client's rate limiter"""
+        return self._rate_limiter.stats
+
+    def get_pagination_stats(self):
+        """Return the PaginationStats of this client"""
+        return self._pagination_stats
+
+    def get_cache_stats(self):
+        """Return the CacheStats of this client's cache, or None if it has no cache"""
+        if self._cache is None:
+            return None
+        return self._cache.stats
+
+    def get_json(self, path, params=None):
+        """Make a GET request, returning the decoded JSON body
+
+        Args: same as for get
+        """
+        return self.get(path, params=params).data
+
+    def get_paginated(self, paths, executor=None, counts=None):
+        """Fetch all items from one or more paginated list endpoints
+
+        Returns a list with one element per path; each element is the list of all items
+        from that endpoint, in the order GitHub returned them.
+
+        If an executor is given, requests are made concurrently: first the first page of
+        every endpoint, then (once we know how many pages each endpoint has, from the
+        'Link' header) all remaining pages of all endpoints. So however many pages there
+        are, this takes just two rounds of requests rather than one per page.
+
+        If the number of items in an endpoint is known in advance, its pages can all be
+        requested in the first round; and if it is known to be empty, it isn't requested
+        at all.
+
+        Args:
+        paths: list of strings - paths relative to the API root
+        executor: concurrent.futures.Executor or None - if None, requests are made
+            sequentially
+        counts: list or None - if given, one element per path: the number of items that
+            endpoint is known to have, or None if unknown. (If an endpoint turns out to
+            have more pages than its count implies, the remaining pages are fetched
+            anyway.)
+        """
+        if counts is None:
+            counts = [None] * len(paths)
+        # Pages to request in the first round, as tuples (index into paths, page number)
+        first_round = []
+        for i, count in enumerate(counts):
+            if count is None:
+                first_round.append((i, 1))
+            else:
+                first_round.extend((i, page) for page in range(1, self._num_pages(count) + 1))
+        num_saved = sum(1 for count in counts if count == 0)
+        if num_saved:
+            with self._stats_lock:
+                self._pagination_stats.requests_saved += num_saved
+        first_responses = _map(executor, lambda i_page: self._get_page(paths[i_page[0]],
+                                                                       i_page[1]),
+                               first_round)
+
+        # The last page requested from each endpoint, and its response
+        last_requested = {i: (page, response)
+                          for (i, page), response in zip(first_round, first_responses)}
+        remaining = [(i, page)
+                     for i, (last_page, response) in sorted(last_requested.items())
+                     for page in range(last_page + 1, response.get_last_page() + 1)]
+        other_pages = _map(executor,
+                           lambda i_page: self._get_page(paths[i_page[0]], i_page[1]).data,
+                           remaining)
+
+        all_items = [[] for _ in paths]
+        for (i, _), response in zip(first_round, first_responses):
+            all_items[i].extend(response.data)
+        for (i, _), items in zip(remaining, other_pages):
+            all_items[i].extend(items)
+        return all_items
+
+    def get_paginated_until(self, path, reached_end):
+        """Fetch the first items from a paginated list endpoint, stopping at some point
+
+        This is for endpoints that list items in some order (e.g., most recently updated
+        first) when only the items before some point are needed. Pages are fetched in
+        order, stopping after the first page whose last item satisfies reached_end.
+
+        Returns a list of the items from all fetched pages, in the order GitHub returned
+        them; this includes every item before the first one satisfying reached_end.
+
+        Args:
+        path: string - path relative to the API root
+        reached_end: function taking an item and returning True if neither it nor any
+            item after it is needed
+        """
+        response = self._get_page(path, 1)
+        items = list(response.data)
+        last_page = response.get_last_page()
+        page = 1
+        while page < last_page and not (items and reached_end(items[-1])):
+            page += 1
+            items.extend(self._get_page(path, page).data)
+        return items
+
+    def search(self, path, query, executor=None, stop_if_truncated=False):
+        """Run a query against a search endpoint, fetching all pages of results
+
+        Returns a tuple (items, complete). items is a list of all items found, in the
+        order GitHub returned them. complete is False if GitHub reports that the results
+        are incomplete (e.g., because the search timed out), or if there are more than
+        MAX_SEARCH_RESULTS matches (in which case only that many are returned, or only
+        the first page of them with stop_if_truncated).
+
+        Args:
+        path: string - path of the search endpoint relative to the API root (e.g.,
+            '/search/issues')
+        query: string - the search query
+        executor: concurrent.futures.Executor or None - if given, all pages after the
+            first are fetched concurrently
+        stop_if_truncated: boolean - if True, the pages after the first are not fetched
+            when there are more than MAX_SEARCH_RESULTS matches; this is for callers that
+            don't use incomplete results, since the search API's rate limit is low
+        """
+        params = {"q": query, "per_page": self._per_page}
+        first_page = self.get(path, params)
+        last_page = min(first_page.get_last_page(), self._num_pages(MAX_SEARCH_RESULTS))
+        if stop_if_truncated and first_page.data["total_count"] > MAX_SEARCH_RESULTS:
+            last_page = 1
+        pages = [first_page.data] + _map(executor,
+                                         lambda page: self.get_json(path,
+                                                                    dict(params, page=page)),
+                                         range(2, last_page + 1))
+        items = [item for page_data in pages for item in page_data["items"]]
+        complete = (first_page.data["total_count"] <= MAX_SEARCH_RESULTS and
+                    not any(page_data["incomplete_results"] for page_data in pages))
+        return (items, complete)
+
+    def _get_page(self, path, page):
+        """Make a GET request for the given page of a paginated list endpoint
+
+        Returns an ApiResponse object
+        """
+        params = {"per_page": self._per_page}
+        # The first page is requested without a page number, as when following GitHub's
+        # own links, so that it is always the same request (and so can be cached)
+        if page > 1:
+            params["page"] = page
+        return self.get(path, params)
+
+    def _num_pages(self, count):
+        """Return the number of pages needed for the given number of items"""
+        return -(-count // self._per_page)
+
+# ------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------
+
+def _map(executor, func, args):
+    """Apply func to each element of args, returning a list of results in order
+
+    If executor is None, this runs sequentially; otherwise it runs via the executor.
+    """
+    if executor is None:
+        return [func(arg) for arg in args]
+    return list(executor.map(func, args))
+
+def _graphql_url(base_url):
+    """Return the URL of the GraphQL endpoint corresponding to the given REST API root
+
+    On github.com the REST API root is https://api.github.com and the GraphQL endpoint is
+    https://api.github.com/graphql; on GitHub Enterprise Server, the REST API root is
+    https://HOST/api/v3 and the GraphQL endpoint is https://HOST/api/graphql.
+    """
+    if base_url.endswith("/api/v3"):
+        return base_url[:-len("v3")] + "graphql"
+    return base_url + "/graphql"
+
+def _api_error(response, url):
+    """Return the exception to raise for a failed requests.Response"""
+    if RateLimiter.is_rate_limited(response):
+        error_class = RateLimitError
+    else:
+        error_class = GitHubApiError
+    return error_class(status=response.status_code,
+                       url=url,
+                       message=_error_message(response))
+
+def _error_message(response):
+    """Extract an error message from a failed requests.Response"""
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text
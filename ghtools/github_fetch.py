@@ -1,49 +1,440 @@
 """Functions for fetching information from GitHub using the GitHub API"""
 
 import os
-from github import Github
+import datetime
+import threading
 from ghtools.comment import ConversationComment, PRReviewComment, PRLineComment
 from ghtools.comment_time import CommentTime
+from ghtools.github_client import GitHubClient, DEFAULT_BASE_URL, DEFAULT_TIMEOUT, \
+    DEFAULT_MAX_CONNECTIONS_PER_HOST, DEFAULT_POOL_SIZE, PER_PAGE
+from ghtools.http_cache import ResponseCache
+from ghtools.organization import Organization, RepoInfo
+from ghtools.pr_snapshot import CommentStreamSnapshot, PullRequestSnapshot
 from ghtools.pull_request import PullRequest
+from ghtools.rate_limit import RateLimiter
+from ghtools.utils import make_executor
 
-def fetch_pull_request(repo, pr_number):
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+# Format of the times given by the GitHub API, which are always in UTC
+_GITHUB_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# When updating a snapshot, we ask GitHub for the comments updated since the newest one we
+# have, minus this margin. GitHub's times have a resolution of one second, and a comment
+# can become visible slightly after a newer one; the margin avoids missing such comments.
+# (Comments that we fetch again are simply replaced.) The same margin is applied when
+# fetching only the comments within given time bounds, where any extra comments fetched
+# are filtered out later.
+_SINCE_MARGIN = datetime.timedelta(minutes=1)
+
+# Keys of the fields of a PR (as fetched individually, not in a list of PRs) giving the
+# number of its conversation comments and line comments; there is no such field for
+# reviews
+_ISSUE_COMMENTS_COUNT_KEY = "comments"
+_LINE_COMMENTS_COUNT_KEY = "review_comments"
+
+# Fields of a PR that are kept in its snapshot, so that it can be rebuilt without being
+# refetched (see _assemble_pull_request)
+_SNAPSHOT_PR_KEYS = ("title", "user", "created_at", "updated_at", "html_url", "body")
+
+# ------------------------------------------------------------------------
+# GraphQL queries
+# ------------------------------------------------------------------------
+
+# Fields of a line comment (PullRequestReviewComment) that we use
+_GRAPHQL_LINE_COMMENT_FIELDS = """
+  databaseId
+  author { login }
+  body
+  url
+  path
+  createdAt
+  updatedAt
+"""
+
+# Query for everything we need about a PR. This only selects the fields we use. The
+# connections are paginated: on the first query, all cursors are null; on subsequent
+# queries, the cursors are set to fetch the next page of any connection that has more
+# pages, and the with* variables are used to omit connections that have no more pages.
+_PR_GRAPHQL_QUERY = """
+query($owner: String!, $name: String!, $number: Int!,
+      $withComments: Boolean!, $commentsCursor: String,
+      $withReviews: Boolean!, $reviewsCursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      title
+      body
+      url
+      author { login }
+      createdAt
+      updatedAt
+      comments(first: 100, after: $commentsCursor) @include(if: $withComments) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          author { login }
+          body
+          url
+          createdAt
+          updatedAt
+        }
+      }
+      reviews(first: 100, after: $reviewsCursor) @include(if: $withReviews) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          id
+          author { login }
+          body
+          url
+          submittedAt
+          comments(first: 100) {
+            pageInfo { hasNextPage endCursor }
+            nodes {""" + _GRAPHQL_LINE_COMMENT_FIELDS + """}
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Query for further line comments in a review with more than 100 line comments
+_REVIEW_COMMENTS_GRAPHQL_QUERY = """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on PullRequestReview {
+      comments(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes {""" + _GRAPHQL_LINE_COMMENT_FIELDS + """}
+      }
+    }
+  }
+}
+"""
+
+# ------------------------------------------------------------------------
+# Shared client
+# ------------------------------------------------------------------------
+
+# Unless told otherwise, all fetch functions use a single, process-wide GitHubClient, so
+# that connections to GitHub are kept open and reused between calls. This is created on
+# first use, with the options set by configure_client.
+_SHARED_CLIENT_LOCK = threading.Lock()
+_shared_client = None  # pylint: disable=invalid-name
+_shared_client_options = {}
+
+# ------------------------------------------------------------------------
+# Public functions
+# ------------------------------------------------------------------------
+
+def create_client(max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                  pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, cache_dir=None,
+                  rate_limit_reserve=0, cassette=None, per_page=PER_PAGE):
+    # pylint: disable=too-many-arguments
+    """Create a new GitHubClient for use with the fetch functions in this module
+
+    Most code should use the shared client returned by get_client instead of calling this
+    directly.
+
+    The client is authenticated with the token in GITHUB_TOKEN, if set (see
+    _get_access_token).
+
+    Args:
+    max_connections_per_host: integer - maximum number of connections open to GitHub at
+        once; this should generally be at least the number of threads making requests
+    pool_size: integer - number of hosts for which open connections are kept
+    timeout: number, or tuple (connect timeout, read timeout) - timeout, in seconds, for
+        a single request
+    cache_dir: string or None - if given, API responses are cached in this directory and
+        revalidated with conditional requests on later runs
+    rate_limit_reserve: integer - number of requests to leave unused in each GitHub
+        rate-limit window; requests are paced, and if necessary delayed until the limit
+        resets, to respect this (see RateLimiter)
+    cassette: Cassette or None - if given, all requests are recorded to or replayed from
+        this cassette; a recorded cassette is saved when the client is closed
+    per_page: integer - number of items requested per page from paginated list endpoints
+        (at most 100, GitHub's maximum)
+    """
+    cache = None
+    if cache_dir is not None:
+        cache = ResponseCache(cache_dir)
+    return GitHubClient(token=_get_access_token(),
+                        base_url=_get_base_url(),
+                        timeout=timeout,
+                        max_connections_per_host=max_connections_per_host,
+                        pool_size=pool_size,
+                        cache=cache,
+                        rate_limiter=RateLimiter(reserve=rate_limit_reserve),
+                        cassette=cassette,
+                        per_page=per_page)
+
+def configure_client(**options):
+    """Set the options used for the shared client returned by get_client
+
+    If the shared client has already been created with different options, it is closed
+    and will be recreated with the new options on its next use; if the options are
+    unchanged, the existing client (and its open connections) is kept.
+
+    Args: any of the arguments accepted by create_client
+    """
+    global _shared_client  # pylint: disable=global-statement
+    with _SHARED_CLIENT_LOCK:
+        if options == _shared_client_options:
+            return
+        _shared_client_options.clear()
+        _shared_client_options.update(options)
+        if _shared_client is not None:
+            _shared_client.close()
+            _shared_client = None
+
+def reset_client():
+    """Close and discard the shared client, if any
+
+    The next call to get_client creates a new client, with the options from the last
+    call to configure_client. This also picks up any changes to the GITHUB_TOKEN and
+    GITHUB_API_URL environment variables since the shared client was created.
+    """
+    global _shared_client  # pylint: disable=global-statement
+    with _SHARED_CLIENT_LOCK:
+        if _shared_client is not None:
+            _shared_client.close()
+            _shared_client = None
+
+def get_client():
+    """Return the process-wide shared GitHubClient, creating it if necessary
+
+    This is safe to call from multiple threads; all callers get the same client.
+    """
+    global _shared_client  # pylint: disable=global-statement
+    with _SHARED_CLIENT_LOCK:
+        if _shared_client is None:
+            _shared_client = create_client(**_shared_client_options)
+        return _shared_client
+
+def fetch_pull_request(repo, pr_number, max_workers=1, client=None, backend="rest",
+                       snapshots=None, created_since_time=None, updated_since_time=None,
+                       pr_updated_at=None):
+    # pylint: disable=too-many-arguments
     """Fetch information about the given Pull Request, returning a PullRequest object
 
     Args:
     repo: string - in the format Org/Repo
     pr_number: integer - PR ID in this repo
+    max_workers: integer - maximum number of concurrent requests to GitHub. If 1, all
+        requests are made sequentially, and the PR is fetched first so that the numbers
+        of comments it gives can be used to skip empty endpoints. If greater than 1, the
+        PR itself and the first pages of its conversation comments, line comments and
+        reviews are fetched concurrently, and then all their remaining pages (except
+        when updating a snapshot, where the PR is fetched first, as when sequential).
+        The resulting PullRequest is the same either way. (This only applies to the
+        'rest' backend.)
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    backend: string - which GitHub API to use: 'rest' or 'graphql'. The 'graphql' backend
+        fetches the whole PR in a single query (plus one more query per 100 conversation
+        comments or reviews beyond the first 100), selecting only the fields we use; but
+        it requires an access token. The resulting PullRequest is the same either way.
+    snapshots: SnapshotStore or None - if given, a snapshot of the PR is kept in this
+        store; if there is already a snapshot, only the comments that have changed since
+        it was taken are fetched. The resulting PullRequest is the same either way. (This
+        is only supported with the 'rest' backend.)
+    pr_updated_at: string or None - the PR's current 'updated_at' time, as given by
+        GitHub (e.g., in a list of PRs), if known. With snapshots, if the snapshot was
+        taken when the PR had this same time, the PR is rebuilt from the snapshot
+        without any requests at all.
+    created_since_time: datetime.datetime or None - if given, comments created before
+        this time may be left out of the returned PullRequest (and, where possible, are
+        not fetched at all)
+    updated_since_time: datetime.datetime or None - if given, comments last updated
+        before this time may be left out of the returned PullRequest (and, where
+        possible, are not fetched at all)
+
+    If created_since_time or updated_since_time is given, the returned PullRequest should
+    only be queried with (at least) the same bounds: e.g., its get_todos gives the same
+    results as for the complete PullRequest when passed the same created_since_time and
+    updated_since_time. The bounds are used with the 'rest' backend only, and only when
+    there is no existing snapshot to update (updating a snapshot fetches even less).
     """
-    gh_inst = _get_github_instance()
-    gh_repo = gh_inst.get_repo(repo)
-    gh_pr = gh_repo.get_pull(pr_number)
+    if client is None:
+        client = get_client()
+    if backend == "rest":
+        with make_executor(max_workers) as executor:
+            if snapshots is not None:
+                return _sync_pull_request_rest(client, repo, pr_number, snapshots, executor,
+                                               created_since_time, updated_since_time,
+                                               pr_updated_at)
+            (gh_pr, streams) = _fetch_pull_request_data_rest(
+                client, repo, pr_number, executor, created_since_time, updated_since_time)
+    elif backend == "graphql":
+        if snapshots is not None:
+            raise ValueError("Snapshots are only supported with the 'rest' backend")
+        (gh_pr, streams) = _fetch_pull_request_data_graphql(client, repo, pr_number)
+    else:
+        raise ValueError("Unknown backend: {}".format(backend))
+    return _make_pull_request(pr_number, gh_pr, *streams)
 
+def fetch_organization(org, max_workers=1, client=None):
+    """Fetch information about the given organization, returning an Organization object
+
+    The Organization holds the metadata of each repository (see organization.RepoInfo),
+    as given by the list of repositories. When the client has a response cache, the pages
+    of this list are revalidated with conditional requests, so refetching an organization
+    whose repositories haven't changed doesn't count against the rate limit (see
+    repo_index.fetch_repo_index, which also keeps the result between runs).
+
+    Args:
+    org: string
+    max_workers: integer - maximum number of concurrent requests to GitHub. If greater
+        than 1, all pages of the list of repositories after the first are fetched
+        concurrently. The resulting Organization is the same either way.
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    """
+    if client is None:
+        client = get_client()
+    # Note that, when listing repositories, the 'sort' and 'direction' parameters only
+    # apply to repositories of type 'all', 'owner' or 'member'
+    path = "/orgs/{org}/repos?type=all&sort=full_name&direction=asc".format(org=org)
+    with make_executor(max_workers) as executor:
+        (gh_repos,) = client.get_paginated([path], executor=executor)
+    return Organization(name=org,
+                        repos=[RepoInfo(full_name=gh_repo["full_name"],
+                                        pushed_at=(None if gh_repo.get("pushed_at") is None
+                                                   else _parse_time(gh_repo["pushed_at"])),
+                                        archived=gh_repo.get("archived", False),
+                                        default_branch=gh_repo.get("default_branch"),
+                                        open_issues_count=gh_repo.get("open_issues_count"))
+                               for gh_repo in gh_repos])
+
+def list_open_pull_requests(repo, client=None, updated_since_time=None):
+    """Return a list of tuples (pr_number, pr_updated_at) for the open PRs in a repo
+
+    The list is in ascending order of PR number; pr_updated_at is the PR's 'updated_at'
+    time as given by GitHub (which can be passed to fetch_pull_request).
+
+    Args:
+    repo: string - in the format Org/Repo
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    updated_since_time: datetime.datetime or None - if given, only the PRs last updated
+        at or after this time are listed. GitHub is then asked for the PRs in order of
+        their last update, most recent first, and no further pages are fetched once PRs
+        updated before this time are reached; so for repos with many dormant PRs, this
+        needs far fewer requests.
+    """
+    if client is None:
+        client = get_client()
+    return [(gh_pr["number"], gh_pr["updated_at"])
+            for gh_pr in _fetch_open_pull_request_list(client, repo, updated_since_time)]
+
+def fetch_open_pull_requests(repo, max_workers=1, client=None, repo_wide=False,
+                             updated_since_time=None):
+    """Fetch all open pull requests in a repo, returning a list of PullRequest objects
+
+    The list is in ascending order of PR number, and each PullRequest is the same as
+    fetch_pull_request would give. However, each PR's title, body, author and times are
+    taken from GitHub's list of open PRs (which gives them for 100 PRs at a time), so the
+    PRs themselves are not fetched individually: only their comments and reviews are.
+
+    Args:
+    repo: string - in the format Org/Repo
+    max_workers: integer - maximum number of concurrent requests to GitHub; if greater
+        than 1, the comments and reviews of all of the PRs are fetched concurrently
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    repo_wide: boolean - if True, conversation comments and line comments are fetched
+        with GitHub's repo-wide comment endpoints and sorted into PRs by number (which
+        needs one request per 100 comments in the repo, rather than two or more per PR);
+        otherwise they are fetched PR by PR
+    updated_since_time: datetime.datetime or None - if given, only the PRs last updated
+        at or after this time are fetched (see list_open_pull_requests)
+    """
+    if client is None:
+        client = get_client()
+    gh_prs = _fetch_open_pull_request_list(client, repo, updated_since_time)
+    with make_executor(max_workers) as executor:
+        if repo_wide:
+            return _fetch_repo_comments_for(client, repo, gh_prs, executor)
+        stream_paths = [path for gh_pr in gh_prs
+                        for path in _pull_request_paths(repo, gh_pr["number"])[1:]]
+        streams = client.get_paginated(stream_paths, executor=executor)
+    return [_make_pull_request(gh_pr["number"], gh_pr, *streams[3 * i:3 * i + 3])
+            for i, gh_pr in enumerate(gh_prs)]
+
+# ------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------
+
+def _make_pull_request(pr_number, gh_pr, gh_issue_comments, gh_line_comments, gh_reviews):
+    """Create a PullRequest object from data fetched via the GitHub REST API
+
+    Args:
+    pr_number: integer - PR ID in its repo
+    gh_pr: dict - the PR itself
+    gh_issue_comments: list of dicts - the PR's conversation comments
+    gh_line_comments: list of dicts - the PR's line comments
+    gh_reviews: list of dicts - the PR's reviews
+    """
+    comments = ([_make_conversation_comment(gh_comment) for gh_comment in gh_issue_comments] +
+                [_make_line_comment(gh_comment) for gh_comment in gh_line_comments] +
+                _make_review_comments(gh_reviews, gh_pr))
+    return _assemble_pull_request(pr_number, gh_pr, comments)
+
+def _assemble_pull_request(pr_number, gh_pr, comments):
+    """Create a PullRequest object from the PR itself and its already-parsed comments
+
+    Args:
+    pr_number: integer - PR ID in its repo
+    gh_pr: dict - the PR itself, as fetched via the GitHub REST API
+    comments: list of Comments
+    """
+    time_info = CommentTime(creation_time=_parse_time(gh_pr["created_at"]),
+                            last_updated_time=_parse_time(gh_pr["updated_at"]))
+    return PullRequest(pr_number=pr_number,
+                       title=gh_pr["title"],
+                       username=_get_login(gh_pr),
+                       time_info=time_info,
+                       url=gh_pr["html_url"],
+                       body=gh_pr["body"] or "",
+                       comments=comments)
+
+def _make_conversation_comment(gh_comment):
+    """Create a ConversationComment from a conversation comment fetched from GitHub"""
+    time_info = CommentTime(creation_time=_parse_time(gh_comment["created_at"]),
+                            last_updated_time=_parse_time(gh_comment["updated_at"]))
+    return ConversationComment(username=_get_login(gh_comment),
+                               time_info=time_info,
+                               url=gh_comment["html_url"],
+                               content=gh_comment["body"])
+
+def _make_line_comment(gh_comment):
+    """Create a PRLineComment from a line comment fetched from GitHub"""
+    time_info = CommentTime(creation_time=_parse_time(gh_comment["created_at"]),
+                            last_updated_time=_parse_time(gh_comment["updated_at"]))
+    return PRLineComment(username=_get_login(gh_comment),
+                         time_info=time_info,
+                         url=gh_comment["html_url"],
+                         content=gh_comment["body"],
+                         path=gh_comment["path"])
+
+def _make_review_comments(gh_reviews, gh_pr):
+    """Create a list of PRReviewComments from the reviews of a PR fetched from GitHub
+
+    Args:
+    gh_reviews: list of dicts - the PR's reviews
+    gh_pr: dict - the PR itself
+    """
     # This is the time that *anything* in the PR was last updated. We use this as a
-    # conservative guess of when comments were last updated if we don't have any other
-    # last-updated information for a given comment.
-    pr_last_updated = gh_pr.updated_at.astimezone()
+    # conservative guess of when reviews were last updated, since we don't have any other
+    # last-updated information for them.
+    pr_last_updated = _parse_time(gh_pr["updated_at"])
 
     comments = []
-    for gh_comment in gh_pr.get_issue_comments():
-        time_info = CommentTime(creation_time=gh_comment.created_at.astimezone(),
-                                last_updated_time=gh_comment.updated_at.astimezone())
-        this_comment = ConversationComment(username=gh_comment.user.login,
-                                           time_info=time_info,
-                                           url=gh_comment.html_url,
-                                           content=gh_comment.body)
-        comments.append(this_comment)
-
-    for gh_comment in gh_pr.get_comments():
-        time_info = CommentTime(creation_time=gh_comment.created_at.astimezone(),
-                                last_updated_time=gh_comment.updated_at.astimezone())
-        this_comment = PRLineComment(username=gh_comment.user.login,
-                                     time_info=time_info,
-                                     url=gh_comment.html_url,
-                                     content=gh_comment.body,
-                                     path=gh_comment.path)
-        comments.append(this_comment)
-
-    for gh_comment in gh_pr.get_reviews():
-        if gh_comment.body:
+    for gh_comment in gh_reviews:
+        # Pending reviews (which only their authors can see) haven't been submitted yet,
+        # so they have no submitted time
+        if gh_comment["body"] and gh_comment["submitted_at"] is not None:
             # GitHub creates a Pull Request Review for any PR line comments that have been
             # made - even individual line comments made outside a review, or when you make
             # a set of line comments in a review but don't leave an overall
@@ -51,40 +442,412 @@ def fetch_pull_request(repo, pr_number):
 
             # Pull Request Reviews don't appear to support a last-updated time, so we use
             # the last updated time of the PR as a whole as a conservative guess.
-            time_info = CommentTime(creation_time=gh_comment.submitted_at.astimezone(),
+            time_info = CommentTime(creation_time=_parse_time(gh_comment["submitted_at"]),
                                     last_updated_time=pr_last_updated,
                                     updated_time_is_guess=True)
-            this_comment = PRReviewComment(username=gh_comment.user.login,
+            this_comment = PRReviewComment(username=_get_login(gh_comment),
                                            time_info=time_info,
-                                           url=gh_comment.html_url,
-                                           content=gh_comment.body)
+                                           url=gh_comment["html_url"],
+                                           content=gh_comment["body"])
             comments.append(this_comment)
+    return comments
 
-    time_info = CommentTime(creation_time=gh_pr.created_at.astimezone(),
-                            last_updated_time=pr_last_updated)
-    return PullRequest(pr_number=pr_number,
-                       title=gh_pr.title,
-                       username=gh_pr.user.login,
-                       time_info=time_info,
-                       url=gh_pr.html_url,
-                       body=gh_pr.body,
-                       comments=comments)
+def _pull_request_paths(repo, pr_number):
+    """Return the REST API paths for a PR
+
+    Returns a tuple (PR path, conversation comments path, line comments path, reviews path)
+    """
+    pr_path = "/repos/{repo}/pulls/{pr_number}".format(repo=repo, pr_number=pr_number)
+    issue_path = "/repos/{repo}/issues/{pr_number}".format(repo=repo, pr_number=pr_number)
+    return (pr_path, issue_path + "/comments", pr_path + "/comments", pr_path + "/reviews")
+
+def _fetch_with_streams(client, pr_path, stream_paths, executor, count_keys=None,
+                        exact_counts=True, wait_for_counts=False):
+    # pylint: disable=too-many-arguments
+    """Fetch a PR and all items from the given paginated endpoints
 
-def fetch_organization(org):
-    """Fetch information about the given organization
+    Returns a tuple (gh_pr, list of lists of items, one per stream path)
 
-    Returns an object of type github.Organization.Organization (part of the python github
-    API)
+    When requests are made sequentially, the PR is fetched first, and the numbers of
+    items that it gives for the streams are used to skip requests for empty streams and
+    to plan the pages to fetch (see GitHubClient.get_paginated). When requests are made
+    concurrently, waiting for the PR would add a round trip, so the PR and the first
+    pages of the streams are fetched together, unless wait_for_counts is given.
 
     Args:
-    org: string
+    client: GitHubClient
+    pr_path: string - path of the PR itself
+    stream_paths: list of strings - paths of paginated endpoints
+    executor: concurrent.futures.Executor or None - if given, all requests are made
+        concurrently; if None, they are made sequentially
+    count_keys: list or None - if given, one element per stream path: the key of the
+        field of the PR giving the number of items in that stream, or None if there is
+        no such field
+    exact_counts: boolean - if False, the stream paths are filtered (e.g., with 'since'),
+        so the counts are only used to skip streams that are empty
+    wait_for_counts: boolean - whether to fetch the PR first (to use its counts) even
+        when requests are made concurrently
     """
-    gh_inst = _get_github_instance()
-    return gh_inst.get_organization(org)
+    if executor is not None and not wait_for_counts:
+        gh_pr_future = executor.submit(client.get_json, pr_path)
+        streams = client.get_paginated(stream_paths, executor=executor)
+        return (gh_pr_future.result(), streams)
+    gh_pr = client.get_json(pr_path)
+    counts = None
+    if count_keys is not None:
+        counts = [gh_pr.get(key) if key is not None else None for key in count_keys]
+        if not exact_counts:
+            counts = [0 if count == 0 else None for count in counts]
+    return (gh_pr, client.get_paginated(stream_paths, executor=executor, counts=counts))
+
+def _fetch_pull_request_data_rest(client, repo, pr_number, executor,
+                                  created_since_time=None, updated_since_time=None):
+    # pylint: disable=too-many-arguments
+    """Fetch the raw data for a PR via the REST API
 
-def _get_github_instance():
-    """Returns an instance of the Github class"""
-    return Github(login_or_token=_get_access_token())
+    Returns a tuple (gh_pr, (gh_issue_comments, gh_line_comments, gh_reviews)), suitable
+    for passing to _make_pull_request
+
+    If time bounds are given, comments outside them may be left out (see
+    fetch_pull_request). A comment can only satisfy both bounds if it was last updated
+    since the later of the two, so conversation comments and line comments are fetched
+    using the 'since' parameter of their endpoints. Reviews can't be filtered by GitHub
+    (and are listed in the order they were started, not submitted, so there is no
+    telling which pages hold the ones submitted within the bounds); so they are all
+    fetched, along with the comments, and left for the PullRequest to filter.
+
+    Args: see fetch_pull_request and _fetch_with_streams
+    """
+    (pr_path, issue_comments_path, line_comments_path, reviews_path) = \
+        _pull_request_paths(repo, pr_number)
+    since_time = max((time for time in (created_since_time, updated_since_time)
+                      if time is not None), default=None)
+    stream_paths = [issue_comments_path, line_comments_path]
+    if since_time is not None:
+        stream_paths = [_add_since(path, since_time - _SINCE_MARGIN) for path in stream_paths]
+    return _fetch_with_streams(client, pr_path, stream_paths + [reviews_path], executor,
+                               count_keys=[_ISSUE_COMMENTS_COUNT_KEY,
+                                           _LINE_COMMENTS_COUNT_KEY, None],
+                               exact_counts=since_time is None)
+
+def _sync_pull_request_rest(client, repo, pr_number, snapshots, executor,
+                            created_since_time=None, updated_since_time=None,
+                            pr_updated_at=None):
+    # pylint: disable=too-many-arguments
+    """Fetch a PR via the REST API, using and updating its snapshot in snapshots
+
+    Returns a PullRequest object
+
+    If there is no snapshot yet and time bounds are given, only the comments within
+    those bounds are fetched (see fetch_pull_request); no snapshot is created then,
+    since a snapshot must hold all of a PR's comments.
+
+    Args: see fetch_pull_request and _fetch_with_streams
+    """
+    key = snapshots.make_key(client.get_base_url(), repo, pr_number)
+    snapshot = snapshots.load(key)
+    if (snapshot is not None and snapshot.pr_data is not None and
+            pr_updated_at is not None and snapshot.pr_updated_at == pr_updated_at):
+        # Nothing has changed since the snapshot was taken
+        return _assemble_snapshot(pr_number, snapshot)
+    if snapshot is None and (created_since_time is not None or
+                             updated_since_time is not None):
+        (gh_pr, streams) = _fetch_pull_request_data_rest(
+            client, repo, pr_number, executor, created_since_time, updated_since_time)
+        return _make_pull_request(pr_number, gh_pr, *streams)
+    if snapshot is None:
+        (gh_pr, (gh_issue_comments, gh_line_comments, gh_reviews)) = \
+            _fetch_pull_request_data_rest(client, repo, pr_number, executor)
+        snapshot = PullRequestSnapshot(
+            pr_updated_at=gh_pr["updated_at"],
+            issue_comments=_make_stream_snapshot(gh_issue_comments,
+                                                 _make_conversation_comment),
+            line_comments=_make_stream_snapshot(gh_line_comments, _make_line_comment),
+            review_comments=_make_review_comments(gh_reviews, gh_pr))
+    else:
+        gh_pr = _update_snapshot_rest(client, repo, pr_number, snapshot, executor)
+    snapshot.pr_data = {field: gh_pr[field] for field in _SNAPSHOT_PR_KEYS}
+    snapshots.save(key, snapshot)
+    return _assemble_snapshot(pr_number, snapshot)
+
+def _assemble_snapshot(pr_number, snapshot):
+    """Create a PullRequest object from a PullRequestSnapshot with its pr_data"""
+    return _assemble_pull_request(pr_number, snapshot.pr_data,
+                                  snapshot.issue_comments.get_comments() +
+                                  snapshot.line_comments.get_comments() +
+                                  snapshot.review_comments)
+
+def _update_snapshot_rest(client, repo, pr_number, snapshot, executor):
+    """Bring the given PullRequestSnapshot up to date, returning the freshly-fetched PR
+
+    Only the conversation comments and line comments added or edited since the snapshot
+    was taken are fetched (using the 'since' parameter of their endpoints); reviews are
+    refetched only if the PR's updated time has changed.
+
+    GitHub doesn't report deleted comments, so deletions are detected by comparing the
+    number of comments in the updated snapshot with the counts that GitHub gives for the
+    PR: if they differ, that endpoint is refetched in full.
+
+    Args: see fetch_pull_request and _fetch_with_streams
+    """
+    (pr_path, issue_comments_path, line_comments_path, reviews_path) = \
+        _pull_request_paths(repo, pr_number)
+    # Each tuple: (snapshot of the stream, path, function to parse one comment, key of
+    # the PR field giving the number of comments in this stream)
+    streams = [(snapshot.issue_comments, issue_comments_path,
+                _make_conversation_comment, _ISSUE_COMMENTS_COUNT_KEY),
+               (snapshot.line_comments, line_comments_path,
+                _make_line_comment, _LINE_COMMENTS_COUNT_KEY)]
+
+    (gh_pr, deltas) = _fetch_with_streams(
+        client, pr_path,
+        [_since_path(path, stream) for (stream, path, _, _) in streams],
+        executor,
+        count_keys=[count_key for (_, _, _, count_key) in streams],
+        exact_counts=False,
+        # Many PRs have no line comments, and the PR is needed before any stale streams
+        # can be refetched anyway, so skipping requests for empty streams is worth the
+        # round trip here, where requests (rather than time) are what a scan of many
+        # PRs runs short of
+        wait_for_counts=True)
+    for (stream, _, make_comment, _), gh_comments in zip(streams, deltas):
+        stream.merge(*_parse_comment_stream(gh_comments, make_comment))
+
+    stale = [(stream, path, make_comment, gh_pr[count_key])
+             for (stream, path, make_comment, count_key) in streams
+             if count_key in gh_pr and len(stream.comments) != gh_pr[count_key]]
+    refetch_reviews = gh_pr["updated_at"] != snapshot.pr_updated_at
+    refetch_paths = [path for (_, path, _, _) in stale]
+    refetch_counts = [count for (_, _, _, count) in stale]
+    if refetch_reviews:
+        refetch_paths.append(reviews_path)
+        refetch_counts.append(None)
+    if not refetch_paths:
+        return gh_pr
+
+    refetched = client.get_paginated(refetch_paths, executor=executor,
+                                     counts=refetch_counts)
+    for (stream, _, make_comment, _), gh_comments in zip(stale, refetched):
+        stream.clear()
+        stream.merge(*_parse_comment_stream(gh_comments, make_comment))
+    if refetch_reviews:
+        snapshot.review_comments = _make_review_comments(refetched[-1], gh_pr)
+        snapshot.pr_updated_at = gh_pr["updated_at"]
+    return gh_pr
+
+def _fetch_open_pull_request_list(client, repo, updated_since_time=None):
+    """Return GitHub's list of all open PRs in a repo, in ascending order of PR number
+
+    Args:
+    client: GitHubClient
+    repo: string - in the format Org/Repo
+    updated_since_time: datetime.datetime or None - if given, only the PRs last updated
+        at or after this time are returned (see list_open_pull_requests)
+    """
+    path = "/repos/{repo}/pulls?state=open".format(repo=repo)
+    if updated_since_time is None:
+        (gh_prs,) = client.get_paginated([path])
+    else:
+        def is_older(gh_pr):
+            return _parse_time(gh_pr["updated_at"]) < updated_since_time
+
+        gh_prs = [gh_pr for gh_pr in
+                  client.get_paginated_until(path + "&sort=updated&direction=desc",
+                                             is_older)
+                  if not is_older(gh_pr)]
+    return sorted(gh_prs, key=lambda gh_pr: gh_pr["number"])
+
+def _fetch_repo_comments_for(client, repo, gh_prs, executor):
+    """Fetch the comments and reviews of the given PRs, using repo-wide comment endpoints
+
+    Returns a list of PullRequest objects, in the same order as gh_prs
+
+    Args:
+    client: GitHubClient
+    repo: string - in the format Org/Repo
+    gh_prs: list of dicts - the PRs themselves, as given by GitHub's list of open PRs
+    executor: concurrent.futures.Executor or None - if given, all requests are made
+        concurrently; if None, they are made sequentially
+    """
+    if not gh_prs:
+        return []
+    reviews_paths = [_pull_request_paths(repo, gh_pr["number"])[3] for gh_pr in gh_prs]
+    # A comment on a PR can't have been updated before the PR was created
+    since_time = min(_parse_time(gh_pr["created_at"]) for gh_pr in gh_prs) - _SINCE_MARGIN
+    stream_paths = [
+        "/repos/{repo}/{endpoint}?sort=created&direction=asc&since={since}".format(
+            repo=repo,
+            endpoint=endpoint,
+            since=since_time.astimezone(datetime.timezone.utc).strftime(
+                _GITHUB_TIME_FORMAT))
+        for endpoint in ("issues/comments", "pulls/comments")]
+    (gh_issue_comments, gh_line_comments, *all_gh_reviews) = client.get_paginated(
+        stream_paths + reviews_paths, executor=executor)
+
+    issue_comments_by_pr = _group_by_pr_number(gh_issue_comments, "issue_url")
+    line_comments_by_pr = _group_by_pr_number(gh_line_comments, "pull_request_url")
+    return [_make_pull_request(gh_pr["number"], gh_pr,
+                               issue_comments_by_pr.get(gh_pr["number"], []),
+                               line_comments_by_pr.get(gh_pr["number"], []),
+                               gh_reviews)
+            for gh_pr, gh_reviews in zip(gh_prs, all_gh_reviews)]
+
+def _group_by_pr_number(gh_comments, url_key):
+    """Group comments fetched from a repo-wide comment endpoint by PR number
+
+    Returns a dict mapping each PR number to a list of its comments, in order of their
+    GitHub IDs (the order in which the PR's own comment endpoint would list them)
+
+    Args:
+    gh_comments: list of dicts
+    url_key: string - key of the field in each comment giving the API URL of its PR (or
+        issue), which ends with the PR number
+    """
+    comments_by_pr = {}
+    for gh_comment in gh_comments:
+        pr_number = int(gh_comment[url_key].rstrip("/").rsplit("/", 1)[1])
+        comments_by_pr.setdefault(pr_number, []).append(gh_comment)
+    for comments in comments_by_pr.values():
+        comments.sort(key=lambda gh_comment: gh_comment["id"])
+    return comments_by_pr
+
+def _make_stream_snapshot(gh_comments, make_comment):
+    """Create a CommentStreamSnapshot from a complete list of comments fetched from GitHub
+
+    Args:
+    gh_comments: list of dicts
+    make_comment: function creating a Comment from one of the dicts in gh_comments
+    """
+    return CommentStreamSnapshot(*_parse_comment_stream(gh_comments, make_comment))
+
+def _parse_comment_stream(gh_comments, make_comment):
+    """Parse comments fetched from GitHub
+
+    Returns a tuple (dict mapping GitHub IDs to Comments, latest 'updated_at' time or None
+    if there are no comments), suitable for CommentStreamSnapshot
+
+    Args: see _make_stream_snapshot
+    """
+    comments = {gh_comment["id"]: make_comment(gh_comment) for gh_comment in gh_comments}
+    # GitHub's time strings sort in chronological order
+    last_updated = max((gh_comment["updated_at"] for gh_comment in gh_comments),
+                       default=None)
+    return (comments, last_updated)
+
+def _since_path(path, stream):
+    """Return the path for fetching comments updated since the given stream snapshot
+
+    Args:
+    path: string - path of the stream's endpoint
+    stream: CommentStreamSnapshot
+    """
+    if stream.last_updated is None:
+        return path
+    return _add_since(path, _parse_time(stream.last_updated) - _SINCE_MARGIN)
+
+def _add_since(path, since_time):
+    """Return the path with a 'since' parameter, for fetching items updated since a time
+
+    Args:
+    path: string - path of an endpoint supporting the 'since' parameter
+    since_time: datetime.datetime
+    """
+    return "{path}?since={since}".format(
+        path=path,
+        since=since_time.astimezone(datetime.timezone.utc).strftime(_GITHUB_TIME_FORMAT))
+
+def _fetch_pull_request_data_graphql(client, repo, pr_number):
+    """Fetch the raw data for a PR via the GraphQL API
+
+    The GraphQL results are converted to the same form as the REST API results (but only
+    containing the fields we use), so that the same code can turn them into our own
+    objects.
+
+    Returns a tuple (gh_pr, (gh_issue_comments, gh_line_comments, gh_reviews)), suitable
+    for passing to _make_pull_request
+
+    Args: see fetch_pull_request
+    """
+    (owner, name) = repo.split("/")
+    variables = {"owner": owner,
+                 "name": name,
+                 "number": pr_number,
+                 "withComments": True,
+                 "commentsCursor": None,
+                 "withReviews": True,
+                 "reviewsCursor": None}
+    comment_nodes = []
+    review_nodes = []
+    line_comment_nodes = []
+    while variables["withComments"] or variables["withReviews"]:
+        data = client.post_graphql(_PR_GRAPHQL_QUERY, variables)
+        pr_node = data["repository"]["pullRequest"]
+        if variables["withComments"]:
+            comment_nodes.extend(pr_node["comments"]["nodes"])
+            (variables["withComments"],
+             variables["commentsCursor"]) = _next_graphql_page(pr_node["comments"])
+        if variables["withReviews"]:
+            for review_node in pr_node["reviews"]["nodes"]:
+                review_nodes.append(review_node)
+                line_comment_nodes.extend(
+                    _fetch_all_review_comment_nodes(client, review_node))
+            (variables["withReviews"],
+             variables["reviewsCursor"]) = _next_graphql_page(pr_node["reviews"])
+
+    # The REST API lists line comments in order of their ID, rather than grouped by review
+    line_comment_nodes.sort(key=lambda node: node["databaseId"])
+
+    gh_pr = _graphql_to_rest(pr_node, time_fields={"createdAt": "created_at",
+                                                    "updatedAt": "updated_at"})
+    gh_issue_comments = [_graphql_to_rest(node, time_fields={"createdAt": "created_at",
+                                                              "updatedAt": "updated_at"})
+                         for node in comment_nodes]
+    gh_line_comments = [_graphql_to_rest(node, time_fields={"createdAt": "created_at",
+                                                             "updatedAt": "updated_at"})
+                        for node in line_comment_nodes]
+    gh_reviews = [_graphql_to_rest(node, time_fields={"submittedAt": "submitted_at"})
+                  for node in review_nodes]
+    return (gh_pr, (gh_issue_comments, gh_line_comments, gh_reviews))
+
+def _fetch_all_review_comment_nodes(client, review_node):
+    """Return the GraphQL nodes of all line comments in the given review node
+
+    The main query fetches the first 100 line comments of each review; this makes further
+    queries if a review has more than that.
+    """
+    nodes = list(review_node["comments"]["nodes"])
+    (has_next_page, cursor) = _next_graphql_page(review_node["comments"])
+    while has_next_page:
+        data = client.post_graphql(_REVIEW_COMMENTS_GRAPHQL_QUERY,
+                                   {"id": review_node["id"], "cursor": cursor})
+        connection = data["node"]["comments"]
+        nodes.extend(connection["nodes"])
+        (has_next_page, cursor) = _next_graphql_page(connection)
+    return nodes
+
+def _next_graphql_page(connection):
+    """Return a tuple (has_next_page, end_cursor) for a GraphQL connection"""
+    return (connection["pageInfo"]["hasNextPage"], connection["pageInfo"]["endCursor"])
+
+def _graphql_to_rest(node, time_fields):
+    """Convert a GraphQL node to a dict with the field names used by the REST API
+
+    Only the fields used by _make_pull_request are included.
+
+    Args:
+    node: dict - GraphQL node for a PR, comment or review
+    time_fields: dict - maps the names of the GraphQL time fields in this node to their
+        REST API names
+    """
+    gh_object = {"user": node["author"],
+                 "html_url": node["url"],
+                 "body": node["body"]}
+    for (graphql_name, rest_name) in time_fields.items():
+        gh_object[rest_name] = node[graphql_name]
+    for other_field in ("title", "path"):
+        if other_field in node:
+            gh_object[other_field] = node[other_field]
+    return gh_object
 
 def _get_access_token():
     """Get a GitHub personal access token from the environment, if one is set.
@@ -97,3 +860,30 @@ def _get_access_token():
     for more details.
     """
     return os.environ.get("GITHUB_TOKEN")
+
+def _get_base_url():
+    """Get the root URL of the GitHub API
+
+    This can be overridden with the environment variable GITHUB_API_URL (which is also
+    what GitHub Actions uses); this is mainly useful for testing against a stand-in server.
+    """
+    return os.environ.get("GITHUB_API_URL", DEFAULT_BASE_URL)
+
+def _get_login(gh_object):
+    """Return the login of the user who authored the given GitHub object (dict)
+
+    GitHub returns a null user for accounts that have since been deleted; GitHub's web
+    interface shows these as 'ghost', so we do the same.
+    """
+    if gh_object["user"] is None:
+        return "ghost"
+    return gh_object["user"]["login"]
+
+def _parse_time(time_string):
+    """Convert a time string from the GitHub API to a datetime.datetime in local time
+
+    GitHub gives times in UTC, formatted like '2020-04-23T19:24:00Z'
+    """
+    utc_time = datetime.datetime.strptime(time_string, _GITHUB_TIME_FORMAT).replace(
+        tzinfo=datetime.timezone.utc)
+    return utc_time.astimezone()
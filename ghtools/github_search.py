@@ -0,0 +1,132 @@
+"""Functions for finding pull requests with the GitHub search API
+
+A search finds matching pull requests across all repositories of an organization with
+one request per 100 results, rather than one or more requests per repository. But GitHub
+returns at most 1000 results for a search, and may give incomplete results
+if a search takes too long; so these functions report whether their results are complete,
+and callers needing every match should then fall back to the functions in github_fetch.
+"""
+
+from ghtools.github_fetch import get_client
+from ghtools.organization import repo_sort_key
+from ghtools.utils import make_executor
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+_SEARCH_ISSUES_PATH = "/search/issues"
+
+# Search qualifiers used to find the open PRs that concern a user: all but the last find
+# the PRs in which all todos concern the user; the last, _OWN_TODOS_QUALIFIER, finds any
+# further PRs in which only the user's own todos concern them
+_OWN_TODOS_QUALIFIER = "involves"
+_USER_SEARCH_QUALIFIERS = ("author", "reviewed-by", "review-requested", _OWN_TODOS_QUALIFIER)
+
+# ------------------------------------------------------------------------
+# Public functions
+# ------------------------------------------------------------------------
+
+def search_open_pull_requests(org, extra_query="", max_workers=1, client=None,
+                              stop_if_truncated=False):
+    """Find open pull requests in an organization with the GitHub search API
+
+    This finds all open PRs in all repositories in the organization with a handful of
+    requests (one per 100 results), rather than one or more per repository.
+
+    Returns a tuple (prs, complete). prs is a list of tuples (repo, pr_number), sorted by
+    repo (as by organization.repo_sort_key) and then PR number. complete is False if GitHub reports that the search results
+    are incomplete, or if there are more of them than the search API returns (see
+    GitHubClient.search); callers needing every match should then fall back to listing
+    each repository's PRs, and can pass stop_if_truncated to avoid fetching results
+    they won't use.
+
+    Args:
+    org: string
+    extra_query: string - further search terms and qualifiers narrowing the search, for
+        example 'updated:>=2024-01-01' or 'checklist in:body,comments'; see
+        https://docs.github.com/en/search-github/searching-on-github/searching-issues-and-pull-requests
+    max_workers: integer - maximum number of concurrent requests to GitHub
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    stop_if_truncated: boolean - if True, only the first page of results is fetched when
+        there are more matches than the search API returns (see GitHubClient.search)
+    """
+    if client is None:
+        client = get_client()
+    with make_executor(max_workers) as executor:
+        (gh_items, complete) = _search_open_pull_requests(client, org, extra_query, executor,
+                                                          stop_if_truncated)
+    prs = sorted({(_search_item_repo(gh_item), gh_item["number"]) for gh_item in gh_items},
+                 key=lambda pr: (repo_sort_key(pr[0]), pr[1]))
+    return (prs, complete)
+
+def search_user_pull_requests(org, username, max_workers=1, client=None):
+    """Find the open pull requests in an organization that concern a user
+
+    These are the open PRs that the user authored, reviewed or was asked to review, and
+    those in which the user is otherwise involved (e.g., by commenting or being
+    mentioned). They are found with a few requests to the GitHub search API.
+
+    Returns a tuple (prs, complete). prs is a list of tuples (repo, pr_number,
+    pr_updated_at, own_todos_only), sorted as for search_open_pull_requests, where
+    pr_updated_at is the PR's 'updated_at' time as given by GitHub, and own_todos_only is
+    False for PRs that the user authored, reviewed or was asked to review, and True for
+    the others (in which only the user's own todos concern them). complete is False if
+    any of the searches gave incomplete results (see search_open_pull_requests).
+
+    Args:
+    org: string
+    username: string - GitHub user name
+    max_workers: integer - maximum number of concurrent requests to GitHub
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    """
+    if client is None:
+        client = get_client()
+    found = {}
+    complete = True
+    with make_executor(max_workers) as executor:
+        for qualifier in _USER_SEARCH_QUALIFIERS:
+            (gh_items, query_complete) = _search_open_pull_requests(
+                client, org, "{qualifier}:{username}".format(qualifier=qualifier,
+                                                             username=username),
+                executor)
+            complete = complete and query_complete
+            for gh_item in gh_items:
+                key = (_search_item_repo(gh_item), gh_item["number"])
+                # A PR found by any search other than _OWN_TODOS_QUALIFIER is wholly the
+                # user's concern
+                own_todos_only = (qualifier == _OWN_TODOS_QUALIFIER and
+                                  found.get(key, (None, True))[1])
+                found[key] = (gh_item["updated_at"], own_todos_only)
+    prs = [(repo, pr_number, pr_updated_at, own_todos_only)
+           for (repo, pr_number), (pr_updated_at, own_todos_only)
+           in sorted(found.items(), key=lambda item: (repo_sort_key(item[0][0]), item[0][1]))]
+    return (prs, complete)
+
+# ------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------
+
+def _search_open_pull_requests(client, org, extra_query, executor, stop_if_truncated=False):
+    """Search for open pull requests in an organization
+
+    Returns a tuple (gh_items, complete), as for GitHubClient.search
+
+    Args:
+    client: GitHubClient
+    org: string
+    extra_query: string - further search terms and qualifiers
+    executor: concurrent.futures.Executor or None
+    stop_if_truncated: boolean - as for GitHubClient.search
+    """
+    query = "org:{org} is:pr is:open {extra_query}".format(org=org,
+                                                           extra_query=extra_query).strip()
+    return client.search(_SEARCH_ISSUES_PATH, query, executor=executor,
+                         stop_if_truncated=stop_if_truncated)
+
+def _search_item_repo(gh_item):
+    """Return the full name (ORG/REPO) of the repository of an issue search result"""
+    # The repository URL is like https://api.github.com/repos/ORG/REPO
+    return gh_item["repository_url"].rsplit("/repos/", 1)[1]
@@ -0,0 +1,243 @@
+"""Persistent on-disk cache of GitHub API responses
+
+Cached responses are revalidated with conditional requests (using the ETag and
+Last-Modified headers that GitHub sends): if nothing has changed, GitHub replies with a
+cheap '304 Not Modified' response, which does not count against the API rate limit, and
+the cached data is used.
+
+The cache is bounded in size: when it grows beyond its maximum size, the least recently
+used entries are evicted.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+# Default maximum total size of the cache, in bytes
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+# Response headers that we store along with the cached data
+_CACHED_HEADERS = ("ETag", "Last-Modified", "Link")
+
+_ENTRY_SUFFIX = ".json"
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def default_cache_dir():
+    """Return the default directory for the response cache
+
+    This is $XDG_CACHE_HOME/ghtools/http if XDG_CACHE_HOME is set, otherwise
+    ~/.cache/ghtools/http
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "ghtools", "http")
+
+# ------------------------------------------------------------------------
+# Begin class definitions
+# ------------------------------------------------------------------------
+
+class CacheStats:
+    # pylint: disable=too-few-public-methods
+    """Counters describing how effective a ResponseCache has been"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return ("HTTP cache: {hits} hits (revalidated with 304 Not Modified), "
+                "{misses} misses, {evictions} evictions".format(
+                    hits=self.hits, misses=self.misses, evictions=self.evictions))
+
+class FileLru:
+    """Sizes and access order of the files in a directory, bounding their total size
+
+    Each file is named by its key plus a suffix. Between runs, the last access time of
+    each file is kept as its modification time. Used by ResponseCache, and by
+    pr_snapshot.SnapshotStore. Can safely be used from multiple threads.
+    """
+
+    def __init__(self, directory, suffix, max_size):
+        """Initialize a FileLru with the existing files in directory
+
+        Args:
+        directory: string - directory holding the files
+        suffix: string - suffix of the names of the files, after their keys
+        max_size: integer - maximum total size of the files, in bytes
+        """
+        self._directory = directory
+        self._suffix = suffix
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+        # For each file, its key maps to [size in bytes, access sequence number]; larger
+        # sequence numbers mean more recent access
+        self._access_counter = itertools.count()
+        self._entries = {}
+        existing = []
+        for filename in os.listdir(directory):
+            if filename.endswith(suffix):
+                stat = os.stat(os.path.join(directory, filename))
+                existing.append((stat.st_mtime, filename[:-len(suffix)], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = [size, next(self._access_counter)]
+        self._total_size = sum(size for size, _ in self._entries.values())
+
+    def path(self, key):
+        """Return the path to the file with the given key"""
+        return os.path.join(self._directory, key + self._suffix)
+
+    def touch(self, key):
+        """Record that the file with the given key was just read"""
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if key in self._entries:
+                self._entries[key][1] = next(self._access_counter)
+
+    def add(self, key):
+        """Record that the file with the given key was just written
+
+        Then removes the least recently used files until the total size fits in the
+        maximum size. Returns the number of files removed.
+        """
+        size = os.path.getsize(self.path(key))
+        with self._lock:
+            if key in self._entries:
+                self._total_size -= self._entries[key][0]
+            self._entries[key] = [size, next(self._access_counter)]
+            self._total_size += size
+            if self._total_size <= self._max_size:
+                return 0
+            evicted = 0
+            for old_key in sorted(self._entries, key=lambda k: self._entries[k][1]):
+                if self._total_size <= self._max_size:
+                    break
+                self._remove(old_key)
+                evicted += 1
+            return evicted
+
+    def clear(self):
+        """Remove all files"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _remove(self, key):
+        """Remove one file
+
+        Must be called with self._lock held
+        """
+        size, _ = self._entries.pop(key)
+        self._total_size -= size
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+class ResponseCache:
+    """Persistent, size-bounded LRU cache of GitHub API responses
+
+    A single cache can safely be used from multiple threads.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        """Initialize a ResponseCache, creating cache_dir if necessary
+
+        Args:
+        cache_dir: string - directory holding the cached responses
+        max_size: integer - maximum total size of the cache, in bytes
+        """
+        self._cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lru = FileLru(cache_dir, _ENTRY_SUFFIX, max_size)
+
+    @staticmethod
+    def make_key(url, token=None):
+        """Return the cache key for a request
+
+        Args:
+        url: string - full URL of the request, including query parameters
+        token: string or None - the access token used for the request. This is part of
+            the key because different tokens may be allowed to see different data. (Only
+            a hash is stored on disk, never the token itself.)
+        """
+        return hashlib.sha256("{}\n{}".format(token or "", url).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached entry for the given key, or None if there is none
+
+        The returned entry is a dict with keys 'headers' and 'data'.
+        """
+        try:
+            with open(self._lru.path(key), encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        self._lru.touch(key)
+        return entry
+
+    def record_hit(self):
+        """Record that a cached entry was successfully revalidated and used"""
+        with self._lock:
+            self.stats.hits += 1
+
+    def record_miss(self):
+        """Record that a response could not be served from the cache"""
+        with self._lock:
+            self.stats.misses += 1
+
+    @staticmethod
+    def get_validators(entry):
+        """Return the conditional request headers needed to revalidate the given entry"""
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    @staticmethod
+    def is_cacheable(headers):
+        """Return True if a response with the given headers can be revalidated later"""
+        return bool(headers.get("ETag") or headers.get("Last-Modified"))
+
+    def put(self, key, headers, data):
+        """Store a response in the cache, evicting old entries if necessary
+
+        Args:
+        key: string - from make_key
+        headers: dict-like - response headers; only the ones we need are stored
+        data: the decoded JSON body
+        """
+        entry = {"headers": {name: headers[name] for name in _CACHED_HEADERS
+                             if name in headers},
+                 "data": data}
+        # Write to a temporary file and then rename it, so that readers (possibly in other
+        # processes) never see a partially-written entry
+        fd, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+            json.dump(entry, cache_file, separators=(",", ":"))
+        os.replace(temp_path, self._lru.path(key))
+        evicted = self._lru.add(key)
+        with self._lock:
+            self.stats.evictions += evicted
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        self._lru.clear()
@@ -0,0 +1,146 @@
+"""Classes for holding information about a GitHub organization and its repositories
+"""
+
+def repo_sort_key(full_name):
+    """Return the key by which repositories are ordered, given a full name (ORG/REPO)
+
+    Repositories are ordered by name without regard to case, as GitHub itself lists them
+    (with names that differ only in case in a fixed order). Everything that prints
+    repositories in order uses this key, so that all outputs agree.
+    """
+    return (full_name.lower(), full_name)
+
+class Organization:
+    """Class for holding information about a GitHub organization"""
+
+    def __init__(self, name, repos):
+        """Initialize an Organization object.
+
+        Args:
+        name: string
+        repos: iterable of RepoInfo objects - the repositories in this organization
+        """
+        self._name = name
+        self._repos = sorted(repos, key=lambda repo: repo_sort_key(repo.get_full_name()))
+
+    def get_name(self):
+        """Return the name of this organization"""
+        return self._name
+
+    def get_repos(self, include_archived=True, pushed_since_time=None):
+        """Return a list of RepoInfo objects for the repositories, in alphabetical order
+
+        Case is ignored in the order, as it is by GitHub.
+
+        Args:
+        include_archived: boolean - whether to include archived repositories
+        pushed_since_time: datetime.datetime or None - if given, only include repositories
+            that have been pushed to at or after this time
+        """
+        return [repo for repo in self._repos
+                if (include_archived or not repo.is_archived()) and
+                (pushed_since_time is None or repo.pushed_since(pushed_since_time))]
+
+    def get_repo_names(self, include_archived=True, pushed_since_time=None):
+        """Return a list of the full names of the repositories, in alphabetical order
+
+        Args are the same as for get_repos
+        """
+        return [repo.get_full_name() for repo in
+                self.get_repos(include_archived=include_archived,
+                               pushed_since_time=pushed_since_time)]
+
+    def __repr__(self):
+        return(type(self).__name__ +
+               "(name={name}, "
+               "repos={repos})".format(name=repr(self._name),
+                                       repos=repr(self._repos)))
+
+    def __eq__(self, other):
+        if isinstance(other, Organization):
+            return self.__dict__ == other.__dict__
+        return NotImplemented
+
+class RepoInfo:
+    """Class for holding the metadata of a GitHub repository that we keep in its
+    organization's repository index"""
+
+    def __init__(self, full_name, pushed_at, archived, default_branch, open_issues_count):
+        """Initialize a RepoInfo object.
+
+        Args:
+        full_name: string - in the format ORG/REPO
+        pushed_at: datetime.datetime or None - time of the last push to any branch of
+            the repository; None if it has never been pushed to
+        archived: boolean
+        default_branch: string
+        open_issues_count: integer - number of open issues and pull requests (GitHub
+            doesn't give the number of open pull requests alone in its repository lists)
+        """
+        self._full_name = full_name
+        self._pushed_at = pushed_at
+        self._archived = archived
+        self._default_branch = default_branch
+        self._open_issues_count = open_issues_count
+
+    def get_full_name(self):
+        """Return the full name (ORG/REPO) of this repository"""
+        return self._full_name
+
+    def get_pushed_at(self):
+        """Return the time of the last push to this repository, or None if there is none"""
+        return self._pushed_at
+
+    def is_archived(self):
+        """Return True if this repository is archived"""
+        return self._archived
+
+    def get_default_branch(self):
+        """Return the name of this repository's default branch"""
+        return self._default_branch
+
+    def get_open_issues_count(self):
+        """Return the number of open issues and pull requests in this repository"""
+        return self._open_issues_count
+
+    def may_have_open_pull_requests(self):
+        """Return False if this repository is known to have no open pull requests
+
+        That is the case if it has no open issues and pull requests at all; otherwise,
+        there is no telling from its metadata whether any of them are pull requests.
+        """
+        return self._open_issues_count != 0
+
+    def pushed_since(self, time):
+        """Return True if this repository has been pushed to at or after the given time
+
+        Args:
+        time: datetime.datetime
+        """
+        return self._pushed_at is not None and self._pushed_at >= time
+
+    def get_summary(self):
+        """Return a one-line, tab-separated summary of this repository's metadata"""
+        return "\t".join([self._full_name,
+                          "" if self._pushed_at is None else self._pushed_at.isoformat(),
+                          self._default_branch or "",
+                          str(self._open_issues_count),
+                          "archived" if self._archived else ""]).rstrip("\t")
+
+    def __repr__(self):
+        return(type(self).__name__ +
+               "(full_name={full_name}, "
+               "pushed_at={pushed_at}, "
+               "archived={archived}, "
+               "default_branch={default_branch}, "
+               "open_issues_count={open_issues_count})".format(
+                   full_name=repr(self._full_name),
+                   pushed_at=repr(self._pushed_at),
+                   archived=repr(self._archived),
+                   default_branch=repr(self._default_branch),
+                   open_issues_count=repr(self._open_issues_count)))
+
+    def __eq__(self, other):
+        if isinstance(other, RepoInfo):
+            return self.__dict__ == other.__dict__
+        return NotImplemented
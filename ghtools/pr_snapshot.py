@@ -0,0 +1,221 @@
+"""Local snapshots of pull requests, allowing later fetches to get only what has changed
+
+A snapshot holds the parsed Comment objects of a PR as of the last time it was fetched,
+keyed by their GitHub IDs, along with the PR's last-updated time. github_fetch uses this
+to fetch only the comments that have been added or edited since then, and merges them
+into the snapshot. The same store also holds InboxSnapshots, which keep the pull requests
+of a user's inbox (see gh_org_query.print_user_inbox) between runs, and
+RepoIndexSnapshots, which keep the repositories of an organization (see repo_index).
+
+Snapshots are stored with pickle, so a snapshot directory should only ever hold files
+written by this module. Like the HTTP response cache, a store is bounded in size: when it
+grows beyond its maximum size, the least recently used snapshots are removed.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from ghtools.http_cache import FileLru
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+# This should be incremented whenever the contents of a snapshot (including the Comment
+# classes it holds) change in an incompatible way; snapshots with a different version are
+# ignored. Since Comments are stored along with the todos extracted from them, this should
+# also be incremented whenever comment_todo.extract_todos changes which todos it finds.
+SNAPSHOT_FORMAT_VERSION = 3
+
+# Name of the subdirectory of the HTTP response cache directory in which the command-line
+# tools keep their snapshots
+SNAPSHOT_SUBDIR = "pr-snapshots"
+
+# Default maximum total size of a snapshot store, in bytes. This is separate from the
+# maximum size of the HTTP response cache, even when the store is kept within the cache
+# directory.
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+_SNAPSHOT_SUFFIX = ".pickle"
+
+# ------------------------------------------------------------------------
+# Begin class definitions
+# ------------------------------------------------------------------------
+
+class CommentStreamSnapshot:
+    """The comments from one of a PR's comment endpoints, as of the last fetch"""
+
+    def __init__(self, comments, last_updated):
+        """Initialize a CommentStreamSnapshot
+
+        Args:
+        comments: dict - maps the GitHub ID of each comment to its Comment object
+        last_updated: string or None - the latest 'updated_at' time (as given by GitHub)
+            of any comment fetched from this endpoint; None if there were none
+        """
+        self.comments = comments
+        self.last_updated = last_updated
+
+    def merge(self, new_comments, new_last_updated):
+        """Add or replace the given comments
+
+        Args:
+        new_comments: dict - maps GitHub IDs to Comment objects; these replace any
+            existing comments with the same IDs
+        new_last_updated: string or None - the latest 'updated_at' time of the new
+            comments
+        """
+        self.comments.update(new_comments)
+        if new_last_updated is not None:
+            self.last_updated = max(self.last_updated or new_last_updated, new_last_updated)
+
+    def clear(self):
+        """Remove all comments"""
+        self.comments = {}
+        self.last_updated = None
+
+    def get_comments(self):
+        """Return a list of this stream's Comments, in order of their GitHub IDs"""
+        return [self.comments[comment_id] for comment_id in sorted(self.comments)]
+
+class PullRequestSnapshot:
+    # pylint: disable=too-few-public-methods
+    """Everything we keep about a PR between fetches
+
+    Usually the PR itself is refetched, so only the few fields of it needed to rebuild it
+    without refetching (when its 'updated_at' time is known not to have changed) are
+    stored here, along with its comments.
+    """
+
+    def __init__(self, pr_updated_at, issue_comments, line_comments, review_comments,
+                 pr_data=None):
+        """Initialize a PullRequestSnapshot
+
+        Args:
+        pr_updated_at: string - the PR's 'updated_at' time, as given by GitHub
+        issue_comments: CommentStreamSnapshot - conversation comments
+        line_comments: CommentStreamSnapshot - line comments
+        review_comments: list of Comments - the non-empty reviews; these are stored as a
+            plain list since they are always refetched in full when the PR changes
+        pr_data: dict or None - the fields of the PR itself needed to rebuild it, as
+            given by GitHub; None if they are not kept
+        """
+        self.pr_updated_at = pr_updated_at
+        self.issue_comments = issue_comments
+        self.line_comments = line_comments
+        self.review_comments = review_comments
+        self.pr_data = pr_data
+
+class InboxSnapshot:
+    # pylint: disable=too-few-public-methods
+    """The pull requests in a user's inbox, as of the last time it was fetched"""
+
+    def __init__(self, pull_requests):
+        """Initialize an InboxSnapshot
+
+        Args:
+        pull_requests: dict - maps tuples (repo, pr_number) to tuples (pr_updated_at,
+            pull_request), where pr_updated_at is the PR's 'updated_at' time (as given by
+            GitHub) when pull_request (a PullRequest) was fetched
+        """
+        self.pull_requests = pull_requests
+
+class RepoIndexSnapshot:
+    # pylint: disable=too-few-public-methods
+    """The repositories of an organization, as of the last time they were listed"""
+
+    def __init__(self, organization, fetched_at):
+        """Initialize a RepoIndexSnapshot
+
+        Args:
+        organization: Organization - the organization, with the metadata of its
+            repositories
+        fetched_at: datetime.datetime - when the organization was fetched
+        """
+        self.organization = organization
+        self.fetched_at = fetched_at
+
+class SnapshotStore:
+    """Directory of PullRequestSnapshots, one file per PR
+
+    Writes are atomic, so a store can safely be shared between threads and processes
+    (with the last write of a given PR winning). The store is bounded in size: saving a
+    snapshot removes the least recently used ones if the store has grown beyond its
+    maximum size. (Each process only knows about the snapshots that existed when it
+    opened the store and the ones it saved itself, so the bound is approximate when
+    several processes share a store.)
+    """
+
+    def __init__(self, snapshot_dir, max_size=DEFAULT_MAX_SIZE):
+        """Initialize a SnapshotStore, creating snapshot_dir if necessary
+
+        Args:
+        snapshot_dir: string - directory holding the snapshots
+        max_size: integer - maximum total size of the snapshots, in bytes
+        """
+        self._snapshot_dir = snapshot_dir
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self._lru = FileLru(snapshot_dir, _SNAPSHOT_SUFFIX, max_size)
+
+    @staticmethod
+    def make_key(base_url, repo, pr_number):
+        """Return the key under which the snapshot of the given PR is stored
+
+        Args:
+        base_url: string - root URL of the GitHub API that the PR was fetched from
+        repo: string - in the format ORG/REPO (case-insensitive, like GitHub itself)
+        pr_number: integer
+        """
+        return hashlib.sha256("{}\n{}#{}".format(base_url, repo.lower(), pr_number)
+                              .encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_inbox_key(base_url, org, username):
+        """Return the key under which the InboxSnapshot of the given user is stored
+
+        Args:
+        base_url: string - root URL of the GitHub API that the inbox was fetched from
+        org: string - organization that the inbox covers (case-insensitive)
+        username: string - GitHub user name (case-insensitive)
+        """
+        return hashlib.sha256("{}\ninbox {} {}".format(base_url, org.lower(), username.lower())
+                              .encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_repo_index_key(base_url, org):
+        """Return the key under which the RepoIndexSnapshot of the given organization is stored
+
+        Args:
+        base_url: string - root URL of the GitHub API that the organization was fetched from
+        org: string - organization (case-insensitive)
+        """
+        return hashlib.sha256("{}\nrepos {}".format(base_url, org.lower())
+                              .encode("utf-8")).hexdigest()
+
+    def load(self, key):
+        """Return the PullRequestSnapshot stored under key, or None if there is none
+
+        Snapshots that cannot be read, or that were written with a different
+        SNAPSHOT_FORMAT_VERSION, are treated as missing.
+        """
+        try:
+            with open(self._lru.path(key), "rb") as snapshot_file:
+                (version, snapshot) = pickle.load(snapshot_file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError,
+                AttributeError, ImportError):
+            return None
+        if version != SNAPSHOT_FORMAT_VERSION:
+            return None
+        self._lru.touch(key)
+        return snapshot
+
+    def save(self, key, snapshot):
+        """Store a PullRequestSnapshot under key, replacing any existing snapshot"""
+        # Write to a temporary file and then rename it, so that readers (possibly in other
+        # processes) never see a partially-written snapshot
+        fd, temp_path = tempfile.mkstemp(dir=self._snapshot_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as snapshot_file:
+            pickle.dump((SNAPSHOT_FORMAT_VERSION, snapshot), snapshot_file)
+        os.replace(temp_path, self._lru.path(key))
+        self._lru.add(key)
@@ -76,13 +76,55 @@ class PullRequest:
         updated_since_time: if provided (not None), then it should be a datetime.datetime
             object; only comments updated on or after that time are included.
         """
-        todos = []
+        (outstanding, done) = self.get_all_todos(filter_username=filter_username,
+                                                 created_since_time=created_since_time,
+                                                 updated_since_time=updated_since_time)
+        if completed:
+            return done
+        return outstanding
+
+    def get_all_todos(self, filter_username=None, created_since_time=None,
+                      updated_since_time=None):
+        """Return both the incomplete and the completed todos in the PR body and comments
+
+        Each comment is scanned just once for both kinds of todos. Returns a tuple
+        (outstanding, completed) of lists of CommentTodo objects, each sorted as for
+        get_todos.
+
+        Args: same as for get_todos
+        """
+        outstanding = []
+        done = []
+        for one_comment in self._filter_comments(filter_username=filter_username,
+                                                 created_since_time=created_since_time,
+                                                 updated_since_time=updated_since_time):
+            for todo in one_comment.get_all_todos():
+                if todo.is_completed():
+                    done.append(todo)
+                else:
+                    outstanding.append(todo)
+        outstanding.sort(key=lambda t: (t.is_optional(), t.get_creation_date()))
+        done.sort(key=lambda t: (t.is_optional(), t.get_creation_date()))
+        return (outstanding, done)
+
+    def get_todo_progress(self, filter_username=None, created_since_time=None,
+                          updated_since_time=None):
+        """Return a tuple (num_completed, num_total) counting the todos in the PR
+
+        This counts the todos in the PR body and all comments, from a single scan of each
+        (see Comment.get_todo_progress).
+
+        Args: same as for get_todos
+        """
+        num_completed = 0
+        num_total = 0
         for one_comment in self._filter_comments(filter_username=filter_username,
                                                  created_since_time=created_since_time,
                                                  updated_since_time=updated_since_time):
-            todos.extend(one_comment.get_todos(completed=completed))
-        todos.sort(key=lambda t: (t.is_optional(), t.get_creation_date()))
-        return todos
+            (comment_completed, comment_total) = one_comment.get_todo_progress()
+            num_completed += comment_completed
+            num_total += comment_total
+        return (num_completed, num_total)
 
     def _filter_comments(self, filter_username, created_since_time, updated_since_time):
         """Return a list of comments, possibly filtered by some attributes
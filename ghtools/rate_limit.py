@@ -0,0 +1,280 @@
+"""Scheduling of GitHub API requests around GitHub's rate limits
+
+GitHub enforces two kinds of rate limit:
+
+- A primary limit: a fixed number of requests per hour (separately for the REST 'core'
+  API, the search API and the GraphQL API). Every response reports how many requests
+  remain and when the limit resets, in the X-RateLimit-* headers.
+
+- Secondary limits, on bursts of requests or concurrency, which are not reported in
+  advance. Exceeding one gives a 403 or 429 response, usually with a Retry-After header.
+
+RateLimiter tracks the primary limits from response headers, pacing requests so that a
+configurable number of requests is always left in reserve, and waiting for the limit to
+reset when the budget is used up. When a request is rejected by either kind of limit, it
+is retried after the time given by GitHub, or else after an exponentially increasing
+delay with random jitter. Before any wait of more than a few seconds, a one-line notice
+saying how long it will be and why is printed to stderr. See
+https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
+"""
+
+import datetime
+import email.utils
+import random
+import sys
+import threading
+import time
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+# Default maximum number of times a rate-limited request is retried
+DEFAULT_MAX_RETRIES = 5
+
+# Once fewer than this many requests remain in the budget for the current rate-limit
+# window, requests are spread evenly over the rest of the window rather than being made
+# as fast as possible
+DEFAULT_PACE_BELOW = 100
+
+# Delay, in seconds, before the first retry of a request rejected by a secondary rate
+# limit without a Retry-After header (GitHub asks for at least a minute); this doubles
+# with each further retry, up to _MAX_RETRY_DELAY
+_BASE_RETRY_DELAY = 60.0
+_MAX_RETRY_DELAY = 15 * 60.0
+
+# Maximum random delay, in seconds, added to waits given by GitHub (via Retry-After or the
+# reset time), so that many threads or processes waiting on the same limit don't all
+# retry at the same moment
+_MAX_JITTER = 1.0
+
+# Waits longer than this many seconds are announced on stderr, so that a tool that is
+# waiting for a rate limit doesn't look hung. A wait that ends within this many seconds
+# of the end of an already-announced wait (e.g., another thread waiting for the same
+# reset) isn't announced again.
+_NOTICE_MIN_WAIT = 5.0
+
+# ------------------------------------------------------------------------
+# Begin class definitions
+# ------------------------------------------------------------------------
+
+class RateLimitStats:
+    # pylint: disable=too-few-public-methods
+    """Counters describing what a RateLimiter has done"""
+
+    def __init__(self):
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def __str__(self):
+        return ("Rate limiting: {requests} requests, {rate_limited} rate-limited "
+                "responses, {retries} retries, {waits} waits totalling {wait_time:.1f} s"
+                .format(requests=self.requests, rate_limited=self.rate_limited,
+                        retries=self.retries, waits=self.waits, wait_time=self.wait_time))
+
+class RateLimiter:
+    """Paces and retries requests according to GitHub's rate limits
+
+    A single RateLimiter can safely be used from multiple threads; it should be shared
+    by everything that makes requests with the same access token.
+    """
+
+    def __init__(self, reserve=0, pace_below=DEFAULT_PACE_BELOW,
+                 max_retries=DEFAULT_MAX_RETRIES, max_wait=None,
+                 clock=time.time, sleep=time.sleep):
+        # pylint: disable=too-many-arguments
+        """Initialize a RateLimiter
+
+        Args:
+        reserve: integer - number of requests to leave unused in each rate-limit window
+            (e.g., for other tools sharing the same access token)
+        pace_below: integer - once fewer than this many requests (beyond the reserve)
+            remain in the current window, requests are spread evenly over the rest of
+            the window
+        max_retries: integer - maximum number of times a rate-limited request is retried
+        max_wait: number or None - maximum number of seconds to wait before a single
+            retry; a request that would need a longer wait is not retried. If None,
+            there is no maximum (so a long scan can wait out an exhausted limit).
+        clock: function returning the current time in seconds since the epoch
+        sleep: function sleeping for the given number of seconds
+        """
+        self._reserve = reserve
+        self._pace_below = pace_below
+        self._max_retries = max_retries
+        self._max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Maps each rate-limit resource ('core', 'search', 'graphql', ...) to a list
+        # [remaining requests, reset time in seconds since the epoch]
+        self._limits = {}
+        # Maps each resource to the earliest time at which the next request may start,
+        # when pacing
+        self._next_slot = {}
+        # No request may start before this time (set when a request is rate-limited, so
+        # that other threads also back off)
+        self._not_before = 0.0
+        # End time of the latest wait announced on stderr
+        self._announced_until = 0.0
+        self.stats = RateLimitStats()
+
+    def call(self, send, resource="core"):
+        """Make a request via send, waiting and retrying as needed; return the response
+
+        If the request is still rate-limited after the maximum number of retries, the
+        last (rate-limited) response is returned; see is_rate_limited.
+
+        Args:
+        send: function taking no arguments, making the request and returning a
+            requests.Response
+        resource: string - the rate-limit resource that the request counts against:
+            'core' for most of the REST API, 'search' for the search API or 'graphql'
+        """
+        attempt = 0
+        while True:
+            self._wait(*self._reserve_slot(resource))
+            response = send()
+            retry_delay = self._record_response(response, resource, attempt)
+            if retry_delay is None:
+                return response
+            self._wait(retry_delay,
+                       "GitHub rejected a request with a rate limit; retrying it "
+                       "(retry {} of {})".format(attempt + 1, self._max_retries))
+            attempt += 1
+
+    @staticmethod
+    def is_rate_limited(response):
+        """Return True if the given requests.Response was rejected by a rate limit
+
+        GitHub uses 403 both for rate limits and for permission errors; rate-limit
+        responses are recognized by their headers or message.
+        """
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        return ("Retry-After" in response.headers or
+                response.headers.get("X-RateLimit-Remaining") == "0" or
+                "rate limit" in response.text.lower())
+
+    def _reserve_slot(self, resource):
+        """Reserve a time to start a request
+
+        Returns a tuple (seconds, reason): the number of seconds to wait for it, and a
+        string saying why
+        """
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._not_before)
+            reason = "backing off after GitHub rejected a request with a rate limit"
+            limit = self._limits.get(resource)
+            if limit is not None and limit[1] > start:
+                available = limit[0] - self._reserve
+                if available <= 0:
+                    # Wait for the window to reset. (After that, requests go ahead freely
+                    # until a response tells us the new remaining count.)
+                    start = limit[1] + random.uniform(0, _MAX_JITTER)
+                    reason = ("the GitHub API rate limit for '{}' is used up until it "
+                              "resets".format(resource))
+                else:
+                    if available < self._pace_below:
+                        start = max(start, self._next_slot.get(resource, 0.0))
+                        self._next_slot[resource] = start + (limit[1] - start) / available
+                        reason = ("pacing requests, since only {} remain in the GitHub API "
+                                  "rate limit for '{}'".format(available, resource))
+                    # Count this request against the budget now, so that concurrent
+                    # requests see it before its response arrives
+                    limit[0] -= 1
+            return (start - now, reason)
+
+    def _record_response(self, response, resource, attempt):
+        """Update our state from a response
+
+        Returns the number of seconds to wait before retrying the request, or None if it
+        should not be retried
+
+        Args:
+        response: requests.Response
+        resource: string - see call
+        attempt: integer - number of times this request has already been retried
+        """
+        headers = response.headers
+        with self._lock:
+            self.stats.requests += 1
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+                self._limits[headers.get("X-RateLimit-Resource", resource)] = [
+                    int(headers["X-RateLimit-Remaining"]),
+                    float(headers["X-RateLimit-Reset"])]
+            if not self.is_rate_limited(response):
+                return None
+            self.stats.rate_limited += 1
+            if attempt >= self._max_retries:
+                return None
+            delay = self._retry_delay(headers, attempt)
+            if self._max_wait is not None and delay > self._max_wait:
+                return None
+            self.stats.retries += 1
+            self._not_before = max(self._not_before, self._clock() + delay)
+            return delay
+
+    def _retry_delay(self, headers, attempt):
+        """Return the number of seconds to wait before retrying a rate-limited request"""
+        retry_after = _parse_retry_after(headers.get("Retry-After"), self._clock())
+        if retry_after is not None:
+            return retry_after + random.uniform(0, _MAX_JITTER)
+        if headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in headers:
+            return (max(0.0, float(headers["X-RateLimit-Reset"]) - self._clock()) +
+                    random.uniform(0, _MAX_JITTER))
+        delay = min(_MAX_RETRY_DELAY, _BASE_RETRY_DELAY * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def _wait(self, seconds, reason):
+        """Sleep for the given number of seconds (if positive), recording the wait
+
+        Waits longer than _NOTICE_MIN_WAIT are announced on stderr, with the given reason
+        """
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.stats.waits += 1
+            self.stats.wait_time += seconds
+            end = self._clock() + seconds
+            announce = (seconds > _NOTICE_MIN_WAIT and
+                        end > self._announced_until + _NOTICE_MIN_WAIT)
+            if announce:
+                self._announced_until = end
+        if announce:
+            print("Waiting {:.0f} s: {}".format(seconds, reason), file=sys.stderr)
+        self._sleep(seconds)
+
+# ------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------
+
+def _parse_retry_after(value, now):
+    """Return the number of seconds to wait given by a Retry-After header, or None
+
+    The header gives either a number of seconds or an HTTP date (see RFC 9110, section
+    10.2.3). Returns None if there is no header or it can't be parsed.
+
+    Args:
+    value: string or None - the value of the header
+    now: float - the current time in seconds since the epoch
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_time.tzinfo is None:
+        # HTTP dates are always in UTC
+        retry_time = retry_time.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, retry_time.timestamp() - now)
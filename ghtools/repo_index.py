@@ -0,0 +1,46 @@
+"""Local index of the repositories of an organization, refreshed incrementally
+
+The index of an organization is an Organization object holding the metadata of each of
+its repositories (see organization.RepoInfo). It is kept in a SnapshotStore between runs,
+so that tools can filter the repositories they scan (e.g., skipping archived repositories
+or those not pushed to recently) without listing them all again. The index is refreshed
+by listing the repositories again, with conditional requests when the client has a
+response cache; or, if it is recent enough for the caller's purposes, used as is without
+any requests at all.
+"""
+
+import datetime
+from ghtools.github_fetch import get_client, fetch_organization
+from ghtools.pr_snapshot import RepoIndexSnapshot
+
+# ------------------------------------------------------------------------
+# Public functions
+# ------------------------------------------------------------------------
+
+def fetch_repo_index(org, snapshots=None, max_age=None, max_workers=1, client=None):
+    """Return an Organization holding the metadata of the given organization's repositories
+
+    Args:
+    org: string
+    snapshots: SnapshotStore or None - if given, the index is kept in this store
+    max_age: datetime.timedelta or None - if given (with snapshots), an index fetched
+        less than this long ago is returned without refreshing it
+    max_workers: integer - maximum number of concurrent requests to GitHub (see
+        github_fetch.fetch_organization)
+    client: GitHubClient or None - client to use for the requests; if None, the shared
+        client from get_client is used
+    """
+    if client is None:
+        client = get_client()
+    if snapshots is None:
+        return fetch_organization(org, max_workers=max_workers, client=client)
+    key = snapshots.make_repo_index_key(client.get_base_url(), org)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if max_age is not None:
+        snapshot = snapshots.load(key)
+        if isinstance(snapshot, RepoIndexSnapshot) and \
+           now - snapshot.fetched_at < max_age:
+            return snapshot.organization
+    organization = fetch_organization(org, max_workers=max_workers, client=client)
+    snapshots.save(key, RepoIndexSnapshot(organization, fetched_at=now))
+    return organization
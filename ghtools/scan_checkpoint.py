@@ -0,0 +1,198 @@
+"""Checkpoints of organization-wide scans, allowing interrupted scans to be resumed
+
+A checkpoint file records the output of each repository as soon as the scan of that
+repository is complete. If the scan is interrupted (e.g., by a network failure or a CI
+timeout), running it again with the same checkpoint file prints the recorded output of the
+completed repositories without fetching them again, and only scans the rest.
+
+Scans can also be split into shards (see in_shard), run by separate processes or on
+separate machines, each with its own checkpoint file; merge_checkpoints then combines
+their output.
+
+A checkpoint file holds one JSON object per line: first a header describing the scan,
+then one line per completed repository, and finally a line marking the scan as complete.
+Lines are only ever appended, so a scan interrupted while writing leaves at most a
+partial last line, which is ignored (and ended, so that later lines are unaffected).
+"""
+
+import hashlib
+import json
+import os
+from ghtools.organization import repo_sort_key
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+
+# This should be incremented whenever the format of a checkpoint file changes
+# incompatibly
+_CHECKPOINT_FORMAT_VERSION = 1
+
+# ------------------------------------------------------------------------
+# Begin class definitions
+# ------------------------------------------------------------------------
+
+class ScanCheckpoint:
+    """Checkpoint file of a scan, recording the output of each completed repository
+
+    A ScanCheckpoint should only be used from one thread at a time.
+    """
+
+    def __init__(self, path, scan):
+        """Initialize a ScanCheckpoint, reading path if it exists
+
+        Raises ValueError if path is a checkpoint of a different scan.
+
+        Args:
+        path: string - path to the checkpoint file
+        scan: dict - description of the scan (e.g., the organization and options
+            affecting its output); JSON-serializable. An existing checkpoint is only
+            resumed if it was written by a scan with the same description.
+        """
+        self._path = path
+        (header, self._outputs, self._complete) = _read_checkpoint(path)
+        if header is not None and not _ends_with_newline(path):
+            # End the partial last line left by an interrupted scan
+            with open(path, "a", encoding="utf-8") as checkpoint_file:
+                checkpoint_file.write("\n")
+        if header is None:
+            self._append({"version": _CHECKPOINT_FORMAT_VERSION, "scan": scan})
+        elif header != {"version": _CHECKPOINT_FORMAT_VERSION, "scan": scan}:
+            raise ValueError("Checkpoint file {} was written by a different scan".format(
+                path))
+
+    def get_output(self, repo):
+        """Return the recorded output of a repository, or None if it hasn't been scanned"""
+        return self._outputs.get(repo)
+
+    def add(self, repo, output):
+        """Record the output of a repository whose scan is complete
+
+        Args:
+        repo: string - full name (ORG/REPO) of the repository
+        output: string - everything printed for the repository
+        """
+        self._outputs[repo] = output
+        self._append({"repo": repo, "output": output})
+
+    def mark_complete(self):
+        """Record that the whole scan is complete"""
+        if not self._complete:
+            self._complete = True
+            self._append({"complete": True})
+
+    def _append(self, record):
+        """Append a record (a dict) to the checkpoint file, and flush it to disk"""
+        with open(self._path, "a", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write(json.dumps(record) + "\n")
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+# ------------------------------------------------------------------------
+# Public functions
+# ------------------------------------------------------------------------
+
+def parse_shard(string):
+    """Convert a shard specification like '2/5' to a tuple (2, 5)
+
+    Raises ValueError if the string is not of the form I/N with 1 <= I <= N.
+    """
+    try:
+        (index, count) = (int(part) for part in string.split("/"))
+    except ValueError as error:
+        raise ValueError("Shard must be given as I/N: {}".format(string)) from error
+    if not 1 <= index <= count:
+        raise ValueError("Shard must be given as I/N with 1 <= I <= N: {}".format(string))
+    return (index, count)
+
+def in_shard(repo, shard):
+    """Return True if the given repository belongs to the given shard
+
+    Repositories are assigned to shards by a hash of their names, so the assignment
+    doesn't depend on which other repositories there are (and so doesn't change if
+    repositories are added or removed while the shards are being scanned).
+
+    Args:
+    repo: string - full name (ORG/REPO) of the repository
+    shard: tuple (index, count) - the shard, as given by parse_shard
+    """
+    (index, count) = shard
+    digest = hashlib.sha256(repo.lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index - 1
+
+def merge_checkpoints(paths):
+    """Combine the outputs recorded in the checkpoint files of several scans
+
+    This is meant for the checkpoints of the shards of a scan, whose descriptions may
+    differ only in their 'shard' entries. Returns a tuple (outputs, incomplete), where
+    outputs is a list of the output of each repository, in order of repository name (as
+    in a single scan; see organization.repo_sort_key), and incomplete is a list of the
+    paths of the checkpoints whose scans were not complete.
+
+    Raises ValueError if a file is not a checkpoint, or if the checkpoints are of
+    different scans.
+
+    Args:
+    paths: list of strings - paths to the checkpoint files
+    """
+    all_outputs = {}
+    incomplete = []
+    first_scan = None
+    for path in paths:
+        (header, outputs, complete) = _read_checkpoint(path)
+        if header is None:
+            raise ValueError("{} is not a checkpoint file".format(path))
+        scan = {key: value for key, value in header["scan"].items() if key != "shard"}
+        if first_scan is None:
+            first_scan = scan
+        elif scan != first_scan:
+            raise ValueError("{} is a checkpoint of a different scan than {}".format(
+                path, paths[0]))
+        all_outputs.update(outputs)
+        if not complete:
+            incomplete.append(path)
+    return ([all_outputs[repo] for repo in sorted(all_outputs, key=repo_sort_key)],
+            incomplete)
+
+# ------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------
+
+def _read_checkpoint(path):
+    """Read a checkpoint file
+
+    Returns a tuple (header, outputs, complete): header is the header record (a dict), or
+    None if the file doesn't exist or is empty; outputs is a dict mapping each completed
+    repository to its output; complete is True if the scan was marked as complete.
+
+    Raises ValueError if the file doesn't start with a checkpoint header.
+    """
+    header = None
+    outputs = {}
+    complete = False
+    try:
+        with open(path, encoding="utf-8") as checkpoint_file:
+            lines = checkpoint_file.readlines()
+    except FileNotFoundError:
+        return (header, outputs, complete)
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A partial line, left by a scan interrupted while writing it
+            continue
+        if header is None:
+            if "version" not in record:
+                raise ValueError("{} is not a checkpoint file".format(path))
+            header = record
+        elif "repo" in record:
+            outputs[record["repo"]] = record["output"]
+        elif record.get("complete"):
+            complete = True
+    return (header, outputs, complete)
+
+def _ends_with_newline(path):
+    """Return True if the given (non-empty) file ends with a newline"""
+    with open(path, "rb") as checkpoint_file:
+        checkpoint_file.seek(-1, os.SEEK_END)
+        return checkpoint_file.read() == b"\n"
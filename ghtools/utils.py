@@ -1,7 +1,17 @@
 """Module with miscellaneous utilities"""
 
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import sys
 import textwrap
 import re
+from ghtools.cassette import Cassette, RECORD, REPLAY
+from ghtools.github_client import PER_PAGE, MAX_PER_PAGE
+from ghtools.http_cache import default_cache_dir, DEFAULT_MAX_SIZE as CACHE_MAX_SIZE
+from ghtools.pr_snapshot import SNAPSHOT_SUBDIR, DEFAULT_MAX_SIZE as SNAPSHOT_MAX_SIZE
 
 # ------------------------------------------------------------------------
 # Regular expressions
@@ -49,3 +59,164 @@ def split_pr_url(url):
         return (None, None)
 
     return (match.group(1), int(match.group(2)))
+
+def add_cache_arguments(parser):
+    """Add command-line arguments controlling the HTTP response cache to parser
+
+    Args:
+    parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not use the on-disk cache of GitHub API responses\n'
+                        '(or the snapshots kept with it)')
+
+    parser.add_argument('--cache-dir',
+                        help='Directory for the on-disk cache of GitHub API responses.\n'
+                        'Cached responses are revalidated with GitHub on every use,\n'
+                        'so results are always up to date; but unchanged responses\n'
+                        'do not count against the GitHub API rate limit.\n'
+                        'Snapshots of fetched pull requests (and of organizations\n'
+                        'and inboxes) are also kept, in its {snapshots} subdirectory,\n'
+                        'so that later queries only fetch what has changed.\n'
+                        'The least recently used responses are removed beyond\n'
+                        '{cache_size} MB, and snapshots beyond {snapshot_size} MB; to clear\n'
+                        'both, delete this directory.\n'
+                        '(Default: {default})'.format(
+                            snapshots=SNAPSHOT_SUBDIR,
+                            cache_size=CACHE_MAX_SIZE // (1024 * 1024),
+                            snapshot_size=SNAPSHOT_MAX_SIZE // (1024 * 1024),
+                            default=default_cache_dir()))
+
+def get_cache_dir(args):
+    """Return the cache directory implied by the arguments added by add_cache_arguments
+
+    Returns None if caching is disabled. Caching is also disabled when recording or
+    replaying a cassette (see add_cassette_arguments), so that every request is recorded
+    and replays are deterministic.
+
+    Args:
+    args: argparse.Namespace
+    """
+    if args.no_cache or getattr(args, "record", None) or getattr(args, "replay", None):
+        return None
+    return args.cache_dir or default_cache_dir()
+
+def add_per_page_argument(parser):
+    """Add a command-line argument setting the page size for paginated requests to parser
+
+    Args:
+    parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--per-page', type=_per_page, default=PER_PAGE, metavar='N',
+                        help='Number of items to request per page from GitHub API\n'
+                        'endpoints that return lists (1-{}). Pages after the first\n'
+                        'are fetched concurrently. (Default: %(default)s)'.format(
+                            MAX_PER_PAGE))
+
+def add_cassette_arguments(parser):
+    """Add command-line arguments for recording and replaying cassettes to parser
+
+    Args:
+    parser: argparse.ArgumentParser
+    """
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', metavar='FILE',
+                                help='Record all GitHub API responses to this file\n'
+                                '(a cassette), for later use with --replay')
+    cassette_group.add_argument('--replay', metavar='FILE',
+                                help='Serve all GitHub API responses from this file\n'
+                                '(recorded with --record), without network access')
+
+    parser.add_argument('--replay-latency', type=float, default=0.0, metavar='SECONDS',
+                        help='With --replay, wait this long before serving each\n'
+                        'response, to simulate network latency (default: 0)')
+
+def get_cassette(args):
+    """Return the Cassette implied by the arguments added by add_cassette_arguments
+
+    Returns None if no cassette is being recorded or replayed
+
+    Args:
+    args: argparse.Namespace
+    """
+    if args.record:
+        return Cassette(args.record, RECORD)
+    if args.replay:
+        return Cassette(args.replay, REPLAY, latency=args.replay_latency)
+    return None
+
+@contextlib.contextmanager
+def make_executor(max_workers):
+    """Context manager giving a thread pool with max_workers threads
+
+    Gives None if max_workers is 1, meaning that requests should be made sequentially.
+    """
+    if max_workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield executor
+    else:
+        yield None
+
+def ordered_map(executor, func, items, max_pending):
+    """Apply func to each of items via executor, giving the results in order
+
+    Unlike executor.map, this takes items lazily from the given iterable, and submits a
+    new item only when fewer than max_pending earlier ones are waiting to be taken by the
+    caller; so a long (or endless) iterable can be processed in bounded memory. items may
+    itself be a generator that takes results from another ordered_map using the same
+    executor.
+
+    Yields tuples (item, future), in the order of items; the caller gets func's result
+    (or the exception it raised) from future.result().
+
+    Args:
+    executor: concurrent.futures.Executor
+    func: function taking one argument
+    items: iterable
+    max_pending: integer - maximum number of items submitted but not yet yielded
+    """
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, executor.submit(func, item)))
+        if len(pending) >= max_pending:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+def date_string_to_datetime(string):
+    """Convert the given string to a datetime.datetime object and return it
+
+    string should be formatted as an ISO date/time (e.g., YYYY-MM-DD)
+
+    If no timezone info is provided in the string, it is assumed to be in UTC.
+
+    If string is None, then returns None
+    """
+    if string is None:
+        return None
+    return datetime.datetime.fromisoformat(string).astimezone()
+
+def print_client_stats(client):
+    """Print statistics about the requests made by the given GitHubClient to stderr
+
+    Args:
+    client: GitHubClient
+    """
+    if client.get_cache_stats() is not None:
+        print(client.get_cache_stats(), file=sys.stderr)
+    print(client.get_rate_limit_stats(), file=sys.stderr)
+    print(client.get_pagination_stats(), file=sys.stderr)
+
+# ------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------
+
+def _per_page(string):
+    """Convert a --per-page argument to an integer, checking that it is in range"""
+    try:
+        value = int(string)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError("invalid integer: {}".format(string)) from error
+    if not 1 <= value <= MAX_PER_PAGE:
+        raise argparse.ArgumentTypeError("must be between 1 and {}".format(MAX_PER_PAGE))
+    return value
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Benchmark of extract_todos on large comment bodies
+
+This compares extract_todos, which searches the whole text for checkboxes and code
+fences, with a line-by-line scan of the same text (splitting it into lines and matching
+each one), on generated bodies of several megabytes: release notes and test logs with few
+todo items, a long checklist, and a checklist with CI logs and YAML in code blocks that
+hold lines looking like todo items.
+
+Both the time taken and the number of todo items found are shown: since the line-by-line
+scan doesn't know about code blocks, it finds too many todo items in the last body.
+"""
+
+import argparse
+import random
+import time
+from ghtools.comment_todo import extract_todos, classify_todo_line, is_line_quoted
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megabytes', type=float, default=4.0,
+                        help='Approximate size of each body in megabytes (default: 4)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to scan each body; the best time is shown '
+                        '(default: 3)')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    bodies = [
+        ("test log", _make_body(rng, args.megabytes, todo_fraction=0.0,
+                                line="PASS: test_{} ... ok (0.01 s)")),
+        ("log with [brackets]", _make_body(rng, args.megabytes, todo_fraction=0.0,
+                                           line="[INFO] step {} finished in 12 ms")),
+        ("release notes", _make_body(rng, args.megabytes, todo_fraction=0.01,
+                                     line="- Fix issue #{} in the widget parser")),
+        ("checklist", _make_body(rng, args.megabytes, todo_fraction=0.5,
+                                 line="Notes on item {}")),
+        ("checklist with code", _make_body(rng, args.megabytes, todo_fraction=0.2,
+                                           line="Notes on item {}", code_fraction=0.05)),
+    ]
+    print("extract_todos: bodies of about {:.1f} MB, best of {}".format(args.megabytes,
+                                                                       args.repeat))
+    for (name, (body, expected)) in bodies:
+        times = {}
+        found = {}
+        for func in (_extract_todos_by_line, extract_todos):
+            elapsed = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                found[func] = len(func(body))
+                elapsed.append(time.perf_counter() - start)
+            times[func] = min(elapsed)
+        assert found[extract_todos] == expected, "Wrong number of todos for " + name
+        print("  {:20s} {:6d} todos: by line {:7.4f} s ({:6d} found), whole text {:7.4f} s "
+              "({:6d} found) (speedup {:.1f}x)".format(name, expected,
+                                                      times[_extract_todos_by_line],
+                                                      found[_extract_todos_by_line],
+                                                      times[extract_todos],
+                                                      found[extract_todos],
+                                                      times[_extract_todos_by_line] /
+                                                      times[extract_todos]))
+
+def _make_body(rng, megabytes, todo_fraction, line, code_fraction=0.0):
+    """Return a tuple (body, number of todo items in it) for a body of about the given size
+
+    Args:
+    rng: random.Random
+    megabytes: float - approximate size of the body
+    todo_fraction: float - fraction of lines that are todo items
+    line: string - format string for the other lines, given the line number
+    code_fraction: float - fraction of lines that start a code block, holding lines that
+        would be todo items outside of it
+    """
+    todo_lines = ["- [ ] Check item {}", "- [x] Checked item {}", "> * [ ] Quoted item {}",
+                  "  1. [X] Numbered item {}", "-\n  [ ] Item on the next line {}"]
+    code_blocks = ["```\nstep {}: ok\n- [ ] not a todo\n```",
+                   "~~~yaml\nsteps: {}\n  - [ ] not a todo\n~~~",
+                   "> ```\n> - [x] not a todo {}\n> ```",
+                   "\nOutput:\n\n    - [ ] not a todo {}\n    - [x] not a todo\n"]
+    lines = []
+    todos = 0
+    size = 0
+    while size < megabytes * 1e6:
+        choice = rng.random()
+        if choice < code_fraction:
+            lines.append(rng.choice(code_blocks).format(len(lines)))
+        elif choice < code_fraction + todo_fraction:
+            lines.append(rng.choice(todo_lines).format(len(lines)))
+            todos += 1
+        else:
+            lines.append(line.format(len(lines)))
+        size += len(lines[-1]) + 1
+    return ("\n".join(lines), todos)
+
+def _extract_todos_by_line(text):
+    """Equivalent of extract_todos that matches each of the text's lines in turn"""
+    classified = ((classify_todo_line(line), line) for line in text.splitlines())
+    return [todo + (is_line_quoted(line),) for (todo, line) in classified
+            if todo is not None]
+
+if __name__ == '__main__':
+    main()
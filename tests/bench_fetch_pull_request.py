@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Benchmark of fetch_pull_request: sequential vs. concurrent fetching
+
+This runs against a local stand-in for the GitHub API that injects a fixed latency into
+every response, so the results reflect the number of sequential round trips rather than
+the speed of the real GitHub servers.
+"""
+
+import argparse
+import os
+import time
+from ghtools.github_fetch import fetch_pull_request
+from fake_github_server import FakeGitHubServer
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Seconds of latency injected into each response (default: 0.05)')
+    parser.add_argument('--comments', type=int, default=300,
+                        help='Number of comments of each type in the PR (default: 300)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16],
+                        help='Worker counts to benchmark (default: 1 4 8 16)')
+    args = parser.parse_args()
+
+    with FakeGitHubServer(latency=args.latency) as server:
+        server.add_pull_request("org/repo", 1,
+                                num_issue_comments=args.comments,
+                                num_line_comments=args.comments,
+                                num_reviews=args.comments)
+        os.environ["GITHUB_API_URL"] = server.base_url
+        os.environ.pop("GITHUB_TOKEN", None)
+
+        print("fetch_pull_request: {} comments of each type, {:.3f} s latency per request"
+              .format(args.comments, args.latency))
+        baseline = None
+        reference_pr = None
+        for workers in args.workers:
+            start_count = server.request_count
+            start = time.perf_counter()
+            pull_request = fetch_pull_request("org/repo", 1, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = elapsed
+                reference_pr = pull_request
+            assert pull_request == reference_pr, "Result differs from the first run"
+            print("  workers={:3d}: {:7.3f} s  ({} requests, speedup {:.1f}x)".format(
+                workers, elapsed, server.request_count - start_count, baseline / elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""Benchmark of the organization-wide todo scan (gh-org-query --todo)
+
+This runs against a local stand-in for the GitHub API that injects a fixed latency into
+every response, so the results reflect the number of sequential round trips rather than
+the speed of the real GitHub servers.
+"""
+
+import argparse
+import contextlib
+import os
+import time
+from ghtools.gh_org_query import gh_org_query
+from ghtools.github_fetch import reset_client
+from fake_github_server import FakeGitHubServer, FirstOutputRecorder
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Seconds of latency injected into each response (default: 0.02)')
+    parser.add_argument('--repos', type=int, default=100,
+                        help='Number of repositories in the organization (default: 100)')
+    parser.add_argument('--prs-per-repo', type=int, default=2,
+                        help='Number of open pull requests per repository (default: 2)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32],
+                        help='Worker counts to benchmark (default: 1 8 32)')
+    args = parser.parse_args()
+
+    with FakeGitHubServer(latency=args.latency) as server:
+        repos = server.add_organization("org", num_repos=args.repos)
+        for repo in repos:
+            for pr_number in range(1, args.prs_per_repo + 1):
+                server.add_pull_request(repo["full_name"], pr_number, num_issue_comments=5)
+        os.environ["GITHUB_API_URL"] = server.base_url
+        os.environ.pop("GITHUB_TOKEN", None)
+        reset_client()
+
+        print("gh_org_query --todo: {} repos, {} open PRs each, {:.3f} s latency per "
+              "request".format(args.repos, args.prs_per_repo, args.latency))
+        baseline = None
+        reference_output = None
+        for repo_wide in (False, True):
+            for workers in args.workers:
+                start_count = server.request_count
+                stdout_redirect = FirstOutputRecorder(server)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(stdout_redirect):
+                    gh_org_query("org", list_repos=False, todo=True, max_workers=workers,
+                                 repo_wide=repo_wide)
+                elapsed = time.perf_counter() - start
+                if baseline is None:
+                    baseline = elapsed
+                    reference_output = stdout_redirect.getvalue()
+                assert stdout_redirect.getvalue() == reference_output, \
+                    "Output differs from the first run"
+                print("  {:9s} workers={:3d}: {:7.3f} s  (first output {:6.3f} s, {} "
+                      "requests, speedup {:.1f}x)"
+                      .format("repo-wide" if repo_wide else "per-PR", workers, elapsed,
+                              stdout_redirect.first_output_time - start,
+                              server.request_count - start_count, baseline / elapsed))
+
+if __name__ == '__main__':
+    main()
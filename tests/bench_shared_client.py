@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""Benchmark of repeated small fetches: a new client per call vs. the shared client
+
+This runs against a local stand-in for the GitHub API that injects a fixed latency into
+every response, plus a further latency into every new connection (standing in for the
+TCP and TLS handshakes), so the results reflect how often connections are re-established.
+"""
+
+import argparse
+import os
+import time
+from ghtools.github_fetch import create_client, reset_client, fetch_pull_request
+from fake_github_server import FakeGitHubServer
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='Seconds of latency injected into each response (default: 0.01)')
+    parser.add_argument('--connect-latency', type=float, default=0.05,
+                        help='Seconds of latency injected into each new connection '
+                        '(default: 0.05)')
+    parser.add_argument('--calls', type=int, default=20,
+                        help='Number of pull requests to fetch (default: 20)')
+    args = parser.parse_args()
+
+    with FakeGitHubServer(latency=args.latency,
+                          connect_latency=args.connect_latency) as server:
+        for pr_number in range(1, args.calls + 1):
+            server.add_pull_request("org/repo", pr_number, num_issue_comments=5)
+        os.environ["GITHUB_API_URL"] = server.base_url
+        os.environ.pop("GITHUB_TOKEN", None)
+        reset_client()
+
+        print("fetch_pull_request: {} calls, {:.3f} s latency per request, "
+              "{:.3f} s per new connection".format(args.calls, args.latency,
+                                                   args.connect_latency))
+        baseline = None
+        for label, make_client in [("new client per call", create_client),
+                                   ("shared client", lambda: None)]:
+            start_connections = server.connection_count
+            start = time.perf_counter()
+            for pr_number in range(1, args.calls + 1):
+                client = make_client()
+                fetch_pull_request("org/repo", pr_number, client=client)
+                if client is not None:
+                    client.close()
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = elapsed
+            print("  {:20s}: {:7.3f} s  ({:.1f} ms per call, {} connections, "
+                  "speedup {:.1f}x)".format(
+                      label, elapsed, 1000 * elapsed / args.calls,
+                      server.connection_count - start_connections, baseline / elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""Stand-in for the GitHub REST API, for use in tests and benchmarks
+
+This serves canned data from a local HTTP server, paginating list endpoints the way
+GitHub does (with 'Link' headers), filtering them with the 'since' parameter, sorting
+them by 'updated_at' time with 'sort=updated', supporting
+conditional requests (with 'ETag' headers), answering searches for open pull requests
+in an organization, and optionally sleeping before each response
+(and when each new connection is accepted) to simulate network latency.
+
+Typical usage:
+
+    with FakeGitHubServer(latency=0.05) as server:
+        server.add_pull_request("org/repo", 1, num_issue_comments=250)
+        os.environ["GITHUB_API_URL"] = server.base_url
+        ...
+"""
+
+import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ghtools.github_fetch import configure_client, reset_client
+
+# GitHub's default page size
+_DEFAULT_PER_PAGE = 30
+
+# Maximum number of results that GitHub gives for a search
+_MAX_SEARCH_RESULTS = 1000
+
+class FakeGitHubServer:
+    """Local HTTP server that imitates the parts of the GitHub REST API that we use"""
+
+    def __init__(self, latency=0.0, connect_latency=0.0):
+        """Initialize a FakeGitHubServer
+
+        Args:
+        latency: float - number of seconds to sleep before sending each response
+        connect_latency: float - number of seconds to sleep when accepting each new
+            connection, standing in for the TCP and TLS handshakes
+        """
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.request_count = 0
+        self.connection_count = 0
+        self.not_modified_count = 0
+        # Whether search results are reported as incomplete (as when a search times out)
+        self.search_incomplete = False
+        self._routes = {}
+        self._rejections = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Root URL of this server, suitable for use as GITHUB_API_URL"""
+        return "http://127.0.0.1:{}".format(self._httpd.server_address[1])
+
+    def add_route(self, path, data):
+        """Serve the given data (a dict, or a list for a paginated endpoint) at path"""
+        self._routes[path] = data
+
+    def remove_route(self, path):
+        """Stop serving path, so that requests for it get '404 Not Found'"""
+        del self._routes[path]
+
+    def get_route(self, path):
+        """Return the data served at path, which tests can modify in place"""
+        return self._routes[path]
+
+    def reject_next_requests(self, count, status=403, headers=None,
+                             message="You have exceeded a secondary rate limit."):
+        """Respond to the next count requests with an error, as for a rate limit
+
+        Args:
+        count: integer - number of requests to reject
+        status: integer - HTTP status of the error responses
+        headers: dict or None - extra headers for the error responses (e.g., Retry-After)
+        message: string - error message
+        """
+        with self._lock:
+            self._rejections.extend([(status, dict(headers or {}), {"message": message})] *
+                                    count)
+
+    def add_pull_request(self, repo, pr_number,
+                         num_issue_comments=0, num_line_comments=0, num_reviews=0):
+        """Add routes for a pull request with generated comments
+
+        The pull request is also added to its repo's list of open pull requests (and
+        counted in the repo's open_issues_count, if it is in an organization added with
+        add_organization), and its comments to the repo-wide lists of conversation
+        comments and line comments.
+
+        Returns the dict of data for the PR itself
+
+        Args:
+        repo: string - in the format ORG/REPO
+        pr_number: integer
+        num_issue_comments, num_line_comments, num_reviews: integers - number of each
+            kind of comment to generate
+        """
+        pr_url = "https://github.com/{}/pull/{}".format(repo, pr_number)
+        api_url = "{}/repos/{}".format(self.base_url, repo)
+        pr_data = {"number": pr_number,
+                   "title": "PR {}".format(pr_number),
+                   "body": "PR body\n- [ ] body task",
+                   "user": {"login": "author"},
+                   "html_url": pr_url,
+                   "state": "open",
+                   "created_at": _time_string(0),
+                   "updated_at": _time_string(10000),
+                   "comments": num_issue_comments,
+                   "review_comments": num_line_comments}
+        issue_comments = [{"id": i,
+                           "body": "Comment {0}\n- [ ] task {0}".format(i),
+                           "user": {"login": "user{}".format(i % 3)},
+                           "html_url": "{}#issuecomment-{}".format(pr_url, i),
+                           "issue_url": "{}/issues/{}".format(api_url, pr_number),
+                           "created_at": _time_string(i),
+                           "updated_at": _time_string(i + 1)}
+                          for i in range(1, num_issue_comments + 1)]
+        line_comments = [{"id": i,
+                          "body": "Line comment {0}\n- [ ] line task {0}".format(i),
+                          "user": {"login": "user{}".format(i % 3)},
+                          "html_url": "{}#discussion_r{}".format(pr_url, i),
+                          "pull_request_url": "{}/pulls/{}".format(api_url, pr_number),
+                          "path": "file{}.py".format(i % 5),
+                          "created_at": _time_string(i),
+                          "updated_at": _time_string(i)}
+                         for i in range(1, num_line_comments + 1)]
+        reviews = [{"id": i,
+                    # Every other review is empty, as happens for reviews consisting only
+                    # of line comments
+                    "body": "Review {}\n- [ ] review task".format(i) if i % 2 else "",
+                    "user": {"login": "user{}".format(i % 3)},
+                    "html_url": "{}#pullrequestreview-{}".format(pr_url, i),
+                    "submitted_at": _time_string(i)}
+                   for i in range(1, num_reviews + 1)]
+
+        self.add_route("/repos/{}/pulls/{}".format(repo, pr_number), pr_data)
+        self._routes.setdefault("/repos/{}/pulls".format(repo), []).append(pr_data)
+        self._routes.setdefault("/repos/{}/issues/comments".format(repo), []).extend(
+            issue_comments)
+        self._routes.setdefault("/repos/{}/pulls/comments".format(repo), []).extend(
+            line_comments)
+        self.add_route("/repos/{}/issues/{}/comments".format(repo, pr_number), issue_comments)
+        self.add_route("/repos/{}/pulls/{}/comments".format(repo, pr_number), line_comments)
+        self.add_route("/repos/{}/pulls/{}/reviews".format(repo, pr_number), reviews)
+        for gh_repo in self._routes.get("/orgs/{}/repos".format(repo.split("/")[0]), []):
+            if gh_repo["full_name"] == repo:
+                gh_repo["open_issues_count"] += 1
+        return pr_data
+
+    def add_organization(self, org, num_repos):
+        """Add routes for an organization with generated repositories
+
+        Returns the list of repository data
+
+        Args:
+        org: string
+        num_repos: integer - number of repositories to generate
+        """
+        repos = [{"full_name": "{}/repo{:04d}".format(org, i),
+                  "archived": i % 10 == 0,
+                  "default_branch": "main",
+                  "pushed_at": _time_string(i),
+                  "updated_at": _time_string(i),
+                  "open_issues_count": i % 4}
+                 for i in range(num_repos)]
+        self.add_route("/orgs/{}/repos".format(org), repos)
+        for repo in repos:
+            for endpoint in ("pulls", "issues/comments", "pulls/comments"):
+                self._routes.setdefault("/repos/{}/{}".format(repo["full_name"], endpoint),
+                                        [])
+        return repos
+
+    def start(self):
+        """Start serving requests in a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _accept_connection(self):
+        """Called when a new connection is accepted"""
+        with self._lock:
+            self.connection_count += 1
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+
+    def _respond(self, path, query, request_headers):
+        """Return (status, headers, body) for a GET request"""
+        status, headers, data = self._respond_data(path, query)
+        body = json.dumps(data).encode("utf-8")
+        if status == 200:
+            headers["ETag"] = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            if request_headers.get("If-None-Match") == headers["ETag"]:
+                with self._lock:
+                    self.not_modified_count += 1
+                return 304, headers, b""
+        return status, headers, body
+
+    def _respond_data(self, path, query):
+        """Return (status, headers, data) for a GET request"""
+        with self._lock:
+            self.request_count += 1
+            rejection = self._rejections.pop(0) if self._rejections else None
+        if rejection is not None:
+            return rejection
+        if self.latency:
+            time.sleep(self.latency)
+
+        if path == "/search/issues":
+            search_results = self._search_pull_requests(query["q"][0])
+            status, headers, items = self._paginate(path, query,
+                                                    search_results[:_MAX_SEARCH_RESULTS])
+            return status, headers, {"total_count": len(search_results),
+                                     "incomplete_results": self.search_incomplete,
+                                     "items": items}
+        if path not in self._routes:
+            return 404, {}, {"message": "Not Found"}
+        data = self._routes[path]
+        if not isinstance(data, list):
+            return 200, {}, data
+        if query.get("sort") == ["updated"]:
+            data = sorted(data, key=lambda item: item["updated_at"],
+                          reverse=query.get("direction") != ["asc"])
+        return self._paginate(path, query, data)
+
+    def _paginate(self, path, query, data):
+        """Return (status, headers, data) for the requested page of a list"""
+
+        if "since" in query:
+            # GitHub's time strings sort in chronological order
+            data = [item for item in data if item["updated_at"] >= query["since"][0]]
+        per_page = int(query.get("per_page", [_DEFAULT_PER_PAGE])[0])
+        page = int(query.get("page", ["1"])[0])
+        last_page = max(1, -(-len(data) // per_page))
+        headers = {}
+        if last_page > 1:
+            links = []
+            if page < last_page:
+                links.append('<{}>; rel="next"'.format(
+                    self._page_url(path, query, page + 1)))
+            links.append('<{}>; rel="last"'.format(self._page_url(path, query, last_page)))
+            headers["Link"] = ", ".join(links)
+        return 200, headers, data[(page - 1) * per_page:page * per_page]
+
+    def _search_pull_requests(self, search_query):
+        """Return the list of open pull requests matching a search query
+
+        This understands the 'org:', 'is:pr', 'is:open' and 'updated:>=' qualifiers, and
+        the user qualifiers 'author:', 'reviewed-by:', 'review-requested:' (which looks at
+        the 'requested_reviewers' of a pull request) and 'involves:' (which looks at the
+        authors of the pull request and all of its comments); any other terms must all
+        appear in the body of a pull request, ignoring case.
+        """
+        org = None
+        updated_since = ""
+        user_qualifiers = []
+        terms = []
+        for term in search_query.split():
+            qualifier = term.split(":", 1)[0]
+            if qualifier == "org":
+                org = term[len("org:"):]
+            elif term.startswith("updated:>="):
+                updated_since = term[len("updated:>="):]
+            elif qualifier in ("author", "reviewed-by", "review-requested", "involves"):
+                user_qualifiers.append((qualifier, term[len(qualifier) + 1:]))
+            elif term not in ("is:pr", "is:open"):
+                terms.append(term.lower())
+        results = []
+        for path, data in sorted(self._routes.items()):
+            path_parts = path.split("/")
+            # Look for the lists of pull requests, at /repos/ORG/REPO/pulls
+            if (len(path_parts) != 5 or path_parts[1] != "repos" or
+                    path_parts[4] != "pulls" or path_parts[2] != org):
+                continue
+            repository_url = "{}/repos/{}/{}".format(self.base_url, org, path_parts[3])
+            results.extend(dict(pr_data, repository_url=repository_url)
+                           for pr_data in data
+                           if pr_data["state"] == "open" and
+                           pr_data["updated_at"] >= updated_since and
+                           all(term in pr_data["body"].lower() for term in terms) and
+                           all(username in self._pr_users(path, pr_data, qualifier)
+                               for (qualifier, username) in user_qualifiers))
+        return results
+
+    def _pr_users(self, pulls_path, pr_data, qualifier):
+        """Return the set of user names matching a user search qualifier for a PR
+
+        Args:
+        pulls_path: string - path of the list of pull requests of the PR's repo
+        pr_data: dict - data for the PR
+        qualifier: string - 'author', 'reviewed-by', 'review-requested' or 'involves'
+        """
+        pr_path = "{}/{}".format(pulls_path, pr_data["number"])
+        if qualifier == "author":
+            return {pr_data["user"]["login"]}
+        if qualifier == "review-requested":
+            return {user["login"] for user in pr_data.get("requested_reviewers", [])}
+        reviewers = {review["user"]["login"]
+                     for review in self._routes.get(pr_path + "/reviews", [])}
+        if qualifier == "reviewed-by":
+            return reviewers
+        issue_comments_path = pr_path.replace("/pulls/", "/issues/") + "/comments"
+        return ({pr_data["user"]["login"]} | reviewers |
+                {comment["user"]["login"]
+                 for path in (issue_comments_path, pr_path + "/comments")
+                 for comment in self._routes.get(path, [])})
+
+    def _page_url(self, path, query, page):
+        """Return the URL of the given page of a paginated endpoint"""
+        new_query = dict(query)
+        new_query["page"] = [str(page)]
+        return "{}{}?{}".format(self.base_url, path,
+                                urllib.parse.urlencode(new_query, doseq=True))
+
+class FakeServerTestCase(unittest.TestCase):
+    """Base class for tests that talk to a FakeGitHubServer
+
+    For the duration of each test, self._server is a running FakeGitHubServer, and the
+    fetch functions in ghtools are directed to it (via the GITHUB_API_URL environment
+    variable). The shared client is reset to its defaults before and after each test, so
+    that it talks to this test's server.
+    """
+
+    def setUp(self):
+        self._server = FakeGitHubServer()
+        self._server.start()
+        _reset_shared_client()
+        self.addCleanup(_reset_shared_client)
+        env_patcher = mock.patch.dict(os.environ, {"GITHUB_API_URL": self._server.base_url,
+                                                   "GITHUB_TOKEN": ""})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        self.addCleanup(self._server.stop)
+
+class FirstOutputRecorder(io.StringIO):
+    """Stand-in for stdout that records how far a scan had got when it first printed
+
+    This is for checking that output is streamed: first_output_request_count is the
+    given server's request_count at the first (non-empty) write, and first_output_time is
+    the time.perf_counter() value then; both are None until something is written.
+
+    To check that a scan doesn't fetch too far ahead of its output, the first write can
+    also be made to pause (as for a slow terminal); paused_request_count is then the
+    server's request_count at the end of the pause.
+    """
+
+    def __init__(self, server, pause=0.0):
+        """Initialize a FirstOutputRecorder
+
+        Args:
+        server: FakeGitHubServer
+        pause: float - number of seconds to sleep on the first write
+        """
+        super().__init__()
+        self._server = server
+        self._pause = pause
+        self.first_output_request_count = None
+        self.first_output_time = None
+        self.paused_request_count = None
+
+    def write(self, s):
+        if s and self.first_output_time is None:
+            self.first_output_request_count = self._server.request_count
+            self.first_output_time = time.perf_counter()
+            time.sleep(self._pause)
+            self.paused_request_count = self._server.request_count
+        return super().write(s)
+
+def _reset_shared_client():
+    """Discard the shared client in ghtools.github_fetch, and reset its options"""
+    configure_client()
+    reset_client()
+
+def _make_handler(server):
+    """Return a request handler class that dispatches to the given FakeGitHubServer"""
+
+    class _Handler(BaseHTTPRequestHandler):
+        """Request handler for FakeGitHubServer"""
+        protocol_version = "HTTP/1.1"
+        # Avoid delays from the interaction of Nagle's algorithm with delayed ACKs, which
+        # would otherwise swamp the injected latency
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            """Set up a newly accepted connection"""
+            super().setup()
+            server._accept_connection()  # pylint: disable=protected-access
+
+        # pylint: disable=invalid-name
+        def do_GET(self):
+            """Handle a GET request"""
+            split_url = urllib.parse.urlsplit(self.path)
+            status, headers, body = server._respond(  # pylint: disable=protected-access
+                split_url.path, urllib.parse.parse_qs(split_url.query), self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            """Silence the default logging to stderr"""
+
+    return _Handler
+
+def _time_string(offset_minutes):
+    """Return a GitHub-formatted time string, offset_minutes after a fixed start time"""
+    start = datetime.datetime(2020, 1, 1)
+    return (start + datetime.timedelta(minutes=offset_minutes)).strftime("%Y-%m-%dT%H:%M:%SZ")
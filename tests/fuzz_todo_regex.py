@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""Fuzz test of the running time of todo extraction on adversarial input
+
+This times classify_todo_line, is_line_quoted and extract_todos on generated inputs made
+of long runs of the things that todo items are made of (list and quote markers,
+whitespace, digits, brackets and checkboxes, and code fences), with and without line
+breaks between them; and fails (with a non-zero exit status) if any input takes longer
+than a given bound (a call that runs away is stopped after ten times that bound). Since
+comment bodies come from anyone who can comment on a pull request, no input should make
+these take more than time linear in its length.
+"""
+
+import argparse
+import random
+import signal
+import sys
+import time
+from ghtools.comment_todo import classify_todo_line, is_line_quoted, extract_todos
+
+# The pieces that generated inputs are made of
+_PIECES = ["- ", "* ", "+ ", "1. ", "123) ", "> ", ">", "-", "1", ".", " ", "\t", "  ",
+           "[", "]", "[ ]", "[x]", "[ ] ", "x", "text", "```", "~~~", "    "]
+
+# Repeated units known to be hard for a backtracking regex engine, along with ones made of
+# random pieces
+_UNITS = ["- ", "> ", "> - ", ">- >> + >1. ", "-  \t", "1234567. ", "- -", ">", " ",
+          "- [ ]", "-\n  [ ] x\n", "    - [ ] x\n", "para\n\n    - [ ] x\n",
+          "```\n- [ ] x\n", "> ```\n> - [ ] x\n", "- ```\n  - [ ] x\n", "\n    ```\n",
+          "- a\n\n", "-\n"]
+
+def main():
+    """Run the fuzz test, print the slowest inputs and exit with an error if any is too slow"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--length', type=int, default=100000,
+                        help='Length of each input in characters (default: 100000)')
+    parser.add_argument('--inputs', type=int, default=200,
+                        help='Number of inputs made of random pieces (default: 200)')
+    parser.add_argument('--max-seconds', type=float, default=0.25,
+                        help='Longest time allowed for any function on any input '
+                        '(default: 0.25)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for generating the inputs (default: 0)')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    units = list(_UNITS)
+    for _ in range(args.inputs):
+        units.append("".join(rng.choice(_PIECES) for _ in range(rng.randint(1, 4))))
+    results = []
+    for unit in units:
+        tail = "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 4)))
+        text = unit * (args.length // len(unit)) + tail
+        line = text.replace("\n", " ")
+        for (func, arg) in ((classify_todo_line, line), (is_line_quoted, line),
+                            (extract_todos, line), (extract_todos, text)):
+            results.append((_time(func, arg, args.max_seconds * 10), func.__name__, unit,
+                            tail))
+
+    results.sort(reverse=True)
+    print("Slowest of {} timings, on inputs of {} characters:".format(len(results),
+                                                                   args.length))
+    for (elapsed, name, unit, tail) in results[:10]:
+        print("  {:7.4f} s  {:20s} {!r} repeated, then {!r}".format(elapsed, name, unit, tail))
+    too_slow = [result for result in results if result[0] > args.max_seconds]
+    if too_slow:
+        print("FAILED: {} timings took longer than {} s".format(len(too_slow),
+                                                               args.max_seconds))
+        sys.exit(1)
+    print("OK: all timings took at most {} s".format(args.max_seconds))
+
+class _TimedOut(Exception):
+    """Raised when a timed call runs for too long"""
+
+def _time(func, arg, timeout):
+    """Return the time that func(arg) takes, as the best of a few tries
+
+    A single try is enough when it's fast; only slow calls are tried again, so that a
+    pause in the process doesn't make the fuzz test fail. A call that runs for longer
+    than timeout seconds is stopped (the regex engine checks for signals while
+    matching), and timeout is returned.
+    """
+    def _stop(signum, frame):
+        # pylint: disable=unused-argument
+        raise _TimedOut()
+
+    previous_handler = signal.signal(signal.SIGALRM, _stop)
+    elapsed = []
+    try:
+        for _ in range(3):
+            start = time.perf_counter()
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                func(arg)
+            except _TimedOut:
+                return timeout
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            elapsed.append(time.perf_counter() - start)
+            if elapsed[-1] < 0.01:
+                break
+    finally:
+        signal.signal(signal.SIGALRM, previous_handler)
+    return min(elapsed)
+
+if __name__ == '__main__':
+    main()
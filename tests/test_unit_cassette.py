@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+"""Unit tests for the cassette module
+
+Cassettes are recorded against a local stand-in for the GitHub API, so these don't need
+network access.
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import requests
+from ghtools.cassette import Cassette, CassetteMissError, RECORD, REPLAY
+from ghtools.gh_pr_query import gh_pr_query
+from ghtools.github_fetch import (create_client, reset_client, fetch_pull_request,
+                                  fetch_organization)
+from fake_github_server import FakeServerTestCase
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class TestCassette(FakeServerTestCase):
+    """Tests of recording and replaying cassettes"""
+
+    def setUp(self):
+        super().setUp()
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=40,
+                                      num_line_comments=3, num_reviews=4)
+        self._server.add_organization("org", num_repos=150)
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self._cassette_path = os.path.join(temp_dir, "cassette.json.gz")
+
+    def _record(self, func):
+        """Call func(client) with a client recording to the cassette; return its result"""
+        client = create_client(cassette=Cassette(self._cassette_path, RECORD))
+        result = func(client)
+        client.close()
+        return result
+
+    def _replay_client(self, latency=0.0, cache_dir=None):
+        """Return a client replaying the cassette"""
+        return create_client(cache_dir=cache_dir,
+                             cassette=Cassette(self._cassette_path, REPLAY, latency=latency))
+
+    def test_replay_sameAsRecorded(self):
+        """Replaying should give the same results, without any requests to the server"""
+        recorded_pr = self._record(lambda client: fetch_pull_request("org/repo", 1,
+                                                                     client=client))
+        self.assertEqual(recorded_pr, fetch_pull_request("org/repo", 1))
+        start_count = self._server.request_count
+        replayed_pr = fetch_pull_request("org/repo", 1, max_workers=4,
+                                         client=self._replay_client())
+        self.assertEqual(replayed_pr, recorded_pr)
+        self.assertEqual(self._server.request_count, start_count)
+
+    def test_replay_organization(self):
+        """Paginated organization listings should be replayed"""
+        recorded_org = self._record(lambda client: fetch_organization("org", client=client))
+        self.assertEqual(fetch_organization("org", client=self._replay_client()),
+                         recorded_org)
+
+    def test_replay_missing(self):
+        """Replaying a request that was never recorded should raise CassetteMissError"""
+        self._record(lambda client: fetch_pull_request("org/repo", 1, client=client))
+        with self.assertRaises(CassetteMissError):
+            fetch_organization("org", client=self._replay_client())
+        # This is a kind of connection error, so it is handled like one
+        self.assertTrue(issubclass(CassetteMissError, requests.exceptions.RequestException))
+
+    def test_replay_latency(self):
+        """Replaying with latency should wait that long for each response"""
+        self._record(lambda client: fetch_pull_request("org/repo", 1, client=client))
+        start = time.perf_counter()
+        fetch_pull_request("org/repo", 1, client=self._replay_client(latency=0.05))
+        # The PR, conversation comments, line comments and reviews
+        self.assertGreaterEqual(time.perf_counter() - start, 4 * 0.05)
+
+    def test_replay_conditionalRequests(self):
+        """Replays through a cache should be answered with '304 Not Modified'"""
+        self._record(lambda client: fetch_pull_request("org/repo", 1, client=client))
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        fetch_pull_request("org/repo", 1, client=self._replay_client(cache_dir=cache_dir))
+        client = self._replay_client(cache_dir=cache_dir)
+        fetch_pull_request("org/repo", 1, client=client)
+        self.assertEqual(client.get_cache_stats().hits, 4)
+
+    def test_ghPrQuery_replay(self):
+        """gh_pr_query should give the same output when replaying a recorded cassette"""
+        def run(cassette):
+            stdout_redirect = io.StringIO()
+            with contextlib.redirect_stdout(stdout_redirect):
+                gh_pr_query("org/repo", 1, show=True, todo=False, completed=False,
+                            cassette=cassette)
+            return stdout_redirect.getvalue()
+
+        recorded_output = run(Cassette(self._cassette_path, RECORD))
+        # Closing the shared client saves the cassette
+        reset_client()
+        self._server.stop()
+        self.assertEqual(run(Cassette(self._cassette_path, REPLAY)), recorded_output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,12 @@
 """Unit tests for Comment class
 """
 
+import pickle
 import unittest
+from unittest import mock
 import datetime
 from ghtools.comment_time import CommentTime
+from ghtools.comment_todo import extract_todos
 from ghtools.comment import ConversationComment, PRLineComment
 
 # Allow names that pylint doesn't like, because otherwise I find it hard
@@ -118,6 +121,61 @@ More text
         self.assertEqual(todos[1].get_full_text(), "[COMPLETED] Task 2")
         self.assertEqual(todos[2].get_full_text(), "[COMPLETED] Task 3")
 
+    def test_getAllTodos_mixed(self):
+        """Test the get_all_todos method with both incomplete and completed todos"""
+        content = """\
+- [ ] Task 1
+- [x] Task 2
+Some text
+- [ ] Task 3"""
+        c = self._create_comment(content=content)
+        todos = c.get_all_todos()
+        self.assertEqual([todo.get_full_text() for todo in todos],
+                         ["Task 1", "[COMPLETED] Task 2", "Task 3"])
+        self.assertEqual([todo for todo in todos if todo.is_completed()],
+                         c.get_todos(completed=True))
+
+    def test_getTodoProgress(self):
+        """Test the get_todo_progress method"""
+        content = """\
+- [ ] Task 1
+- [x] Task 2
+- [X] Task 3"""
+        c = self._create_comment(content=content)
+        self.assertEqual(c.get_todo_progress(), (2, 3))
+
+    def test_getTodoProgress_none(self):
+        """Test the get_todo_progress method when there are no todos"""
+        c = self._create_comment()
+        self.assertEqual(c.get_todo_progress(), (0, 0))
+
+    def test_getTodos_parsedOnce(self):
+        """The content should only be parsed once, however the todos are asked for"""
+        c = self._create_comment(content="- [ ] Task 1\n- [x] Task 2")
+        with mock.patch("ghtools.comment.extract_todos", wraps=extract_todos) as extract:
+            self.assertEqual(len(c.get_todos()), 1)
+            self.assertEqual(len(c.get_todos(completed=True)), 1)
+            self.assertEqual(len(c.get_all_todos()), 2)
+            self.assertEqual(c.get_todo_progress(), (1, 2))
+        self.assertEqual(extract.call_count, 1)
+
+    def test_pickle_keepsTodos(self):
+        """An unpickled comment should have its todos without parsing its content again"""
+        c = self._create_comment(content="- [ ] Task 1\n- [x] Task 2")
+        c2 = pickle.loads(pickle.dumps(c))
+        expected = c.get_all_todos()
+        with mock.patch("ghtools.comment.extract_todos", wraps=extract_todos) as extract:
+            self.assertEqual(c2.get_all_todos(), expected)
+        self.assertEqual(extract.call_count, 0)
+
+    def test_eq_todosExtracted(self):
+        """Comments should be equal whether or not their todos have been extracted"""
+        c = self._create_comment(content="- [ ] Task 1")
+        c2 = self._create_comment(content="- [ ] Task 1")
+        c.get_todos()
+        self.assertEqual(c, c2)
+        self.assertNotEqual(c, self._create_comment(content="- [ ] Task 2"))
+
 # Extra tests of PRLineComment class, since this class has some unique behavior
 class TestPRLineComment(unittest.TestCase):
     """Tests of PRLineComment class"""
@@ -3,10 +3,13 @@
 """Unit tests for the comment_todo module
 """
 
+import random
+import re
 import unittest
 import datetime
 from ghtools.comment_time import CommentTime
-from ghtools.comment_todo import search_line_for_todo, is_line_quoted, CommentTodo
+from ghtools.comment_todo import search_line_for_todo, classify_todo_line, extract_todos, \
+    is_line_quoted, CommentTodo
 
 # Allow names that pylint doesn't like, because otherwise I find it hard
 # to make readable unit test names
@@ -236,6 +239,172 @@ class TestIsLineQuoted(unittest.TestCase):
         result = is_line_quoted("a> - [ ] todo")
         self.assertFalse(result)
 
+class TestClassifyTodoLine(unittest.TestCase):
+    """Tests of classify_todo_line function"""
+
+    def test_classify_outstanding(self):
+        """An unchecked todo should be classified as outstanding"""
+        self.assertEqual(classify_todo_line("- [ ] todo"), ("todo", False))
+
+    def test_classify_completed(self):
+        """A checked todo should be classified as completed"""
+        self.assertEqual(classify_todo_line("> 1. [X] todo"), ("todo", True))
+
+    def test_classify_notTodo(self):
+        """A line that isn't a todo should give None"""
+        self.assertIsNone(classify_todo_line("- [y] todo"))
+
+    def test_classify_checkboxInText(self):
+        """Only the first checkbox on the line should count"""
+        self.assertEqual(classify_todo_line("- [x] [ ] todo"), ("[ ] todo", True))
+
+    def test_classify_manyMarkers(self):
+        """Lines with very many list and quote markers should be classified correctly"""
+        self.assertEqual(classify_todo_line("> - " * 10000 + "[ ] todo"), ("todo", False))
+        self.assertEqual(classify_todo_line("- " * 10000 + "-[x] todo"), ("todo", True))
+        self.assertIsNone(classify_todo_line("- > " * 10000 + "[ ] todo"))
+        self.assertIsNone(classify_todo_line(">- >> + >1. " * 10000 + "todo"))
+
+    def test_classify_sameAsSingleRegex(self):
+        """Results should be the same as matching the todo syntax with a single regex"""
+        # This is the todo syntax described in comment_todo, written as one regex (which
+        # can take much longer to match against lines with many markers)
+        uol = r"(?:[\-\+\*]|\d+[\.\)])"
+        single_regex = re.compile(r"\s*(?:" + uol + r"\s+|>\s*)*" + uol + r"\s+" + uol +
+                                  r"?\[(?P<mark>[ xX])\]\s+(?P<text>\S.+)")
+        pieces = ["- ", "-", "* ", "1. ", "12)", "> ", ">", " ", "\t", "[ ]", "[x]", "[y]",
+                  "task", "a"]
+        rng = random.Random(0)
+        for _ in range(4000):
+            line = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+            match = single_regex.match(line)
+            expected = None if match is None else (match.group("text"),
+                                                   match.group("mark") != " ")
+            self.assertEqual(classify_todo_line(line), expected, repr(line))
+
+class TestExtractTodos(unittest.TestCase):
+    """Tests of extract_todos function"""
+
+    def test_extract_mixed(self):
+        """Outstanding and completed todos should be found in order of appearance"""
+        text = """\
+Some text
+- [ ] task 1
+> - [x] quoted task 2
+- [X] task 3
+More text
+* [ ] task 4"""
+        self.assertEqual(extract_todos(text), [("task 1", False, False),
+                                               ("quoted task 2", True, True),
+                                               ("task 3", True, False),
+                                               ("task 4", False, False)])
+
+    def test_extract_none(self):
+        """Text without todos should give an empty list"""
+        self.assertEqual(extract_todos("No tasks\n- here"), [])
+
+    def test_extract_crlf(self):
+        """Lines ending in '\\r\\n' should give the same todos as lines ending in '\\n'"""
+        text = "- [ ] task 1\n> - [x] task 2\n- [ ] task 3"
+        self.assertEqual(extract_todos(text.replace("\n", "\r\n")), extract_todos(text))
+        self.assertEqual(extract_todos(text)[-1], ("task 3", False, False))
+
+    def test_extract_fencedCode(self):
+        """Todos in fenced code blocks should be ignored"""
+        text = """\
+- [ ] task 1
+```yaml
+- [ ] not a task
+```
+~~~
+- [ ] not a task
+```
+- [ ] still not a task
+~~~
+- [ ] task 2"""
+        self.assertEqual(extract_todos(text), [("task 1", False, False),
+                                               ("task 2", False, False)])
+
+    def test_extract_fencedCodeQuoted(self):
+        """Todos in fenced code blocks in quotes or list items should be ignored"""
+        text = "> ```\n> - [ ] not a task\n> ```\n- ```\n  - [ ] not a task\n  ```\n- [ ] task"
+        self.assertEqual(extract_todos(text), [("task", False, False)])
+
+    def test_extract_fencedCodeNotClosed(self):
+        """A fenced code block that isn't closed should run to the end of the text"""
+        text = "- [ ] task\n````\n- [ ] not a task\n```\n- [ ] not a task"
+        self.assertEqual(extract_todos(text), [("task", False, False)])
+
+    def test_extract_fencedCodeContainerEnds(self):
+        """A fenced code block should end when its block quote or list item ends"""
+        self.assertEqual(extract_todos("> ```\n> code\n\n- [ ] real todo"),
+                         [("real todo", False, False)])
+        self.assertEqual(extract_todos("- item\n  ```\n  code\n\n- [ ] real todo"),
+                         [("real todo", False, False)])
+
+    def test_extract_fenceInIndentedCode(self):
+        """A fence in an indented code block shouldn't start a fenced code block"""
+        self.assertEqual(extract_todos("para\n\n    ```\n- [ ] yes"), [("yes", False, False)])
+
+    def test_extract_inlineCode(self):
+        """Inline code with three backticks shouldn't start a fenced code block"""
+        self.assertEqual(extract_todos("```code```\n- [ ] task"), [("task", False, False)])
+
+    def test_extract_indentedCode(self):
+        """Todos in indented code blocks should be ignored"""
+        text = "Some text\n\n    - [ ] not a task\n\t- [x] not a task\n\n    - [ ] not a task"
+        self.assertEqual(extract_todos(text), [])
+        self.assertEqual(extract_todos("    - [ ] not a task\n- [ ] task"),
+                         [("task", False, False)])
+
+    def test_extract_indentedParagraphContinuation(self):
+        """Indented todos continuing a paragraph aren't code"""
+        self.assertEqual(extract_todos("Some text\n    - [ ] task"), [("task", False, False)])
+
+    def test_extract_indentedInList(self):
+        """Indented todos in a list aren't code, even after a blank line"""
+        text = "- item\n    - [ ] task 1\n\n    - [ ] task 2\n\n   more\n\n     - [x] task 3"
+        self.assertEqual(extract_todos(text), [("task 1", False, False),
+                                               ("task 2", False, False),
+                                               ("task 3", True, False)])
+
+    def test_extract_listItemContinued(self):
+        """A list item whose checkbox is on the next line should be a todo"""
+        text = "-\n  [ ] task 1\n>   *\n>     [x] task 2\n  1.\n     [ ] task 3\n-\n[ ] not a task"
+        self.assertEqual(extract_todos(text), [("task 1", False, False),
+                                               ("task 2", True, True),
+                                               ("task 3", False, False)])
+
+    def test_extract_codeCrlf(self):
+        """Code blocks should be recognized in text with lines ending in '\\r\\n'"""
+        text = "```\r\n- [ ] not a task\r\n```\r\n-\r\n  [ ] task\r\n"
+        self.assertEqual(extract_todos(text), [("task", False, False)])
+
+    def test_extract_sameAsLineByLine(self):
+        """Results should be the same as classifying each of text.splitlines()
+
+        (for texts where the lines before a line don't matter: ones without code blocks
+        or list items continued on the next line)
+        """
+        pieces = ["- ", "* ", "1. ", "> ", " ", "\t", "[ ]", "[x]", "[X]", "[y]", "task",
+                  "a", "\n", "\r\n", "\r", "\u2028", "\x0c"]
+        rng = random.Random(0)
+        checked = 0
+        for _ in range(4000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+            if any(line[:4].expandtabs(4).startswith("    ") or
+                   line.rstrip().endswith(("-", "*", "."))
+                   for line in text.splitlines()):
+                continue
+            checked += 1
+            expected = []
+            for line in text.splitlines():
+                todo = classify_todo_line(line)
+                if todo is not None:
+                    expected.append((todo[0], todo[1], is_line_quoted(line)))
+            self.assertEqual(extract_todos(text), expected, repr(text))
+        self.assertGreater(checked, 1000)
+
 # ------------------------------------------------------------------------
 # Tests of the CommentTodo class
 # ------------------------------------------------------------------------
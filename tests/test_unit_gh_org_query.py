@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+
+"""Unit tests for gh_org_query
+
+These run against a local stand-in for the GitHub API, so they don't need network access.
+"""
+
+import contextlib
+import io
+import shutil
+import tempfile
+import os
+import unittest
+from ghtools.gh_org_query import gh_org_query, merge_org_todos
+from fake_github_server import FakeServerTestCase, FirstOutputRecorder
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class TestGhOrgQueryTodo(FakeServerTestCase):
+    """Tests of gh_org_query with todo"""
+
+    def setUp(self):
+        super().setUp()
+        self._server.add_organization("org", num_repos=6)
+        for (repo, pr_number) in [("org/repo0004", 3), ("org/repo0001", 9),
+                                  ("org/repo0001", 2), ("org/repo0004", 1)]:
+            self._server.add_pull_request(repo, pr_number, num_issue_comments=2)
+
+    def _run_todo(self, max_workers=4, repo_wide=False, cache_dir=None, prefilter=False,
+                  prefilter_query="", updated_since=None, pushed_since=None, shard=None,
+                  checkpoint_path=None):
+        # pylint: disable=too-many-arguments
+        """Run gh_org_query with todo=True; return (num_failures, stdout, stderr)"""
+        stdout_redirect = io.StringIO()
+        stderr_redirect = io.StringIO()
+        with contextlib.redirect_stdout(stdout_redirect), \
+             contextlib.redirect_stderr(stderr_redirect):
+            num_failures = gh_org_query("org", list_repos=False, todo=True,
+                                        repo_wide=repo_wide, prefilter=prefilter,
+                                        prefilter_query=prefilter_query,
+                                        updated_since=updated_since,
+                                        pushed_since=pushed_since,
+                                        shard=shard, checkpoint_path=checkpoint_path,
+                                        max_workers=max_workers,
+                                        cache_dir=cache_dir)
+        return (num_failures, stdout_redirect.getvalue(), stderr_redirect.getvalue())
+
+    def test_todo_allOpenPrsInOrder(self):
+        """Todos of every open PR should be printed, ordered by repo and PR number"""
+        for max_workers in (1, 4):
+            with self.subTest(max_workers=max_workers):
+                (num_failures, output, _) = self._run_todo(max_workers=max_workers)
+                self.assertEqual(num_failures, 0)
+                header_positions = [
+                    output.index("<https://github.com/{}/pull/{}>:".format(repo, pr_number))
+                    for (repo, pr_number) in [("org/repo0001", 2), ("org/repo0001", 9),
+                                              ("org/repo0004", 1), ("org/repo0004", 3)]]
+                self.assertEqual(header_positions, sorted(header_positions))
+                self.assertEqual(output.count("- body task"), 4)
+                self.assertEqual(output.count("- task 2"), 4)
+
+    def _make_cache_dir(self):
+        """Return a temporary cache directory, removed at the end of the test"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        return cache_dir
+
+    def test_todo_outputStreamed(self):
+        """Only a few repos should be scanned ahead of the output"""
+        self._server.add_organization("big", num_repos=60)
+        for i in range(60):
+            self._server.add_pull_request("big/repo{:04d}".format(i), 1,
+                                          num_issue_comments=1)
+        for use_cache in (False, True):
+            with self.subTest(use_cache=use_cache):
+                start_count = self._server.request_count
+                stdout_recorder = FirstOutputRecorder(self._server, pause=0.3)
+                with contextlib.redirect_stdout(stdout_recorder):
+                    gh_org_query("big", list_repos=False, todo=True, max_workers=2,
+                                 cache_dir=self._make_cache_dir() if use_cache else None)
+                self.assertEqual(stdout_recorder.getvalue().count("- task 1"), 60)
+                # The repo list, then (with 2 workers) at most a few repos ahead of the
+                # one being printed, each needing at most 5 requests, even while output
+                # is blocked
+                self.assertLessEqual(
+                    stdout_recorder.paused_request_count - start_count, 1 + 5 * 5)
+
+    def test_todo_prsBuiltFromList(self):
+        """Without snapshots, PRs should be built from the list of open PRs"""
+        (_, expected_output, _) = self._run_todo(cache_dir=self._make_cache_dir())
+        start_count = self._server.request_count
+        (_, output, _) = self._run_todo()
+        self.assertEqual(output, expected_output)
+        # The list of repos; the list of open PRs in each of the 5 repos with open issues
+        # or PRs; and the comments, line comments and reviews of each of the 4 PRs, but
+        # not the PRs themselves
+        self.assertEqual(self._server.request_count - start_count, 1 + 5 + 4 * 3)
+
+    def test_todo_repoWideSameOutput(self):
+        """Fetching with repo-wide requests should give the same output"""
+        (_, expected_output, _) = self._run_todo()
+        for max_workers in (1, 4):
+            with self.subTest(max_workers=max_workers):
+                (num_failures, output, _) = self._run_todo(max_workers=max_workers,
+                                                           repo_wide=True)
+                self.assertEqual(num_failures, 0)
+                self.assertEqual(output, expected_output)
+
+    def test_todo_prWithoutTodosNotPrinted(self):
+        """PRs without outstanding todos should not be printed at all"""
+        self._server.get_route("/repos/org/repo0004/pulls/3")["body"] = "No tasks"
+        self._server.add_route("/repos/org/repo0004/issues/3/comments", [])
+        (_, output, _) = self._run_todo()
+        self.assertNotIn("PR #3: ", output)
+        self.assertEqual(output.count("- body task"), 3)
+
+    def test_todo_errorDoesNotAbort(self):
+        """Errors fetching a repo's PRs should not stop the scan"""
+        self._server.remove_route("/repos/org/repo0002/pulls")
+        self._server.remove_route("/repos/org/repo0004/pulls/3/reviews")
+        (num_failures, output, errors) = self._run_todo()
+        self.assertEqual(num_failures, 2)
+        self.assertIn("Error fetching pull requests in org/repo0002", errors)
+        self.assertIn("Error fetching pull requests in org/repo0004", errors)
+        self.assertEqual(output.count("- body task"), 2)
+
+    def test_todo_withSnapshots_errorDoesNotAbort(self):
+        """With snapshots, errors listing a repo's PRs or fetching a PR should not stop
+        the scan"""
+        self._server.remove_route("/repos/org/repo0002/pulls")
+        self._server.remove_route("/repos/org/repo0004/pulls/3")
+        (num_failures, output, errors) = self._run_todo(cache_dir=self._make_cache_dir())
+        self.assertEqual(num_failures, 2)
+        self.assertIn("Error listing pull requests in org/repo0002", errors)
+        self.assertIn("Error fetching org/repo0004#3", errors)
+        self.assertEqual(output.count("- body task"), 3)
+
+    def test_todo_withSnapshots_unchangedPrsNotFetched(self):
+        """With snapshots, PRs not updated since the last scan should not be fetched"""
+        cache_dir = self._make_cache_dir()
+        (_, expected_output, _) = self._run_todo(cache_dir=cache_dir)
+        start_count = self._server.request_count
+        (_, output, _) = self._run_todo(cache_dir=cache_dir)
+        self.assertEqual(output, expected_output)
+        # Only the list of repos and the list of open PRs in each of the 5 repos with
+        # open issues or PRs
+        self.assertEqual(self._server.request_count - start_count, 1 + 5)
+
+    def test_todo_reposWithoutOpenIssuesSkipped(self):
+        """Repos with no open issues or PRs should be skipped without listing their PRs"""
+        # Listing the PRs of repo0000 (which has no open issues or PRs) would now fail
+        self._server.remove_route("/repos/org/repo0000/pulls")
+        for cache_dir in (None, self._make_cache_dir()):
+            with self.subTest(cache_dir=cache_dir):
+                (num_failures, output, _) = self._run_todo(cache_dir=cache_dir)
+                self.assertEqual(num_failures, 0)
+                self.assertEqual(output.count("- body task"), 4)
+
+    def test_todo_updatedSince(self):
+        """Only todos updated since the given time should be printed"""
+        self._server.get_route("/repos/org/repo0004/pulls/3")["updated_at"] = (
+            "2099-01-01T00:00:00Z")
+        self._server.get_route("/repos/org/repo0004/issues/3/comments")[0][
+            "updated_at"] = "2099-01-01T00:00:00Z"
+        for cache_dir in (None, self._make_cache_dir()):
+            for prefilter in (False, True):
+                with self.subTest(cache_dir=cache_dir, prefilter=prefilter):
+                    (num_failures, output, _) = self._run_todo(cache_dir=cache_dir,
+                                                               prefilter=prefilter,
+                                                               updated_since="2098-01-01")
+                    self.assertEqual(num_failures, 0)
+                    self.assertEqual(output.count("PR #"), 1)
+                    self.assertIn("<https://github.com/org/repo0004/pull/3>:", output)
+                    self.assertIn("- task 1", output)
+                    self.assertNotIn("- task 2", output)
+
+    def test_todo_prefilterSameOutput(self):
+        """Finding the PRs with a search should give the same output, with fewer requests"""
+        (_, expected_output, _) = self._run_todo(cache_dir=self._make_cache_dir())
+        for max_workers in (1, 4):
+            with self.subTest(max_workers=max_workers):
+                start_count = self._server.request_count
+                (num_failures, output, _) = self._run_todo(max_workers=max_workers,
+                                                           prefilter=True)
+                self.assertEqual(num_failures, 0)
+                self.assertEqual(output, expected_output)
+                # The search, then each of the 4 PRs, its comments and its reviews (its
+                # line comments are skipped, since it has none; and no lists of repos or
+                # of each repo's PRs are fetched)
+                self.assertEqual(self._server.request_count - start_count, 1 + 4 * 3)
+
+    def test_todo_prefilterQuery(self):
+        """Only the PRs matching the prefilter query should be scanned"""
+        self._server.get_route("/repos/org/repo0004/pulls/3")["body"] = "Checklist\n- [ ] x"
+        (_, output, _) = self._run_todo(prefilter=True, prefilter_query="checklist")
+        self.assertIn("<https://github.com/org/repo0004/pull/3>:", output)
+        self.assertEqual(output.count("PR #"), 1)
+
+    def test_todo_prefilterIncompleteFallsBack(self):
+        """If the search results are incomplete, all repos should be scanned"""
+        (_, expected_output, _) = self._run_todo()
+        self._server.search_incomplete = True
+        (num_failures, output, errors) = self._run_todo(prefilter=True,
+                                                        prefilter_query="checklist")
+        self.assertEqual(num_failures, 0)
+        self.assertEqual(output, expected_output)
+        self.assertIn("Search results for org are incomplete", errors)
+
+    def test_todo_checkpointResume(self):
+        """Resuming from a checkpoint should only fetch the repos not yet complete"""
+        (_, expected_output, _) = self._run_todo()
+        for use_cache in (False, True):
+            with self.subTest(use_cache=use_cache):
+                cache_dir = self._make_cache_dir() if use_cache else None
+                checkpoint_path = os.path.join(self._make_cache_dir(), "scan.ckpt")
+                pulls_path = "/repos/org/repo0004/pulls"
+                pulls_data = self._server.get_route(pulls_path)
+                self._server.remove_route(pulls_path)
+                (num_failures, _, _) = self._run_todo(cache_dir=cache_dir,
+                                                      checkpoint_path=checkpoint_path)
+                self.assertEqual(num_failures, 1)
+                self._server.add_route(pulls_path, pulls_data)
+                start_count = self._server.request_count
+                (num_failures, output, _) = self._run_todo(cache_dir=cache_dir,
+                                                           checkpoint_path=checkpoint_path)
+                self.assertEqual(num_failures, 0)
+                self.assertEqual(output, expected_output)
+                # The list of repos, then only repo0004: its list of PRs, then each of
+                # its 2 PRs' comments, line comments and reviews
+                self.assertEqual(self._server.request_count - start_count, 1 + 1 + 2 * 3)
+
+    def test_todo_shardsMerged(self):
+        """Merging the checkpoints of all shards should give the output of a full scan"""
+        (_, expected_output, _) = self._run_todo()
+        checkpoint_dir = self._make_cache_dir()
+        checkpoint_paths = []
+        shard_outputs = []
+        for index in (1, 2, 3):
+            checkpoint_paths.append(os.path.join(checkpoint_dir, "{}.ckpt".format(index)))
+            (num_failures, output, _) = self._run_todo(shard=(index, 3),
+                                                       checkpoint_path=checkpoint_paths[-1])
+            self.assertEqual(num_failures, 0)
+            shard_outputs.append(output)
+        self.assertEqual(sorted("".join(shard_outputs)), sorted(expected_output))
+        stdout_redirect = io.StringIO()
+        with contextlib.redirect_stdout(stdout_redirect):
+            self.assertEqual(merge_org_todos(checkpoint_paths), 0)
+        self.assertEqual(stdout_redirect.getvalue(), expected_output)
+
+    def test_todo_pushedSince(self):
+        """Repositories not pushed to since the given time should not be scanned"""
+        (num_failures, output, _) = self._run_todo(pushed_since="2020-01-01T00:02+00:00")
+        self.assertEqual(num_failures, 0)
+        self.assertNotIn("org/repo0001", output)
+        self.assertIn("https://github.com/org/repo0004/pull/1", output)
+
+class TestGhOrgQueryListRepos(FakeServerTestCase):
+    """Tests of gh_org_query with list_repos"""
+
+    def setUp(self):
+        super().setUp()
+        self._server.add_organization("org", num_repos=12)
+
+    def _run_list(self, **kwargs):
+        """Run gh_org_query with list_repos=True; return the lines of its output"""
+        stdout_redirect = io.StringIO()
+        with contextlib.redirect_stdout(stdout_redirect):
+            gh_org_query("org", list_repos=True, **kwargs)
+        return stdout_redirect.getvalue().splitlines()
+
+    def test_listRepos_all(self):
+        """All repositories should be listed, in alphabetical order"""
+        self.assertEqual(self._run_list(), ["org/repo{:04d}".format(i) for i in range(12)])
+
+    def test_listRepos_filtered(self):
+        """Archived repositories and those not pushed to recently should be skippable"""
+        self.assertEqual(self._run_list(skip_archived=True,
+                                        pushed_since="2020-01-01T00:05+00:00"),
+                         ["org/repo{:04d}".format(i) for i in (5, 6, 7, 8, 9, 11)])
+
+    def test_listRepos_details(self):
+        """With repo_details, the metadata of each repository should be listed"""
+        lines = self._run_list(repo_details=True)
+        fields = [line.split("\t") for line in lines]
+        self.assertEqual([(f[0], f[2], f[3]) for f in fields[:3]],
+                         [("org/repo0000", "main", "0"), ("org/repo0001", "main", "1"),
+                          ("org/repo0002", "main", "2")])
+        self.assertEqual([f[0] for f in fields if f[-1] == "archived"],
+                         ["org/repo0000", "org/repo0010"])
+
+    def test_listRepos_indexReused(self):
+        """A recent enough repository index should be used without any requests"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        expected = self._run_list(cache_dir=cache_dir)
+        start_count = self._server.request_count
+        self.assertEqual(self._run_list(cache_dir=cache_dir, index_max_age=60), expected)
+        self.assertEqual(self._server.request_count, start_count)
+        # Without a maximum age, the index is refreshed with a conditional request
+        start_not_modified = self._server.not_modified_count
+        self.assertEqual(self._run_list(cache_dir=cache_dir), expected)
+        self.assertEqual(self._server.request_count - start_count, 1)
+        self.assertEqual(self._server.not_modified_count - start_not_modified, 1)
+
+class TestGhOrgQueryInbox(FakeServerTestCase):
+    """Tests of gh_org_query with inbox_username"""
+
+    def setUp(self):
+        super().setUp()
+        self._server.add_organization("org", num_repos=6)
+        # A PR authored by the user, one the user was asked to review, one in which the
+        # user only commented, and one not involving the user
+        self._server.add_pull_request("org/repo0001", 2, num_issue_comments=2)["user"] = {
+            "login": "me"}
+        self._server.add_pull_request("org/repo0001", 9, num_issue_comments=2)[
+            "requested_reviewers"] = [{"login": "me"}]
+        self._server.add_pull_request("org/repo0004", 1, num_issue_comments=2)
+        self._server.get_route("/repos/org/repo0004/issues/1/comments")[0].update(
+            {"user": {"login": "me"}, "body": "- [ ] my task"})
+        self._server.add_pull_request("org/repo0004", 3, num_issue_comments=2)
+
+    def _run_inbox(self, cache_dir=None):
+        """Run gh_org_query for the inbox of 'me'; return (num_failures, stdout, stderr)"""
+        stdout_redirect = io.StringIO()
+        stderr_redirect = io.StringIO()
+        with contextlib.redirect_stdout(stdout_redirect), \
+             contextlib.redirect_stderr(stderr_redirect):
+            num_failures = gh_org_query("org", list_repos=False, inbox_username="me",
+                                        max_workers=4, cache_dir=cache_dir)
+        return (num_failures, stdout_redirect.getvalue(), stderr_redirect.getvalue())
+
+    def test_inbox_todosConcerningUser(self):
+        """All todos of PRs the user authored or reviews, and the user's own todos in
+        other PRs, should be printed, in order"""
+        (num_failures, output, errors) = self._run_inbox()
+        self.assertEqual(num_failures, 0)
+        self.assertEqual(errors, "")
+        header_positions = [
+            output.index("<https://github.com/{}/pull/{}>:".format(repo, pr_number))
+            for (repo, pr_number) in [("org/repo0001", 2), ("org/repo0001", 9),
+                                      ("org/repo0004", 1)]]
+        self.assertEqual(header_positions, sorted(header_positions))
+        self.assertNotIn("<https://github.com/org/repo0004/pull/3>", output)
+        self.assertEqual(output.count("- body task"), 2)
+        self.assertEqual(output.count("- task 2"), 2)
+        self.assertEqual(output.count("- my task"), 1)
+
+    def test_inbox_unchangedPrsNotRefetched(self):
+        """With a cache, only PRs updated since the last run should be fetched again"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        (_, expected_output, _) = self._run_inbox(cache_dir=cache_dir)
+        start_count = self._server.request_count
+        (_, output, _) = self._run_inbox(cache_dir=cache_dir)
+        self.assertEqual(output, expected_output)
+        # Only the 4 searches
+        self.assertEqual(self._server.request_count - start_count, 4)
+
+        pr_data = self._server.get_route("/repos/org/repo0001/pulls/9")
+        pr_data["updated_at"] = "2099-01-01T00:00:00Z"
+        pr_data["body"] = "- [ ] new task"
+        (_, output, _) = self._run_inbox(cache_dir=cache_dir)
+        self.assertIn("- new task", output)
+        self.assertEqual(output.count("- body task"), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""Unit tests for gh_pr_query
+
+These run against a local stand-in for the GitHub API, so they don't need network access.
+"""
+
+import contextlib
+import io
+import unittest
+from ghtools.gh_pr_query import gh_pr_query_batch
+from fake_github_server import FakeServerTestCase, FirstOutputRecorder
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class TestGhPrQueryBatch(FakeServerTestCase):
+    """Tests of gh_pr_query_batch"""
+
+    def _run_batch(self, prs, max_workers=4):
+        """Run gh_pr_query_batch with todo=True; return (num_failures, stdout, stderr)"""
+        stdout_redirect = io.StringIO()
+        stderr_redirect = io.StringIO()
+        with contextlib.redirect_stdout(stdout_redirect), \
+             contextlib.redirect_stderr(stderr_redirect):
+            num_failures = gh_pr_query_batch(prs, show=False, todo=True, completed=False,
+                                             max_workers=max_workers)
+        return (num_failures, stdout_redirect.getvalue(), stderr_redirect.getvalue())
+
+    def test_batch_outputInOrderGiven(self):
+        """Output should be in the order the PRs were given, each with its header"""
+        for pr_number in range(1, 9):
+            self._server.add_pull_request("org/repo", pr_number, num_issue_comments=1)
+        prs = [("org/repo", pr_number) for pr_number in (5, 2, 8, 1, 7, 3, 6, 4)]
+        (num_failures, output, _) = self._run_batch(prs)
+        self.assertEqual(num_failures, 0)
+        header_positions = [output.index("PR #{}: ".format(pr_number))
+                            for (_, pr_number) in prs]
+        self.assertEqual(header_positions, sorted(header_positions))
+        self.assertEqual(output.count("- task 1"), 8)
+
+    def test_batch_fetchesBoundedAhead(self):
+        """While output is blocked, only a few PRs should be fetched ahead of it"""
+        for pr_number in range(1, 41):
+            self._server.add_pull_request("org/repo", pr_number, num_issue_comments=1)
+        stdout_recorder = FirstOutputRecorder(self._server, pause=0.3)
+        with contextlib.redirect_stdout(stdout_recorder):
+            gh_pr_query_batch([("org/repo", pr_number) for pr_number in range(1, 41)],
+                              show=False, todo=True, completed=False, max_workers=2)
+        self.assertEqual(stdout_recorder.getvalue().count("- task 1"), 40)
+        # Each PR takes at most 4 requests; with 2 workers, at most 4 PRs are fetched
+        # ahead of the one being printed
+        self.assertLessEqual(stdout_recorder.paused_request_count, 4 * 5)
+
+    def test_batch_errorDoesNotAbort(self):
+        """An error fetching one PR should be reported without stopping the others"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=1)
+        self._server.add_pull_request("org/repo", 3, num_issue_comments=1)
+        prs = [("org/repo", 1), ("org/repo", 2), ("org/repo", 3)]
+        (num_failures, output, errors) = self._run_batch(prs)
+        self.assertEqual(num_failures, 1)
+        self.assertIn("Error fetching org/repo#2", errors)
+        self.assertIn("404", errors)
+        self.assertIn("PR #1: ", output)
+        self.assertIn("PR #3: ", output)
+
+    def test_batch_singlePrHasNoHeader(self):
+        """With a single PR, the output should be the same as for gh_pr_query"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=1)
+        (_, output, _) = self._run_batch([("org/repo", 1)])
+        self.assertNotIn("PR #1: ", output)
+        self.assertIn("- task 1", output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,549 @@
+#!/usr/bin/env python
+
+"""Unit tests for the github_fetch module
+
+These run against a local stand-in for the GitHub API, so they don't need network access.
+"""
+
+import copy
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from ghtools.github_fetch import create_client, configure_client, get_client, \
+    fetch_pull_request, fetch_organization, fetch_open_pull_requests, list_open_pull_requests
+from ghtools.github_client import GitHubClient, RateLimitError
+from ghtools.organization import RepoInfo
+from ghtools.pr_snapshot import SnapshotStore
+from ghtools.rate_limit import RateLimiter
+from fake_github_server import FakeServerTestCase
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+_INPUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputs")
+
+def _load_input(filename):
+    """Load and return the JSON data in the given file in the inputs directory"""
+    with open(os.path.join(_INPUTS_DIR, filename), encoding="utf-8") as input_file:
+        return json.load(input_file)
+
+class _RecordedGraphQLClient:
+    """Stand-in for GitHubClient that replays recorded GraphQL responses in order"""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, responses):
+        self._responses = list(responses)
+        self.variables = []
+
+    def post_graphql(self, query, variables):
+        """Return the data of the next recorded response, saving the variables used"""
+        # pylint: disable=unused-argument
+        self.variables.append(copy.deepcopy(variables))
+        return self._responses.pop(0)["data"]
+
+class TestFetchPullRequest(FakeServerTestCase):
+    """Tests of fetch_pull_request"""
+
+    def test_fetchPullRequest_allCommentTypes(self):
+        """The PR should contain the body and every non-empty comment"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=2,
+                                      num_line_comments=3, num_reviews=4)
+        pr = fetch_pull_request("org/repo", 1)
+        # 1 body + 2 conversation comments + 3 line comments + 2 non-empty reviews
+        self.assertEqual(len(pr.get_todos()), 8)
+        content = pr.get_content()
+        self.assertIn("PR #1: 'PR 1' by author", content)
+        self.assertIn("PR line comment (file3.py)", content)
+        self.assertIn("Review 3", content)
+
+    def test_fetchPullRequest_paginated(self):
+        """All pages of a long comment list should be fetched"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=250)
+        pr = fetch_pull_request("org/repo", 1)
+        # 250 comments + the body
+        self.assertEqual(len(pr.get_todos()), 251)
+
+    def test_fetchPullRequest_concurrentSameAsSequential(self):
+        """Fetching concurrently should give the same result as fetching sequentially"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=250,
+                                      num_line_comments=120, num_reviews=205)
+        pr_sequential = fetch_pull_request("org/repo", 1, max_workers=1)
+        pr_concurrent = fetch_pull_request("org/repo", 1, max_workers=8)
+        self.assertEqual(pr_concurrent, pr_sequential)
+
+    def test_fetchPullRequest_skipsEmptyStreams(self):
+        """Sequential fetches should skip endpoints that the PR's counts show are empty"""
+        self._server.add_pull_request("org/repo", 1, num_reviews=3)
+        client = create_client()
+        self.addCleanup(client.close)
+        start_count = self._server.request_count
+        pr = fetch_pull_request("org/repo", 1, client=client)
+        # The PR and its reviews
+        self.assertEqual(self._server.request_count - start_count, 2)
+        self.assertEqual(client.get_pagination_stats().requests_saved, 2)
+        self.assertEqual(pr, fetch_pull_request("org/repo", 1, max_workers=4))
+
+    def test_fetchPullRequest_concurrentDoesNotWaitForPr(self):
+        """Concurrent fetches should request the streams along with the PR, without
+        waiting for its counts"""
+        self._server.add_pull_request("org/repo", 1, num_reviews=3)
+        client = create_client()
+        self.addCleanup(client.close)
+        start_count = self._server.request_count
+        fetch_pull_request("org/repo", 1, max_workers=4, client=client)
+        # The PR and the first page of each of its 3 streams, empty or not
+        self.assertEqual(self._server.request_count - start_count, 4)
+        self.assertEqual(client.get_pagination_stats().requests_saved, 0)
+
+    def test_fetchPullRequest_concurrentSnapshotSkipsEmptyStreams(self):
+        """Concurrent snapshot updates should skip endpoints that the PR's counts show
+        are empty"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=3)
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        snapshots = SnapshotStore(snapshot_dir)
+        fetch_pull_request("org/repo", 1, max_workers=4, snapshots=snapshots)
+        client = create_client()
+        self.addCleanup(client.close)
+        start_count = self._server.request_count
+        pr = fetch_pull_request("org/repo", 1, max_workers=4, client=client,
+                                snapshots=snapshots)
+        # The PR, then the conversation comments updated since the snapshot (but not the
+        # line comments, since there are none)
+        self.assertEqual(self._server.request_count - start_count, 2)
+        self.assertEqual(client.get_pagination_stats().requests_saved, 1)
+        self.assertEqual(pr, fetch_pull_request("org/repo", 1))
+
+    def test_fetchPullRequest_concurrentAllPages(self):
+        """Concurrent fetches should get all pages of the PR's endpoints"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=250,
+                                      num_line_comments=120, num_reviews=3)
+        expected = fetch_pull_request("org/repo", 1)
+        client = create_client(per_page=50)
+        self.addCleanup(client.close)
+        start_count = self._server.request_count
+        pr = fetch_pull_request("org/repo", 1, max_workers=4, client=client)
+        # The PR; then 5 pages of conversation comments, 3 of line comments and 1 of
+        # reviews
+        self.assertEqual(self._server.request_count - start_count, 1 + 5 + 3 + 1)
+        self.assertEqual(pr, expected)
+
+    def test_fetchPullRequest_countsPlanPages(self):
+        """With known counts, all pages should be fetched, even if the counts are wrong"""
+        pr_data = self._server.add_pull_request("org/repo", 1, num_issue_comments=250,
+                                                num_line_comments=120)
+        expected = fetch_pull_request("org/repo", 1, max_workers=4)
+        client = create_client(per_page=50)
+        self.addCleanup(client.close)
+        for (comments, review_comments) in [(250, 120), (30, 120), (250, 400)]:
+            with self.subTest(comments=comments, review_comments=review_comments):
+                pr_data["comments"] = comments
+                pr_data["review_comments"] = review_comments
+                self.assertEqual(fetch_pull_request("org/repo", 1, client=client), expected)
+
+    def test_fetchPullRequest_cached(self):
+        """A second fetch through the cache should be served entirely by 304 responses"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=150,
+                                      num_line_comments=3, num_reviews=4)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        pr_uncached = fetch_pull_request("org/repo", 1)
+        pr_first = fetch_pull_request("org/repo", 1, client=create_client(cache_dir=cache_dir))
+        # Use a new client, as would happen in a new run of a tool
+        client = create_client(cache_dir=cache_dir)
+        pr_second = fetch_pull_request("org/repo", 1, client=client)
+
+        self.assertEqual(pr_first, pr_uncached)
+        self.assertEqual(pr_second, pr_uncached)
+        # The PR, 2 pages of issue comments, 1 page each of line comments and reviews
+        self.assertEqual(client.get_cache_stats().hits, 5)
+        self.assertEqual(client.get_cache_stats().misses, 0)
+        self.assertEqual(self._server.not_modified_count, 5)
+
+class TestFetchPullRequestRateLimits(FakeServerTestCase):
+    """Tests of fetch_pull_request when GitHub's rate limits are hit"""
+
+    def setUp(self):
+        super().setUp()
+        self._sleeps = []
+
+    def _make_client(self, **rate_limiter_args):
+        """Return a client whose rate limiter doesn't really sleep, recording the waits"""
+        return GitHubClient(base_url=self._server.base_url,
+                            rate_limiter=RateLimiter(sleep=self._sleeps.append,
+                                                     **rate_limiter_args))
+
+    def test_fetchPullRequest_retriesSecondaryRateLimit(self):
+        """Requests rejected by a secondary rate limit should be retried"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=3)
+        self._server.reject_next_requests(2, headers={"Retry-After": "5"})
+        client = self._make_client()
+        pr = fetch_pull_request("org/repo", 1, client=client)
+        self.assertEqual(pr, fetch_pull_request("org/repo", 1))
+        self.assertEqual(client.get_rate_limit_stats().retries, 2)
+        self.assertGreaterEqual(self._sleeps[0], 5)
+
+    def test_fetchPullRequest_rateLimitErrorAfterRetries(self):
+        """If requests are still rate-limited after all retries, RateLimitError is raised"""
+        self._server.add_pull_request("org/repo", 1)
+        self._server.reject_next_requests(10, status=429)
+        with self.assertRaises(RateLimitError):
+            fetch_pull_request("org/repo", 1, client=self._make_client(max_retries=2))
+
+class TestFetchPullRequestSnapshots(FakeServerTestCase):
+    """Tests of fetch_pull_request with snapshots"""
+
+    # A time later than any in the generated PRs
+    _LATER = "2021-01-01T00:00:00Z"
+
+    def setUp(self):
+        super().setUp()
+        self._pr_data = self._server.add_pull_request("org/repo", 1, num_issue_comments=40,
+                                                      num_line_comments=5, num_reviews=4)
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        self._snapshots = SnapshotStore(snapshot_dir)
+        fetch_pull_request("org/repo", 1, snapshots=self._snapshots)
+
+    def _assert_sync_same_as_full_fetch(self):
+        """Assert that fetching with the snapshot gives the same PR as a full fetch"""
+        pr_synced = fetch_pull_request("org/repo", 1, snapshots=self._snapshots)
+        self.assertEqual(pr_synced, fetch_pull_request("org/repo", 1))
+
+    def test_snapshot_unchanged(self):
+        """With no changes, only the PR and the (empty) comment deltas should be fetched"""
+        start_count = self._server.request_count
+        pr_synced = fetch_pull_request("org/repo", 1, snapshots=self._snapshots)
+        self.assertEqual(self._server.request_count - start_count, 3)
+        self.assertEqual(pr_synced, fetch_pull_request("org/repo", 1))
+
+    def test_snapshot_addedAndEditedComments(self):
+        """Added and edited comments should be merged into the snapshot"""
+        issue_comments = self._server.get_route("/repos/org/repo/issues/1/comments")
+        issue_comments[1] = dict(issue_comments[1], body="- [ ] edited task",
+                                 updated_at=self._LATER)
+        issue_comments.append(dict(issue_comments[0], id=100, body="- [ ] new task",
+                                   created_at=self._LATER, updated_at=self._LATER))
+        self._pr_data.update(comments=41, updated_at=self._LATER)
+        self._assert_sync_same_as_full_fetch()
+        todos = [todo.get_full_text()
+                 for todo in fetch_pull_request("org/repo", 1,
+                                                snapshots=self._snapshots).get_todos()]
+        self.assertIn("edited task", todos)
+        self.assertIn("new task", todos)
+        self.assertNotIn("task 2", todos)
+
+    def test_snapshot_deletedComment(self):
+        """Deleted comments should be removed from the snapshot"""
+        line_comments = self._server.get_route("/repos/org/repo/pulls/1/comments")
+        del line_comments[2]
+        self._pr_data.update(review_comments=4, updated_at=self._LATER)
+        self._assert_sync_same_as_full_fetch()
+
+    def test_snapshot_newReview(self):
+        """Reviews should be refetched when the PR's updated time changes"""
+        reviews = self._server.get_route("/repos/org/repo/pulls/1/reviews")
+        reviews.append(dict(reviews[0], id=100, body="- [ ] new review task"))
+        self._pr_data.update(updated_at=self._LATER)
+        self._assert_sync_same_as_full_fetch()
+
+    def test_snapshot_prUpdatedAtUnchanged(self):
+        """Given an unchanged updated time, the PR should be rebuilt with no requests"""
+        start_count = self._server.request_count
+        pr_synced = fetch_pull_request("org/repo", 1, snapshots=self._snapshots,
+                                       pr_updated_at=self._pr_data["updated_at"])
+        self.assertEqual(self._server.request_count, start_count)
+        self.assertEqual(pr_synced, fetch_pull_request("org/repo", 1))
+
+    def test_snapshot_prUpdatedAtChanged(self):
+        """Given a changed updated time, the snapshot should be brought up to date"""
+        reviews = self._server.get_route("/repos/org/repo/pulls/1/reviews")
+        reviews.append(dict(reviews[0], id=100, body="- [ ] new review task"))
+        self._pr_data.update(updated_at=self._LATER)
+        pr_synced = fetch_pull_request("org/repo", 1, snapshots=self._snapshots,
+                                       pr_updated_at=self._LATER)
+        self.assertEqual(pr_synced, fetch_pull_request("org/repo", 1))
+
+    def test_snapshot_graphqlNotSupported(self):
+        """Snapshots cannot be used with the GraphQL backend"""
+        with self.assertRaises(ValueError):
+            fetch_pull_request("org/repo", 1, backend="graphql", snapshots=self._snapshots)
+
+class TestFetchPullRequestTimeBounds(FakeServerTestCase):
+    """Tests of fetch_pull_request with created_since_time and updated_since_time"""
+
+    def setUp(self):
+        super().setUp()
+        # Comments and reviews number i are created i minutes after the start of 2020
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=500,
+                                      num_line_comments=300, num_reviews=450)
+        self._full_pr = fetch_pull_request("org/repo", 1)
+
+    @staticmethod
+    def _minute(offset):
+        """Return the time offset minutes after the start of 2020, in local time"""
+        return (datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc) +
+                datetime.timedelta(minutes=offset)).astimezone()
+
+    def _assert_same_as_full_fetch(self, pr, **bounds):
+        """Assert that pr gives the same results as a full fetch, with the given bounds"""
+        self.assertEqual(pr.get_todos(**bounds), self._full_pr.get_todos(**bounds))
+        self.assertEqual(pr.get_content(**bounds), self._full_pr.get_content(**bounds))
+
+    def test_timeBounds_sameAsFullFetch(self):
+        """Results within the bounds should be the same as with a full fetch"""
+        for bounds in [{"created_since_time": self._minute(400)},
+                       {"updated_since_time": self._minute(250)},
+                       {"created_since_time": self._minute(100),
+                        "updated_since_time": self._minute(350)}]:
+            for max_workers in (1, 4):
+                with self.subTest(bounds=bounds, max_workers=max_workers):
+                    pr = fetch_pull_request("org/repo", 1, max_workers=max_workers,
+                                            **bounds)
+                    self._assert_same_as_full_fetch(pr, **bounds)
+
+    def test_createdSince_fewerRequests(self):
+        """Only recent comments (but all reviews) should be fetched"""
+        start_count = self._server.request_count
+        fetch_pull_request("org/repo", 1, created_since_time=self._minute(400))
+        # The PR; 2 pages of conversation comments updated since minute 399 and 1 (empty)
+        # page of line comments; and all 5 pages of reviews (rather than 1 + 5 + 3 + 5 =
+        # 14 requests)
+        self.assertEqual(self._server.request_count - start_count, 1 + 2 + 1 + 5)
+
+    def test_createdSince_reviewSubmittedLate(self):
+        """A review submitted after the bound should be found wherever it is listed, even
+        though reviews listed after it were submitted before it"""
+        reviews = self._server.get_route("/repos/org/repo/pulls/1/reviews")
+        # Review 1 is on the first of five pages
+        reviews[0]["submitted_at"] = self._server_time(420)
+        self._full_pr = fetch_pull_request("org/repo", 1)
+        pr = fetch_pull_request("org/repo", 1, created_since_time=self._minute(400))
+        self.assertIn("Review 1\n", pr.get_content(created_since_time=self._minute(400)))
+        self._assert_same_as_full_fetch(pr, created_since_time=self._minute(400))
+
+    def test_createdSince_pendingReview(self):
+        """A pending review, which has no submitted time, should not break the fetch"""
+        reviews = self._server.get_route("/repos/org/repo/pulls/1/reviews")
+        reviews[300]["submitted_at"] = None
+        self._full_pr = fetch_pull_request("org/repo", 1)
+        self.assertNotIn("Review 301", self._full_pr.get_content())
+        pr = fetch_pull_request("org/repo", 1, created_since_time=self._minute(400))
+        self._assert_same_as_full_fetch(pr, created_since_time=self._minute(400))
+
+    @staticmethod
+    def _server_time(offset):
+        """Return the GitHub-formatted time offset minutes after the start of 2020"""
+        return (datetime.datetime(2020, 1, 1) +
+                datetime.timedelta(minutes=offset)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def test_timeBounds_noSnapshotCreated(self):
+        """With no existing snapshot, a bounded fetch should not create one"""
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        snapshots = SnapshotStore(snapshot_dir)
+        pr = fetch_pull_request("org/repo", 1, snapshots=snapshots,
+                                created_since_time=self._minute(400))
+        self._assert_same_as_full_fetch(pr, created_since_time=self._minute(400))
+        self.assertEqual(os.listdir(snapshot_dir), [])
+
+class TestFetchOpenPullRequests(FakeServerTestCase):
+    """Tests of fetch_open_pull_requests and list_open_pull_requests"""
+
+    def setUp(self):
+        super().setUp()
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=40,
+                                      num_line_comments=3, num_reviews=4)
+        self._server.add_pull_request("org/repo", 2)
+        self._server.add_pull_request("org/repo", 5, num_issue_comments=7,
+                                      num_line_comments=60, num_reviews=1)
+        self._server.add_pull_request("org/repo", 6, num_issue_comments=9)
+
+    def test_fetchOpenPullRequests_sameAsPerPr(self):
+        """All open PRs should be the same as those from fetch_pull_request"""
+        expected = [fetch_pull_request("org/repo", pr_number) for pr_number in (1, 2, 5, 6)]
+        for repo_wide in (False, True):
+            for max_workers in (1, 4):
+                with self.subTest(repo_wide=repo_wide, max_workers=max_workers):
+                    self.assertEqual(fetch_open_pull_requests("org/repo",
+                                                              max_workers=max_workers,
+                                                              repo_wide=repo_wide),
+                                     expected)
+
+    def test_fetchOpenPullRequests_requestCount(self):
+        """The PRs themselves should not be fetched individually"""
+        start_count = self._server.request_count
+        fetch_open_pull_requests("org/repo")
+        # The list of PRs, then each PR's conversation comments, line comments and reviews
+        self.assertEqual(self._server.request_count - start_count, 1 + 4 * 3)
+        start_count = self._server.request_count
+        fetch_open_pull_requests("org/repo", repo_wide=True)
+        # The list of PRs, the repo's conversation comments and line comments, and each
+        # PR's reviews
+        self.assertEqual(self._server.request_count - start_count, 1 + 2 + 4)
+
+    def test_listOpenPullRequests_updatedSince(self):
+        """Only PRs updated since the cutoff should be listed, stopping paging there"""
+        for pr_number in range(10, 20):
+            self._server.add_pull_request("org/repo", pr_number)["updated_at"] = (
+                "2022-01-{:02d}T00:00:00Z".format(pr_number))
+        client = create_client(per_page=2)
+        self.addCleanup(client.close)
+        cutoff = datetime.datetime(2022, 1, 17, tzinfo=datetime.timezone.utc)
+        start_count = self._server.request_count
+        self.assertEqual(list_open_pull_requests("org/repo", client=client,
+                                                 updated_since_time=cutoff),
+                         [(pr_number, "2022-01-{:02d}T00:00:00Z".format(pr_number))
+                          for pr_number in (17, 18, 19)])
+        # PRs 19 and 18, then 17 and 16 (which is older than the cutoff), but none of the
+        # 6 further pages
+        self.assertEqual(self._server.request_count - start_count, 2)
+
+    def test_fetchOpenPullRequests_updatedSince(self):
+        """Only PRs updated since the cutoff should be fetched"""
+        self._server.get_route("/repos/org/repo/pulls/5")["updated_at"] = (
+            "2099-01-01T00:00:00Z")
+        cutoff = datetime.datetime(2098, 1, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(fetch_open_pull_requests("org/repo", updated_since_time=cutoff),
+                         [fetch_pull_request("org/repo", 5)])
+
+class TestFetchPullRequestGraphQL(FakeServerTestCase):
+    """Tests of fetch_pull_request with the GraphQL backend"""
+
+    def test_graphql_sameAsRest(self):
+        """The GraphQL backend should give the same PullRequest as the REST backend"""
+        for path, data in _load_input("rest_github_tools_pr1.json").items():
+            self._server.add_route(path, data)
+        graphql_client = _RecordedGraphQLClient(_load_input("graphql_github_tools_pr1.json"))
+
+        pr_rest = fetch_pull_request("ESMCI/github-tools", 1)
+        pr_graphql = fetch_pull_request("ESMCI/github-tools", 1,
+                                        client=graphql_client, backend="graphql")
+        self.assertEqual(pr_graphql, pr_rest)
+        self.assertEqual(len(pr_graphql.get_todos()), 6)
+
+    def test_graphql_paginates(self):
+        """Further pages should only be requested for connections that have them"""
+        graphql_client = _RecordedGraphQLClient(_load_input("graphql_github_tools_pr1.json"))
+        fetch_pull_request("ESMCI/github-tools", 1, client=graphql_client, backend="graphql")
+        self.assertEqual(len(graphql_client.variables), 2)
+        self.assertIsNone(graphql_client.variables[0]["commentsCursor"])
+        self.assertEqual(graphql_client.variables[1]["commentsCursor"],
+                         "Y3Vyc29yOnYyOpHOJNtgRw==")
+        self.assertTrue(graphql_client.variables[1]["withComments"])
+        self.assertFalse(graphql_client.variables[1]["withReviews"])
+
+    def test_graphql_reviewWithManyLineComments(self):
+        """Further line comments of a review should be fetched with a separate query"""
+        responses = _load_input("graphql_github_tools_pr1.json")
+        pr_node = responses[0]["data"]["repository"]["pullRequest"]
+        review_comments = pr_node["reviews"]["nodes"][0]["comments"]
+        line_comment = review_comments["nodes"][0]
+        extra_line_comment = dict(line_comment, databaseId=line_comment["databaseId"] + 1,
+                                  body="- [ ] extra line task")
+        review_comments["pageInfo"] = {"hasNextPage": True, "endCursor": "abc"}
+        # The query for more line comments is made while processing the first response
+        responses.insert(1, {"data": {"node": {"comments": {
+            "pageInfo": {"hasNextPage": False, "endCursor": "def"},
+            "nodes": [extra_line_comment]}}}})
+        graphql_client = _RecordedGraphQLClient(responses)
+
+        pr = fetch_pull_request("ESMCI/github-tools", 1, client=graphql_client,
+                                backend="graphql")
+        self.assertEqual(graphql_client.variables[1],
+                         {"id": pr_node["reviews"]["nodes"][0]["id"], "cursor": "abc"})
+        self.assertIn("{README.md} extra line task",
+                      [todo.get_full_text() for todo in pr.get_todos()])
+
+class TestFetchOrganization(FakeServerTestCase):
+    """Tests of fetch_organization"""
+
+    def test_fetchOrganization_repoNames(self):
+        """All repositories should be listed, in alphabetical order"""
+        repos = self._server.add_organization("org", num_repos=150)
+        org = fetch_organization("org")
+        self.assertEqual(org.get_name(), "org")
+        self.assertEqual(org.get_repo_names(), sorted(repo["full_name"] for repo in repos))
+
+    def test_fetchOrganization_mixedCaseOrder(self):
+        """Repositories should be in alphabetical order regardless of case"""
+        repos = self._server.add_organization("org", num_repos=3)
+        for (repo, name) in zip(repos, ["org/ccs_config", "org/CIME", "org/cdeps"]):
+            repo["full_name"] = name
+        self.assertEqual(fetch_organization("org").get_repo_names(),
+                         ["org/ccs_config", "org/cdeps", "org/CIME"])
+
+    def test_fetchOrganization_repoMetadata(self):
+        """The metadata of each repository should be kept"""
+        self._server.add_organization("org", num_repos=12)
+        repo = fetch_organization("org").get_repos()[10]
+        self.assertEqual(repo, RepoInfo(
+            full_name="org/repo0010",
+            pushed_at=datetime.datetime(2020, 1, 1, 0, 10,
+                                        tzinfo=datetime.timezone.utc).astimezone(),
+            archived=True,
+            default_branch="main",
+            open_issues_count=2))
+
+    def test_fetchOrganization_concurrentSmallPages(self):
+        """Fetching small pages concurrently should keep the repositories in order"""
+        repos = self._server.add_organization("org", num_repos=150)
+        client = create_client(per_page=7)
+        self.addCleanup(client.close)
+        start_count = self._server.request_count
+        org = fetch_organization("org", max_workers=8, client=client)
+        self.assertEqual(org.get_repo_names(), sorted(repo["full_name"] for repo in repos))
+        self.assertEqual(self._server.request_count - start_count, 22)
+
+    def test_createClient_perPageOutOfRange(self):
+        """A page size beyond GitHub's maximum should be rejected"""
+        with self.assertRaises(ValueError):
+            create_client(per_page=101)
+
+class TestSharedClient(FakeServerTestCase):
+    """Tests of the shared client returned by get_client"""
+
+    def test_getClient_sameInstance(self):
+        """Repeated calls to get_client should return the same client"""
+        self.assertIs(get_client(), get_client())
+
+    def test_getClient_sameInstanceAcrossThreads(self):
+        """Concurrent first calls to get_client should all get the same client"""
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(get_client()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(clients), 8)
+        self.assertTrue(all(client is clients[0] for client in clients))
+
+    def test_configureClient_newOptionsReplaceClient(self):
+        """Changing the options should give a new client; keeping them should not"""
+        configure_client(max_connections_per_host=4)
+        client = get_client()
+        configure_client(max_connections_per_host=4)
+        self.assertIs(get_client(), client)
+        configure_client(max_connections_per_host=8)
+        self.assertIsNot(get_client(), client)
+
+    def test_fetch_reusesConnections(self):
+        """Sequential fetches should all go over a single connection"""
+        self._server.add_pull_request("org/repo", 1, num_issue_comments=3)
+        self._server.add_pull_request("org/repo", 2, num_issue_comments=3)
+        fetch_pull_request("org/repo", 1)
+        fetch_pull_request("org/repo", 2)
+        # For each PR: the PR, its conversation comments and its reviews (it has no line
+        # comments, so those aren't requested)
+        self.assertEqual(self._server.request_count, 6)
+        self.assertEqual(self._server.connection_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
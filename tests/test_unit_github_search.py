@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Unit tests for the github_search module
+
+These run against a local stand-in for the GitHub API, so they don't need network access.
+"""
+
+import unittest
+from ghtools.github_fetch import create_client
+from ghtools.github_search import search_open_pull_requests, search_user_pull_requests
+from fake_github_server import FakeServerTestCase
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class TestSearchOpenPullRequests(FakeServerTestCase):
+    """Tests of search_open_pull_requests"""
+
+    def test_search_allOpenPrsSorted(self):
+        """All open PRs in the org should be found, sorted by repo and number"""
+        self._server.add_organization("org", num_repos=3)
+        client = create_client(per_page=2)
+        self.addCleanup(client.close)
+        expected = []
+        for repo in ("org/repo0002", "org/repo0000"):
+            for pr_number in (7, 3):
+                self._server.add_pull_request(repo, pr_number)
+                expected.append((repo, pr_number))
+        self._server.add_pull_request("other/repo", 1)
+        self._server.get_route("/repos/org/repo0002/pulls/7")["state"] = "closed"
+        expected.remove(("org/repo0002", 7))
+        for max_workers in (1, 4):
+            with self.subTest(max_workers=max_workers):
+                start_count = self._server.request_count
+                self.assertEqual(search_open_pull_requests("org", max_workers=max_workers,
+                                                           client=client),
+                                 (sorted(expected), True))
+                self.assertEqual(self._server.request_count - start_count, 2)
+
+    def test_search_mixedCaseRepoOrder(self):
+        """PRs should be sorted by repo regardless of case, as in an organization"""
+        for repo in ("org/CIME", "org/ccs_config", "org/cdeps"):
+            self._server.add_pull_request(repo, 1)
+        self.assertEqual(search_open_pull_requests("org"),
+                         ([("org/ccs_config", 1), ("org/cdeps", 1), ("org/CIME", 1)], True))
+
+    def test_search_extraQuery(self):
+        """Only PRs matching the extra search terms should be found"""
+        self._server.add_pull_request("org/repo", 1)
+        self._server.add_pull_request("org/repo", 2)["body"] = "Checklist\n- [ ] task"
+        self.assertEqual(search_open_pull_requests("org", extra_query="checklist"),
+                         ([("org/repo", 2)], True))
+
+    def test_search_incompleteResults(self):
+        """Incomplete or truncated search results should be reported as such"""
+        self._server.add_pull_request("org/repo", 1)
+        self._server.search_incomplete = True
+        self.assertEqual(search_open_pull_requests("org"), ([("org/repo", 1)], False))
+        self._server.search_incomplete = False
+        for pr_number in range(2, 1002):
+            self._server.add_pull_request("org/repo", pr_number)
+        start_count = self._server.request_count
+        (prs, complete) = search_open_pull_requests("org", max_workers=4)
+        self.assertFalse(complete)
+        self.assertEqual(len(prs), 1000)
+        self.assertEqual(self._server.request_count - start_count, 10)
+
+    def test_search_stopIfTruncated(self):
+        """With stop_if_truncated, only the first page of truncated results is fetched"""
+        for pr_number in range(1, 1002):
+            self._server.add_pull_request("org/repo", pr_number)
+        start_count = self._server.request_count
+        (prs, complete) = search_open_pull_requests("org", max_workers=4,
+                                                    stop_if_truncated=True)
+        self.assertFalse(complete)
+        self.assertEqual(len(prs), 100)
+        self.assertEqual(self._server.request_count - start_count, 1)
+
+    def test_searchUser_ownTodosOnly(self):
+        """Only PRs in which the user is merely involved should be marked own_todos_only"""
+        self._server.add_pull_request("org/repo", 1)["user"] = {"login": "me"}
+        self._server.add_pull_request("org/repo", 2, num_reviews=1)
+        self._server.get_route("/repos/org/repo/pulls/2/reviews")[0]["user"] = {
+            "login": "me"}
+        self._server.add_pull_request("org/repo", 3, num_issue_comments=1)
+        self._server.get_route("/repos/org/repo/issues/3/comments")[0]["user"] = {
+            "login": "me"}
+        self._server.add_pull_request("org/repo", 4, num_issue_comments=1)
+        (prs, complete) = search_user_pull_requests("org", "me")
+        self.assertTrue(complete)
+        self.assertEqual([(repo, pr_number, own_todos_only)
+                          for (repo, pr_number, _, own_todos_only) in prs],
+                         [("org/repo", 1, False), ("org/repo", 2, False),
+                          ("org/repo", 3, True)])
+
+    def test_searchUser_mixedCaseRepoOrder(self):
+        """PRs should be sorted by repo regardless of case, as in an organization"""
+        for repo in ("org/CIME", "org/ccs_config"):
+            self._server.add_pull_request(repo, 1)["user"] = {"login": "me"}
+        (prs, _) = search_user_pull_requests("org", "me")
+        self.assertEqual([repo for (repo, _, _, _) in prs], ["org/ccs_config", "org/CIME"])
+
+if __name__ == '__main__':
+    unittest.main()
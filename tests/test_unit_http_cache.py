@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Unit tests for the http_cache module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from ghtools.http_cache import ResponseCache
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class TestResponseCache(unittest.TestCase):
+    """Tests of ResponseCache class"""
+
+    def setUp(self):
+        self._cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._cache_dir)
+
+    def test_get_missing(self):
+        """Getting a key that was never stored should return None"""
+        cache = ResponseCache(self._cache_dir)
+        self.assertIsNone(cache.get(cache.make_key("https://api.github.com/foo")))
+
+    def test_putGet_roundTrip(self):
+        """A stored entry should be returned by get, with only the cached headers kept"""
+        cache = ResponseCache(self._cache_dir)
+        key = cache.make_key("https://api.github.com/foo")
+        cache.put(key, {"ETag": '"abc"', "Server": "GitHub.com"}, {"a": [1, 2]})
+        entry = cache.get(key)
+        self.assertEqual(entry["data"], {"a": [1, 2]})
+        self.assertEqual(entry["headers"], {"ETag": '"abc"'})
+
+    def test_persistsAcrossInstances(self):
+        """Entries should be available to a new cache object using the same directory"""
+        key = ResponseCache.make_key("https://api.github.com/foo")
+        ResponseCache(self._cache_dir).put(key, {"ETag": '"abc"'}, [1])
+        self.assertEqual(ResponseCache(self._cache_dir).get(key)["data"], [1])
+
+    def test_makeKey_dependsOnToken(self):
+        """Requests made with different tokens should not share cache entries"""
+        url = "https://api.github.com/foo"
+        self.assertNotEqual(ResponseCache.make_key(url, token="token1"),
+                            ResponseCache.make_key(url, token="token2"))
+
+    def test_makeKey_doesNotContainToken(self):
+        """The token itself should never appear in the cache"""
+        key = ResponseCache.make_key("https://api.github.com/foo", token="secret")
+        self.assertNotIn("secret", key)
+
+    def test_getValidators(self):
+        """The validators should be the conditional request headers for the entry"""
+        entry = {"headers": {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2020 00:00:00 GMT"},
+                 "data": None}
+        self.assertEqual(ResponseCache.get_validators(entry),
+                         {"If-None-Match": '"abc"',
+                          "If-Modified-Since": "Mon, 01 Jan 2020 00:00:00 GMT"})
+
+    def test_isCacheable(self):
+        """Only responses with an ETag or Last-Modified header can be revalidated"""
+        self.assertTrue(ResponseCache.is_cacheable({"ETag": '"abc"'}))
+        self.assertFalse(ResponseCache.is_cacheable({"Server": "GitHub.com"}))
+
+    def test_put_evictsLeastRecentlyUsed(self):
+        """When the cache is over its maximum size, the least recently used entry goes"""
+        data = "x" * 1000
+        cache = ResponseCache(self._cache_dir, max_size=2500)
+        keys = [cache.make_key("https://api.github.com/{}".format(i)) for i in range(3)]
+        cache.put(keys[0], {}, data)
+        cache.put(keys[1], {}, data)
+        # Access the first entry, so that the second is now the least recently used
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(keys[2], {}, data)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_clear(self):
+        """After clearing the cache, no entries remain"""
+        cache = ResponseCache(self._cache_dir)
+        key = cache.make_key("https://api.github.com/foo")
+        cache.put(key, {}, [1])
+        cache.clear()
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(os.listdir(self._cache_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""Unit tests for the pr_snapshot module
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from ghtools.pr_snapshot import CommentStreamSnapshot, PullRequestSnapshot, SnapshotStore
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+def _make_snapshot():
+    """Return a simple PullRequestSnapshot"""
+    return PullRequestSnapshot(
+        pr_updated_at="2020-01-02T00:00:00Z",
+        issue_comments=CommentStreamSnapshot({1: "comment 1"}, "2020-01-01T00:00:00Z"),
+        line_comments=CommentStreamSnapshot({}, None),
+        review_comments=[])
+
+class TestCommentStreamSnapshot(unittest.TestCase):
+    """Tests of CommentStreamSnapshot class"""
+
+    def test_merge_addsAndReplaces(self):
+        """Merging should replace comments with the same ID and add new ones"""
+        stream = CommentStreamSnapshot({1: "a", 3: "c"}, "2020-01-02T00:00:00Z")
+        stream.merge({2: "b", 3: "c2"}, "2020-01-03T00:00:00Z")
+        self.assertEqual(stream.get_comments(), ["a", "b", "c2"])
+        self.assertEqual(stream.last_updated, "2020-01-03T00:00:00Z")
+
+    def test_merge_keepsLatestUpdate(self):
+        """Merging older or no comments should not move last_updated backward"""
+        stream = CommentStreamSnapshot({1: "a"}, "2020-01-02T00:00:00Z")
+        stream.merge({1: "a"}, "2020-01-01T00:00:00Z")
+        stream.merge({}, None)
+        self.assertEqual(stream.last_updated, "2020-01-02T00:00:00Z")
+
+class TestSnapshotStore(unittest.TestCase):
+    """Tests of SnapshotStore class"""
+
+    def setUp(self):
+        self._snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._snapshot_dir)
+
+    def test_load_missing(self):
+        """Loading a PR that was never saved should return None"""
+        store = SnapshotStore(self._snapshot_dir)
+        self.assertIsNone(store.load(store.make_key("https://api.github.com", "org/repo", 1)))
+
+    def test_saveLoad_roundTrip(self):
+        """A saved snapshot should be loaded by a new store using the same directory"""
+        key = SnapshotStore.make_key("https://api.github.com", "org/repo", 1)
+        SnapshotStore(self._snapshot_dir).save(key, _make_snapshot())
+        snapshot = SnapshotStore(self._snapshot_dir).load(key)
+        self.assertEqual(snapshot.pr_updated_at, "2020-01-02T00:00:00Z")
+        self.assertEqual(snapshot.issue_comments.get_comments(), ["comment 1"])
+
+    def test_makeKey_repoCaseInsensitive(self):
+        """Keys should not depend on the case of the repository name"""
+        self.assertEqual(SnapshotStore.make_key("https://api.github.com", "Org/Repo", 1),
+                         SnapshotStore.make_key("https://api.github.com", "org/repo", 1))
+
+    def test_load_otherVersion(self):
+        """A snapshot written with a different format version should be ignored"""
+        store = SnapshotStore(self._snapshot_dir)
+        key = store.make_key("https://api.github.com", "org/repo", 1)
+        store.save(key, _make_snapshot())
+        with open(os.path.join(self._snapshot_dir, key + ".pickle"), "wb") as snapshot_file:
+            pickle.dump((0, _make_snapshot()), snapshot_file)
+        self.assertIsNone(store.load(key))
+
+    def test_load_corrupt(self):
+        """A snapshot file that cannot be read should be ignored"""
+        store = SnapshotStore(self._snapshot_dir)
+        key = store.make_key("https://api.github.com", "org/repo", 1)
+        with open(os.path.join(self._snapshot_dir, key + ".pickle"), "wb") as snapshot_file:
+            snapshot_file.write(b"not a pickle")
+        self.assertIsNone(store.load(key))
+
+    def test_save_evictsLeastRecentlyUsed(self):
+        """When the store is over its maximum size, the least recently used snapshot goes"""
+        keys = [SnapshotStore.make_key("https://api.github.com", "org/repo", i)
+                for i in range(3)]
+        store = SnapshotStore(self._snapshot_dir)
+        store.save(keys[0], _make_snapshot())
+        size = os.path.getsize(os.path.join(self._snapshot_dir, keys[0] + ".pickle"))
+        store = SnapshotStore(self._snapshot_dir, max_size=int(size * 2.5))
+        store.save(keys[1], _make_snapshot())
+        # Load the first snapshot, so that the second is now the least recently used
+        self.assertIsNotNone(store.load(keys[0]))
+        store.save(keys[2], _make_snapshot())
+        self.assertIsNotNone(store.load(keys[0]))
+        self.assertIsNone(store.load(keys[1]))
+        self.assertIsNotNone(store.load(keys[2]))
+
+if __name__ == '__main__':
+    unittest.main()
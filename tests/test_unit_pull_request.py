@@ -244,6 +244,30 @@ Or here."""
         self.assertIn("c1-optional", todos[4].get_full_text())
         self.assertIn("c2-optional", todos[5].get_full_text())
 
+    def test_getAllTodos(self):
+        """Test the get_all_todos method, which gives incomplete and completed todos"""
+        c1 = self._simple_comment(ConversationComment, 1, "- [x] c1 done\n- [ ] c1 task",
+                                  creation_date=datetime.datetime(2020, 1, 2))
+        pr = self._create_pr(body="- [ ] body task\n- [X] body done", comments=(c1,),
+                             creation_date=datetime.datetime(2020, 1, 1))
+        (outstanding, done) = pr.get_all_todos()
+        self.assertEqual(outstanding, pr.get_todos())
+        self.assertEqual(done, pr.get_todos(completed=True))
+        self.assertEqual([todo.get_full_text() for todo in outstanding],
+                         ["body task", "c1 task"])
+        self.assertEqual([todo.get_full_text() for todo in done],
+                         ["[COMPLETED] body done", "[COMPLETED] c1 done"])
+
+    def test_getTodoProgress(self):
+        """Test the get_todo_progress method, with and without a username filter"""
+        c1 = self._simple_comment(ConversationComment, 1, "- [x] c1 done\n- [ ] c1 task",
+                                  username="user2")
+        c2 = self._simple_comment(ConversationComment, 2, "- [x] c2 done",
+                                  username="user1")
+        pr = self._create_pr(body="- [ ] body task", comments=(c1, c2), username="user1")
+        self.assertEqual(pr.get_todo_progress(), (2, 4))
+        self.assertEqual(pr.get_todo_progress(filter_username="user1"), (1, 2))
+
     def test_getTodos_filterUsername(self):
         """Test the get_todos method when a username is provided"""
 
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+"""Unit tests for the rate_limit module
+"""
+
+import contextlib
+import email.utils
+import io
+import unittest
+from requests.structures import CaseInsensitiveDict
+from ghtools.rate_limit import RateLimiter
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class _FakeClock:
+    """Clock whose sleep just advances the time"""
+
+    def __init__(self):
+        self.now = 1000000.0
+        self.sleeps = []
+
+    def time(self):
+        """Return the current time"""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the time, recording the sleep"""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class _FakeResponse:
+    # pylint: disable=too-few-public-methods
+    """Stand-in for requests.Response"""
+
+    def __init__(self, status_code=200, headers=None, text=""):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.text = text
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests of RateLimiter class"""
+
+    def setUp(self):
+        self._clock = _FakeClock()
+        # Notices of long waits are printed to stderr
+        self._stderr = io.StringIO()
+        redirect = contextlib.redirect_stderr(self._stderr)
+        redirect.__enter__()
+        self.addCleanup(redirect.__exit__, None, None, None)
+
+    def _make_limiter(self, **kwargs):
+        """Return a RateLimiter using the fake clock"""
+        return RateLimiter(clock=self._clock.time, sleep=self._clock.sleep, **kwargs)
+
+    def _call(self, limiter, responses):
+        """Call limiter with a send function giving the given responses in turn
+
+        Returns (the response returned by the limiter, number of requests sent)
+        """
+        remaining = list(responses)
+        sent = []
+        def send():
+            sent.append(self._clock.now)
+            return remaining.pop(0)
+        return (limiter.call(send), len(sent))
+
+    def test_call_notRateLimited(self):
+        """A successful response should be returned without waiting"""
+        limiter = self._make_limiter()
+        (response, num_sent) = self._call(limiter, [_FakeResponse(200)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(num_sent, 1)
+        self.assertEqual(self._clock.sleeps, [])
+        self.assertEqual(limiter.stats.requests, 1)
+
+    def test_call_retryAfterHonored(self):
+        """A secondary rate limit with Retry-After should be retried after that time"""
+        limiter = self._make_limiter()
+        (response, num_sent) = self._call(limiter, [
+            _FakeResponse(403, {"Retry-After": "10"}, "secondary rate limit"),
+            _FakeResponse(200)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(num_sent, 2)
+        self.assertEqual(len(self._clock.sleeps), 1)
+        self.assertGreaterEqual(self._clock.sleeps[0], 10)
+        self.assertLessEqual(self._clock.sleeps[0], 11)
+        self.assertEqual(limiter.stats.rate_limited, 1)
+        self.assertEqual(limiter.stats.retries, 1)
+
+    def test_call_retryAfterHttpDate(self):
+        """A Retry-After given as an HTTP date should be retried at that time"""
+        limiter = self._make_limiter()
+        retry_after = email.utils.formatdate(self._clock.now + 20, usegmt=True)
+        (response, num_sent) = self._call(limiter, [
+            _FakeResponse(429, {"Retry-After": retry_after}),
+            _FakeResponse(200)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(num_sent, 2)
+        self.assertEqual(len(self._clock.sleeps), 1)
+        self.assertGreaterEqual(self._clock.sleeps[0], 20)
+        self.assertLessEqual(self._clock.sleeps[0], 21)
+
+    def test_call_retryAfterUnparseable(self):
+        """An unparseable Retry-After should fall back to exponential backoff"""
+        limiter = self._make_limiter()
+        (response, num_sent) = self._call(limiter, [
+            _FakeResponse(429, {"Retry-After": "soon"}),
+            _FakeResponse(200)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(num_sent, 2)
+        self.assertEqual(len(self._clock.sleeps), 1)
+        self.assertGreaterEqual(self._clock.sleeps[0], 30)
+        self.assertLessEqual(self._clock.sleeps[0], 60)
+
+    def test_call_exponentialBackoff(self):
+        """Without Retry-After, retries should back off exponentially"""
+        limiter = self._make_limiter()
+        (response, _) = self._call(limiter, [_FakeResponse(429)] * 3 + [_FakeResponse(200)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._clock.sleeps), 3)
+        for attempt, delay in enumerate(self._clock.sleeps):
+            self.assertGreaterEqual(delay, 30 * 2 ** attempt)
+            self.assertLessEqual(delay, 60 * 2 ** attempt)
+
+    def test_call_givesUpAfterMaxRetries(self):
+        """After max_retries retries, the rate-limited response should be returned"""
+        limiter = self._make_limiter(max_retries=2)
+        (response, num_sent) = self._call(limiter, [_FakeResponse(429)] * 5)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(num_sent, 3)
+
+    def test_call_maxWaitExceeded(self):
+        """A retry needing a wait longer than max_wait should not be made"""
+        limiter = self._make_limiter(max_wait=10)
+        (response, num_sent) = self._call(limiter, [
+            _FakeResponse(429, {"Retry-After": "100"}), _FakeResponse(200)])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(num_sent, 1)
+
+    def test_call_permissionErrorNotRetried(self):
+        """A 403 that isn't a rate limit should be returned immediately"""
+        limiter = self._make_limiter()
+        (response, num_sent) = self._call(limiter, [
+            _FakeResponse(403, text="Resource not accessible by integration"),
+            _FakeResponse(200)])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(num_sent, 1)
+        self.assertEqual(limiter.stats.rate_limited, 0)
+
+    def test_call_primaryLimitWaitsForReset(self):
+        """A primary rate limit response should be retried once the limit resets"""
+        limiter = self._make_limiter()
+        reset = self._clock.now + 50
+        (response, _) = self._call(limiter, [
+            _FakeResponse(403, {"X-RateLimit-Remaining": "0",
+                                "X-RateLimit-Reset": str(reset)}),
+            _FakeResponse(200)])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(self._clock.now, reset)
+
+    def test_call_reserveWaitsForReset(self):
+        """Once only the reserve remains, requests should wait for the limit to reset"""
+        limiter = self._make_limiter(reserve=5)
+        reset = self._clock.now + 100
+        self._call(limiter, [_FakeResponse(200, {"X-RateLimit-Remaining": "5",
+                                                 "X-RateLimit-Reset": str(reset)})])
+        (_, num_sent) = self._call(limiter, [_FakeResponse(200)])
+        self.assertEqual(num_sent, 1)
+        self.assertGreaterEqual(self._clock.now, reset)
+        self.assertEqual(limiter.stats.waits, 1)
+        self.assertRegex(self._stderr.getvalue(),
+                         r"^Waiting 10[01] s: the GitHub API rate limit for 'core' is used "
+                         r"up until it resets\n$")
+
+    def test_call_shortWaitNotAnnounced(self):
+        """A wait of a few seconds should not be announced"""
+        limiter = self._make_limiter()
+        self._call(limiter, [_FakeResponse(429, {"Retry-After": "2"}), _FakeResponse(200)])
+        self.assertEqual(len(self._clock.sleeps), 1)
+        self.assertEqual(self._stderr.getvalue(), "")
+
+    def test_call_retryAnnounced(self):
+        """A long wait before a retry should be announced once, with its reason"""
+        limiter = self._make_limiter()
+        self._call(limiter, [_FakeResponse(429, {"Retry-After": "30"}), _FakeResponse(200)])
+        self.assertEqual(self._stderr.getvalue().count("Waiting"), 1)
+        self.assertIn("rate limit; retrying it (retry 1 of 5)", self._stderr.getvalue())
+
+    def test_call_pacesWhenFewRemain(self):
+        """With few requests remaining, they should be spread over the rest of the window"""
+        limiter = self._make_limiter(pace_below=100)
+        start = self._clock.now
+        self._call(limiter, [_FakeResponse(200, {"X-RateLimit-Remaining": "10",
+                                                 "X-RateLimit-Reset": str(start + 100)})])
+        for _ in range(5):
+            self._call(limiter, [_FakeResponse(200)])
+        # 10 requests spread over 100 s: one every 10 s, with the first immediately
+        self.assertAlmostEqual(self._clock.now - start, 40, delta=1)
+
+    def test_call_separateResources(self):
+        """The budget of one resource should not affect requests for another"""
+        limiter = self._make_limiter()
+        reset = self._clock.now + 100
+        self._call(limiter, [_FakeResponse(200, {"X-RateLimit-Remaining": "0",
+                                                 "X-RateLimit-Reset": str(reset),
+                                                 "X-RateLimit-Resource": "search"})])
+        limiter.call(_FakeResponse, resource="core")
+        self.assertEqual(self._clock.sleeps, [])
+
+if __name__ == '__main__':
+    unittest.main()
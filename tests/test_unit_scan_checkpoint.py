@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""Unit tests for the scan_checkpoint module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from ghtools.scan_checkpoint import ScanCheckpoint, parse_shard, in_shard, merge_checkpoints
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+class TestScanCheckpoint(unittest.TestCase):
+    """Tests of ScanCheckpoint class"""
+
+    _SCAN = {"org": "org", "shard": None}
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._dir)
+        self._path = os.path.join(self._dir, "scan.ckpt")
+
+    def test_resume_outputsRecorded(self):
+        """Outputs added to a checkpoint should be there when it is reopened"""
+        checkpoint = ScanCheckpoint(self._path, self._SCAN)
+        checkpoint.add("org/a", "output a\n")
+        checkpoint.add("org/b", "")
+        resumed = ScanCheckpoint(self._path, self._SCAN)
+        self.assertEqual(resumed.get_output("org/a"), "output a\n")
+        self.assertEqual(resumed.get_output("org/b"), "")
+        self.assertIsNone(resumed.get_output("org/c"))
+
+    def test_resume_partialLineIgnored(self):
+        """A partial last line should be ignored, without affecting later lines"""
+        checkpoint = ScanCheckpoint(self._path, self._SCAN)
+        checkpoint.add("org/a", "output a\n")
+        with open(self._path, "a", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write('{"repo": "org/b", "out')
+        resumed = ScanCheckpoint(self._path, self._SCAN)
+        self.assertIsNone(resumed.get_output("org/b"))
+        resumed.add("org/c", "output c\n")
+        resumed = ScanCheckpoint(self._path, self._SCAN)
+        self.assertEqual(resumed.get_output("org/a"), "output a\n")
+        self.assertEqual(resumed.get_output("org/c"), "output c\n")
+
+    def test_resume_differentScan(self):
+        """Resuming a checkpoint of a different scan should raise ValueError"""
+        ScanCheckpoint(self._path, self._SCAN)
+        with self.assertRaises(ValueError):
+            ScanCheckpoint(self._path, {"org": "other", "shard": None})
+
+    def test_merge_inRepoOrder(self):
+        """Merged outputs should be in order of repo, noting incomplete scans"""
+        paths = [os.path.join(self._dir, "shard{}.ckpt".format(i)) for i in (1, 2)]
+        first = ScanCheckpoint(paths[0], dict(self._SCAN, shard="1/2"))
+        first.add("org/b", "b\n")
+        first.add("org/d", "d\n")
+        first.mark_complete()
+        second = ScanCheckpoint(paths[1], dict(self._SCAN, shard="2/2"))
+        second.add("org/a", "a\n")
+        second.add("org/c", "c\n")
+        self.assertEqual(merge_checkpoints(paths), (["a\n", "b\n", "c\n", "d\n"], [paths[1]]))
+
+    def test_merge_mixedCaseRepoOrder(self):
+        """Merged outputs should be in order of repo regardless of case, as in a scan"""
+        paths = [os.path.join(self._dir, "shard{}.ckpt".format(i)) for i in (1, 2)]
+        first = ScanCheckpoint(paths[0], dict(self._SCAN, shard="1/2"))
+        first.add("org/CIME", "CIME\n")
+        first.mark_complete()
+        second = ScanCheckpoint(paths[1], dict(self._SCAN, shard="2/2"))
+        second.add("org/ccs_config", "ccs_config\n")
+        second.add("org/cdeps", "cdeps\n")
+        second.mark_complete()
+        self.assertEqual(merge_checkpoints(paths),
+                         (["ccs_config\n", "cdeps\n", "CIME\n"], []))
+
+    def test_merge_differentScans(self):
+        """Merging checkpoints of different scans should raise ValueError"""
+        paths = [os.path.join(self._dir, "scan{}.ckpt".format(i)) for i in (1, 2)]
+        ScanCheckpoint(paths[0], self._SCAN)
+        ScanCheckpoint(paths[1], dict(self._SCAN, org="other"))
+        with self.assertRaises(ValueError):
+            merge_checkpoints(paths)
+
+class TestShards(unittest.TestCase):
+    """Tests of parse_shard and in_shard"""
+
+    def test_parseShard_valid(self):
+        """A valid shard specification should be parsed"""
+        self.assertEqual(parse_shard("2/5"), (2, 5))
+
+    def test_parseShard_invalid(self):
+        """Invalid shard specifications should raise ValueError"""
+        for string in ("0/5", "6/5", "2", "a/b", "1/2/3"):
+            with self.subTest(string=string):
+                with self.assertRaises(ValueError):
+                    parse_shard(string)
+
+    def test_inShard_partition(self):
+        """Every repo should be in exactly one shard, with the shards roughly balanced"""
+        repos = ["org/repo{}".format(i) for i in range(300)]
+        shards = [[repo for repo in repos if in_shard(repo, (index, 3))]
+                  for index in (1, 2, 3)]
+        self.assertEqual(sorted(repo for shard in shards for repo in shard), sorted(repos))
+        for shard in shards:
+            self.assertGreater(len(shard), 50)
+
+if __name__ == '__main__':
+    unittest.main()
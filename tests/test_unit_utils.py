@@ -3,8 +3,9 @@
 """Unit tests for utils module
 """
 
+import concurrent.futures
 import unittest
-from ghtools.utils import split_pr_url
+from ghtools.utils import split_pr_url, ordered_map
 
 # Allow names that pylint doesn't like, because otherwise I find it hard
 # to make readable unit test names
@@ -63,5 +64,29 @@ class TestUtils(unittest.TestCase):
         (repo, pr_number) = split_pr_url('https://github.com/ESMCI/github-tools/pull/1357a')
         self.assertSplitPrUrlFailure(repo, pr_number)
 
+class TestOrderedMap(unittest.TestCase):
+    """Tests of ordered_map"""
+
+    def test_orderedMap_resultsInOrder(self):
+        """Results should be given in the order of the items"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = [(item, future.result())
+                       for item, future in ordered_map(executor, lambda x: x * x,
+                                                       range(20), max_pending=3)]
+        self.assertEqual(results, [(i, i * i) for i in range(20)])
+
+    def test_orderedMap_takesItemsLazily(self):
+        """No more than max_pending items should be taken ahead of the caller"""
+        taken = []
+        def items():
+            for i in range(100):
+                taken.append(i)
+                yield i
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            for item, future in ordered_map(executor, lambda x: x, items(), max_pending=5):
+                future.result()
+                self.assertLessEqual(len(taken), item + 5)
+        self.assertEqual(len(taken), 100)
+
 if __name__ == '__main__':
     unittest.main()